@@ -0,0 +1,129 @@
+"""
+Benchmark: insert_dataframe serialization, before vs after.
+
+"before" is the original path (df.to_dict(orient="records") for the
+whole frame + per-cell clean_nan_values); "after" is the columnar
+FrameRecords path used by insert_dataframe. Each mode runs in its own
+child process so peak RSS is measured independently; batches are sent
+to a no-op client so only serialization is measured.
+
+Usage:
+    PYTHONPATH=src python scripts/analysis/benchmark_dataframe_serialization.py --rows 1000000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def make_snapshot_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """CPID-snapshot-shaped frame with ~10% missing site ids / values."""
+    rng = np.random.default_rng(seed)
+
+    site_ids = np.array([f"Site {i}" for i in range(40)], dtype=object)[rng.integers(0, 40, n_rows)]
+    site_ids[rng.random(n_rows) < 0.1] = np.nan
+
+    values = rng.integers(0, 50, n_rows).astype(float)
+    values[rng.random(n_rows) < 0.1] = np.nan
+
+    return pd.DataFrame(
+        {
+            "entity_type": "subject",
+            "entity_id": [f"Subject {i // 50:06d}" for i in range(n_rows)],
+            "site_id": site_ids,
+            "metric_name": [f"cpmd__metric_{i % 50}" for i in range(n_rows)],
+            "metric_value": values,
+            "snapshot_time": "2026-01-01T00:00:00+00:00",
+            "source": "CPID_EDC_Metrics",
+        }
+    )
+
+
+class _NullClient:
+    def table(self, name):
+        return self
+
+    def insert(self, rows, **_):
+        return self
+
+    def execute(self):
+        return None
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(mode: str, n_rows: int) -> dict:
+    from storage.supabase_writer import clean_nan_values, insert_dataframe, insert_rows
+
+    df = make_snapshot_frame(n_rows)
+    baseline = _peak_rss_mib()
+    client = _NullClient()
+
+    start = time.perf_counter()
+
+    if mode == "before":
+        records = clean_nan_values(df.to_dict(orient="records"))
+        insert_rows("benchmark", records, client=client)
+    else:
+        insert_dataframe(df, "benchmark", client=client)
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "rows_per_sec": n_rows / elapsed,
+        "peak_rss_mib": _peak_rss_mib(),
+        "extra_peak_mib": _peak_rss_mib() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--child", choices=["before", "after"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args.child, args.rows)
+        # Last line of stdout is the result (insert_* prints progress)
+        print(json.dumps(result))
+        return
+
+    results = {}
+    for mode in ("before", "after"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--rows", str(args.rows), "--child", mode],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print("\n" + "=" * 72)
+    print(f"📊 DATAFRAME SERIALIZATION BENCHMARK  rows={args.rows:,}")
+    print("=" * 72)
+
+    for mode in ("before", "after"):
+        r = results[mode]
+        print(
+            f"{'🐢' if mode == 'before' else '⚡'} {mode:<7}: {r['seconds']:7.2f}s  "
+            f"{r['rows_per_sec']:12,.0f} rows/sec  "
+            f"peak RSS {r['peak_rss_mib']:8.1f} MiB  (+{r['extra_peak_mib']:.1f} MiB)"
+        )
+
+    speedup = results["before"]["seconds"] / results["after"]["seconds"]
+    print(f"🚀 Speed-up : {speedup:.1f}x")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark: column-projected vs full-sheet reads, per report source.
+
+For every source in config/sources/ a workbook is generated with the
+source's contract headers plus ``--unused`` extra columns (the shape of
+the SAE Dashboard / Missing Pages exports). Each (source, mode) read +
+normalize runs in its own child process so peak RSS is measured
+independently; the sheet cache is bypassed.
+
+"full" is ``pd.read_excel`` of the whole sheet; "projected" sniffs the
+header row and parses only the contract's columns (``read_sheet(...,
+columns=...)``).
+
+Usage:
+    PYTHONPATH=src python scripts/analysis/benchmark_projected_reads.py --rows 20000 --unused 40
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MODES = ("full", "projected")
+
+
+def make_source_workbook(source, path: Path, n_rows: int, n_unused: int, seed: int = 0) -> None:
+    """One column per contract field (first alias) plus unused filler."""
+    rng = np.random.default_rng(seed)
+    spec = source.normalization
+
+    headers = {}
+    for header, column in spec.column_map.items():
+        headers.setdefault(column, header)
+
+    data = {}
+    for column in spec.columns:
+        if column == "source":
+            continue
+        header = headers.get(column, column)
+        if column in spec.date_columns:
+            data[header] = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), "D")
+        elif column in spec.int_columns or column in spec.float_columns:
+            data[header] = rng.integers(0, 100, n_rows)
+        else:
+            data[header] = np.array([f"{column} {i}" for i in range(50)], dtype=object)[rng.integers(0, 50, n_rows)]
+
+    for i in range(n_unused):
+        data[f"Unused {i}"] = (
+            rng.random(n_rows) if i % 2 else np.array(["lorem", "ipsum", "dolor"], dtype=object)[rng.integers(0, 3, n_rows)]
+        )
+
+    pd.DataFrame(data).to_excel(path, index=False)
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(source_name: str, mode: str, path: str) -> dict:
+    from ingestion.file_ingest import read_sheet
+    from ingestion.sources import get_source
+
+    source = get_source(source_name)
+    baseline = _peak_rss_mib()
+
+    start = time.perf_counter()
+    if mode == "full":
+        df = read_sheet(path, use_cache=False)
+    else:
+        df = read_sheet(path, columns=source.pipeline.source_headers, use_cache=False)
+    parsed = time.perf_counter()
+    out = source.normalize(df, "Study 1")
+    done = time.perf_counter()
+
+    return {
+        "parse_seconds": parsed - start,
+        "total_seconds": done - start,
+        "columns_parsed": df.shape[1],
+        "rows_out": len(out),
+        "extra_peak_mib": _peak_rss_mib() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--unused", type=int, default=40, help="Extra columns outside the contract")
+    parser.add_argument("--sources", nargs="*", help="Source names (default: all)")
+    parser.add_argument("--child", nargs=3, metavar=("SOURCE", "MODE", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--generate", nargs=2, metavar=("SOURCE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return
+
+    if args.generate:
+        from ingestion.sources import get_source
+
+        make_source_workbook(get_source(args.generate[0]), Path(args.generate[1]), args.rows, args.unused)
+        return
+
+    from ingestion.sources import get_sources
+
+    sources = get_sources()
+    names = args.sources or list(sources)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            path = Path(tmp) / f"{name}.xlsx"
+            print(f"📝 Generating {name}: {args.rows:,} rows × (contract + {args.unused} unused) columns")
+            # In a child too: ru_maxrss survives exec, so a parent grown
+            # by generation would mask the readers' peaks
+            subprocess.run(
+                [sys.executable, __file__, "--generate", name, str(path),
+                 "--rows", str(args.rows), "--unused", str(args.unused)],
+                check=True,
+            )
+
+            for mode in MODES:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", name, mode, str(path)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                results[name, mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print("\n" + "=" * 88)
+    print(f"📊 PROJECTED READ BENCHMARK  rows={args.rows:,}  unused columns={args.unused}")
+    print("=" * 88)
+    print(f"{'source':<22}{'mode':<11}{'cols':>5}{'parse s':>10}{'total s':>10}{'+peak MiB':>12}{'speedup':>10}")
+
+    for name in names:
+        full = results[name, "full"]
+        for mode in MODES:
+            r = results[name, mode]
+            speedup = full["total_seconds"] / r["total_seconds"]
+            print(
+                f"{name:<22}{mode:<11}{r['columns_parsed']:>5}{r['parse_seconds']:>10.2f}"
+                f"{r['total_seconds']:>10.2f}{r['extra_peak_mib']:>12.1f}{speedup:>9.2f}x"
+            )
+        assert full["rows_out"] == results[name, "projected"]["rows_out"], name
+
+    print("=" * 88)
+
+
+if __name__ == "__main__":
+    main()
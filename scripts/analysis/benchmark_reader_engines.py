@@ -0,0 +1,168 @@
+"""
+Benchmark: spreadsheet reader engines (ingestion.file_ingest).
+
+Generates Missing-Pages-shaped workbooks (text, integer, float and date
+columns, ~10% blanks) of each requested size and reads every one with
+each available reader engine, full-sheet and column-projected. Every
+read runs in its own child process, so timings and peak RSS are
+independent; the sheet cache is bypassed. Each child also reports a
+digest of the frame it read, and the run fails if any engine's output
+differs from the ``default`` engine's.
+
+Usage:
+    PYTHONPATH=src python scripts/analysis/benchmark_reader_engines.py --rows 10000 100000 1000000
+"""
+import argparse
+import hashlib
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+HEADERS = [
+    "Study Name", "SiteNumber", "SubjectName", "Overall Subject Status",
+    "Visit Level Subject Status", "FolderName", "Visit date",
+    "Form Type (Summary or Visit)", "FormName", "No. #Days Page Missing",
+    "Comment", "Reviewer",
+]
+# The Missing Pages contract columns (the rest are unused)
+PROJECTED = HEADERS[:10]
+
+
+def make_workbook(path: Path, n_rows: int, seed: int = 0) -> None:
+    """Streamed with openpyxl's write-only mode (1M rows fit in memory)."""
+    import datetime as dt
+
+    from openpyxl import Workbook
+
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Missing Pages")
+    ws.append(HEADERS)
+
+    start = dt.datetime(2025, 1, 1)
+    blank = rng.random((n_rows, len(HEADERS))) < 0.1
+    sites = rng.integers(1, 60, n_rows)
+    subjects = rng.integers(0, 20_000, n_rows)
+    days = rng.integers(0, 400, n_rows)
+    missing = rng.random(n_rows) * 90
+    statuses = ["Active", "Screening", "Completed", "Discontinued"]
+    forms = ["AE", "CM", "DM", "VS", "LB", "EX"]
+
+    for i in range(n_rows):
+        row = [
+            "Study 1", int(sites[i]), f"Subject {subjects[i]:05d}", statuses[i % 4],
+            statuses[(i // 3) % 4], f"Visit {i % 12}", start + dt.timedelta(days=int(days[i])),
+            "Visit" if i % 5 else "Summary", forms[i % 6], round(float(missing[i]), 1),
+            f"free text {i % 997}", f"reviewer{i % 13}",
+        ]
+        ws.append([None if blank[i, j] else value for j, value in enumerate(row)])
+
+    wb.save(path)
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(engine: str, projected: bool, path: str) -> dict:
+    from ingestion.file_ingest import read_sheet
+
+    baseline = _peak_rss_mib()
+    start = time.perf_counter()
+    df = read_sheet(path, columns=PROJECTED if projected else None, reader=engine, use_cache=False)
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mib()
+
+    digest = hashlib.sha256()
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(repr(df.dtypes.astype(str).tolist()).encode())
+    digest.update(df.to_csv(index=False).encode())
+
+    return {
+        "seconds": elapsed,
+        "rows": len(df),
+        "rows_per_sec": len(df) / elapsed,
+        "extra_peak_mib": peak - baseline,
+        "digest": digest.hexdigest(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--engines", nargs="*", help="Engine names (default: all available)")
+    parser.add_argument("--child", nargs=3, metavar=("ENGINE", "PROJECTED", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--generate", nargs=2, metavar=("ROWS", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        engine, projected, path = args.child
+        print(json.dumps(run_child(engine, projected == "1", path)))
+        return
+
+    if args.generate:
+        make_workbook(Path(args.generate[1]), int(args.generate[0]))
+        return
+
+    from ingestion.file_ingest import available_reader_engines
+
+    engines = args.engines or available_reader_engines()
+    if "default" not in engines:
+        engines = ["default", *engines]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_rows in args.rows:
+            path = Path(tmp) / f"missing_pages_{n_rows}.xlsx"
+            print(f"📝 Generating {n_rows:,} rows × {len(HEADERS)} columns")
+            # In a child: ru_maxrss survives exec, so a parent grown by
+            # generation would mask the readers' peaks
+            subprocess.run([sys.executable, __file__, "--generate", str(n_rows), str(path)], check=True)
+            size_mib = path.stat().st_size / 2**20
+
+            for projected in (False, True):
+                for engine in engines:
+                    print(f"   ⏱️  {engine:<16} {'projected' if projected else 'full':<10}", flush=True)
+                    out = subprocess.run(
+                        [sys.executable, __file__, "--child", engine, str(int(projected)), str(path)],
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    )
+                    results[n_rows, projected, engine] = json.loads(out.stdout.strip().splitlines()[-1])
+                    results[n_rows, projected, engine]["size_mib"] = size_mib
+
+    print("\n" + "=" * 92)
+    print(f"📊 READER ENGINE BENCHMARK  engines={', '.join(engines)}")
+    print("=" * 92)
+    print(f"{'rows':>10}  {'read':<10}{'engine':<17}{'seconds':>9}{'rows/sec':>12}{'+peak MiB':>11}{'speedup':>9}  output")
+
+    mismatches = []
+    for n_rows in args.rows:
+        for projected in (False, True):
+            base = results[n_rows, projected, "default"]
+            for engine in engines:
+                r = results[n_rows, projected, engine]
+                same = r["digest"] == base["digest"]
+                if not same:
+                    mismatches.append((n_rows, projected, engine))
+                print(
+                    f"{n_rows:>10,}  {'projected' if projected else 'full':<10}{engine:<17}"
+                    f"{r['seconds']:>9.2f}{r['rows_per_sec']:>12,.0f}{r['extra_peak_mib']:>11.1f}"
+                    f"{base['seconds'] / r['seconds']:>8.2f}x  {'✅ identical' if same else '❌ DIFFERS'}"
+                )
+
+    print("=" * 92)
+    if mismatches:
+        sys.exit(f"❌ Engine output differs from default: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: Supabase writer throughput as batch concurrency grows.
+
+Uses an in-process stand-in for the PostgREST client that sleeps for a
+fixed round-trip latency per request, so the numbers isolate the effect
+of max_in_flight on wall time (network RTT × batches).
+
+Usage:
+    PYTHONPATH=src python scripts/analysis/benchmark_supabase_writer.py --rows 50000 --latency-ms 80
+"""
+import argparse
+import threading
+import time
+
+from storage.supabase_writer import insert_rows
+
+
+class LatencyClient:
+    """Minimal ``client.table(t).insert(rows).execute()`` stand-in."""
+
+    def __init__(self, latency_s: float):
+        self.latency_s = latency_s
+        self.rows_written = 0
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> "_LatencyRequest":
+        return _LatencyRequest(self)
+
+
+class _LatencyRequest:
+    def __init__(self, client: LatencyClient):
+        self._client = client
+        self._rows: list = []
+
+    def insert(self, rows: list, **_) -> "_LatencyRequest":
+        self._rows = rows
+        return self
+
+    def execute(self) -> None:
+        time.sleep(self._client.latency_s)
+        with self._client._lock:
+            self._client.rows_written += len(self._rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    rows = [
+        {
+            "entity_type": "subject",
+            "entity_id": f"Subject {i:06d}",
+            "site_id": f"Site {i % 40}",
+            "metric_name": "cpmd__page_status__bucket_0",
+            "metric_value": float(i % 7),
+            "snapshot_time": "2026-01-01T00:00:00+00:00",
+            "source": "CPID_EDC_Metrics",
+        }
+        for i in range(args.rows)
+    ]
+
+    print("\n" + "=" * 72)
+    print(
+        f"📊 WRITER THROUGHPUT  rows={args.rows} batch={args.batch_size} "
+        f"rtt={args.latency_ms:.0f}ms"
+    )
+    print("=" * 72)
+
+    baseline = None
+
+    for max_in_flight in args.concurrency:
+        client = LatencyClient(args.latency_ms / 1000)
+
+        start = time.perf_counter()
+        insert_rows(
+            "benchmark",
+            rows,
+            batch_size=args.batch_size,
+            max_in_flight=max_in_flight,
+            client=client,
+        )
+        elapsed = time.perf_counter() - start
+
+        assert client.rows_written == args.rows
+        baseline = baseline or elapsed
+
+        print(
+            f"⚡ max_in_flight={max_in_flight:<3} : {elapsed:7.2f}s  "
+            f"{args.rows / elapsed:12,.0f} rows/sec  ({baseline / elapsed:4.1f}x)"
+        )
+
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: single-open workbook dispatch vs one open per report sheet.
+
+Generates one workbook with a sheet per report source (contract headers
+plus ``--unused`` filler columns, half of them free text, each sheet
+``--rows`` long) and extracts every sheet two ways, each in its own
+child process with the sheet cache bypassed:
+
+- "per-sheet": what separate extractors pay, one ``read_sheet`` (open,
+  decompress, shared strings, header sniff) per sheet;
+- "dispatch": ``extract_workbook``, one open, sheets classified by
+  header fingerprint and dispatched to their sources.
+
+The run fails if the two disagree on any source's rows.
+
+Usage:
+    PYTHONPATH=src python scripts/analysis/benchmark_workbook_dispatch.py --rows 20000 --unused 20
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MODES = ("per-sheet", "dispatch")
+
+
+def make_workbook(path: Path, n_rows: int, n_unused: int, seed: int = 0) -> None:
+    from ingestion.sources import get_sources
+
+    rng = np.random.default_rng(seed)
+    with pd.ExcelWriter(path) as writer:
+        for source in get_sources().values():
+            spec = source.normalization
+            headers = {}
+            for header, column in spec.column_map.items():
+                headers.setdefault(column, header)
+
+            data = {}
+            for column in spec.columns:
+                if column == "source":
+                    continue
+                header = headers.get(column, column)
+                if column in spec.date_columns:
+                    data[header] = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), "D")
+                elif column in spec.int_columns or column in spec.float_columns:
+                    data[header] = rng.integers(0, 100, n_rows)
+                else:
+                    values = np.array([f"{column} {i}" for i in range(50)], dtype=object)
+                    data[header] = values[rng.integers(0, 50, n_rows)]
+            for i in range(n_unused):
+                # Free text: every workbook-level open re-parses the
+                # shared-strings table these fill
+                data[f"Unused {i}"] = (
+                    rng.random(n_rows) if i % 2 else [f"{source.name} note {i}-{j}" for j in range(n_rows)]
+                )
+
+            # Sheet names tell the coding reports (one shared contract) apart
+            pd.DataFrame(data).to_excel(writer, sheet_name=source.label[:31], index=False)
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(mode: str, path: str) -> dict:
+    from ingestion.file_ingest import read_sheet
+    from ingestion.sources import extract_workbook, get_sources
+
+    sources = get_sources()
+    baseline = _peak_rss_mib()
+    start = time.perf_counter()
+    if mode == "dispatch":
+        frames = extract_workbook(path, "Study 1")
+    else:
+        frames = {}
+        for source in sources.values():
+            df = read_sheet(
+                path, sheet_name=source.label[:31], columns=source.pipeline.source_headers, use_cache=False
+            )
+            frames[source.name] = source.normalize(df, "Study 1")
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "rows": {name: len(df) for name, df in frames.items()},
+        "extra_peak_mib": _peak_rss_mib() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--unused", type=int, default=20, help="Extra columns outside each contract")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    parser.add_argument("--generate", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        from ingestion.file_ingest import configure_sheet_cache
+
+        configure_sheet_cache(enabled=False)
+        print(json.dumps(run_child(*args.child)))
+        return
+
+    if args.generate:
+        make_workbook(Path(args.generate), args.rows, args.unused)
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "Study 1_Reports.xlsx"
+        print(f"📝 Generating one sheet per source: {args.rows:,} rows × (contract + {args.unused} unused) columns")
+        # In a child: ru_maxrss survives exec, so a parent grown by
+        # generation would mask the readers' peaks
+        subprocess.run(
+            [sys.executable, __file__, "--generate", str(path), "--rows", str(args.rows), "--unused", str(args.unused)],
+            check=True,
+        )
+        size_mib = path.stat().st_size / 2**20
+
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(path)],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print("\n" + "=" * 72)
+    print(f"📊 WORKBOOK DISPATCH BENCHMARK  file={size_mib:.1f} MiB  sheets={len(results['dispatch']['rows'])}")
+    print("=" * 72)
+    print(f"{'mode':<12}{'seconds':>10}{'+peak MiB':>12}{'speedup':>10}")
+    base = results["per-sheet"]
+    for mode in MODES:
+        r = results[mode]
+        print(f"{mode:<12}{r['seconds']:>10.2f}{r['extra_peak_mib']:>12.1f}{base['seconds'] / r['seconds']:>9.2f}x")
+    print("=" * 72)
+
+    if results["dispatch"]["rows"] != base["rows"]:
+        sys.exit(f"❌ Row counts differ: {results['dispatch']['rows']} vs {base['rows']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from contextlib import nullcontext
 from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
 import pandas as pd
+import pyarrow as pa
+from core.constants import DIMENSIONS_PATH
 from ingestion.cpid_extractor import extract_cpid_metrics
+from ingestion.parallel import ExtractionPool, ExtractionTask, read_spill
+from storage.dimensions import DimensionRegistry
+from storage.snapshot_files import SnapshotParquetWriter
+from storage.snapshot_history import SnapshotHistory
+from storage.snapshot_store import SnapshotStore
+from utils.formatters import format_bytes
 
 
 CPID_FILENAME_KEYWORD = "CPID_EDC_Metrics"
 STUDY_ROOT_DIR = Path("QC Anonymized Study Files")
 OUTPUT_DIR = Path("artifacts")
 OUTPUT_DIR.mkdir(exist_ok=True)
+SNAPSHOT_PATH = OUTPUT_DIR / "cpid_metric_snapshots.parquet"
+REGISTRY_PATH = OUTPUT_DIR / "cpid_metric_registry.csv"
 
 
 def find_cpid_files(root_dir: Path) -> list[Path]:
@@ -26,82 +42,222 @@ def find_cpid_files(root_dir: Path) -> list[Path]:
     return cpid_files
 
 
-def run_dataset_ingestion() -> pd.DataFrame:
-    """
-    Run CPID ingestion across all studies and collect all snapshots.
+def iter_study_snapshots(
+    cpid_files: list[Path],
+    workers: int = 1,
+    *,
+    max_worker_rss_mb: Optional[int] = None,
+    spill_format: str = "ipc",
+) -> Iterator[Tuple[str, Union[pd.DataFrame, pa.Table]]]:
     """
-    all_snapshots = []
+    Yield ``(study_folder, snapshots)`` for each CPID file, one at a time.
 
-    cpid_files = find_cpid_files(STUDY_ROOT_DIR)
-
-    print(f"🔍 Found {len(cpid_files)} CPID files")
+    With ``workers > 1`` files are extracted in worker processes that
+    hand results back as spill files (see ``ingestion.parallel``).
+    """
+    if workers > 1:
+        yield from _iter_parallel(
+            cpid_files,
+            workers=workers,
+            max_worker_rss_bytes=max_worker_rss_mb * 1024 * 1024 if max_worker_rss_mb else None,
+            spill_format=spill_format,
+        )
+        return
 
     for file_path in cpid_files:
         print(f"▶ Processing {file_path}")
 
         try:
             df = extract_cpid_metrics(str(file_path))
-            df["study_folder"] = file_path.parent.name
-            all_snapshots.append(df)
-
         except Exception as e:
             print(f"❌ Failed processing {file_path}: {e}")
+            continue
 
-    if not all_snapshots:
-        raise RuntimeError("No CPID files were successfully processed")
-
-    combined = pd.concat(all_snapshots, ignore_index=True)
-    return combined
+        df["study_folder"] = file_path.parent.name
+        yield file_path.parent.name, df
 
 
-def main():
-    combined_df = run_dataset_ingestion()
-    # -------------------------------------------------
-    # Normalize dtypes before Parquet write (CRITICAL)
-    # -------------------------------------------------
-    string_cols = [
-        "entity_type",
-        "entity_id",
-        "site_id",
-        "metric_name",
-        "snapshot_time",
-        "source",
-        "study_folder",
+def _iter_parallel(
+    cpid_files: list[Path],
+    *,
+    workers: int,
+    max_worker_rss_bytes: Optional[int],
+    spill_format: str,
+) -> Iterator[Tuple[str, pa.Table]]:
+    tasks = [
+        ExtractionTask(
+            task_id=i,
+            dataset="cpid",
+            filepath=str(file_path),
+            study_id=file_path.parent.name,
+            extra_columns={"study_folder": file_path.parent.name},
+        )
+        for i, file_path in enumerate(cpid_files)
     ]
 
-    for col in string_cols:
-        if col in combined_df.columns:
-            combined_df[col] = combined_df[col].astype("string")
+    with tempfile.TemporaryDirectory(prefix="cpid-spill-", dir=OUTPUT_DIR) as spill_dir:
+        pool = ExtractionPool(
+            Path(spill_dir),
+            workers=workers,
+            max_worker_rss_bytes=max_worker_rss_bytes,
+            spill_format=spill_format,
+        )
+
+        # Completion order: each spill is read, yielded and deleted before
+        # the next, so only one study's table is resident at a time
+        for result in pool.run(tasks):
+            if result.error:
+                print(f"❌ Failed processing {result.task.filepath}: {result.error}")
+                continue
+            print(
+                f"▶ Processed {result.task.filepath} "
+                f"({result.rows} rows, {result.extract_s:.1f}s, "
+                f"worker RSS {format_bytes(result.worker_rss_bytes)})"
+            )
+            yield result.task.study_id, read_spill(result.spill_path)
+            result.spill_path.unlink(missing_ok=True)
+
+        if pool.recycled:
+            print(f"♻️ Workers recycled (RSS cap) : {pool.recycled}")
 
-    combined_df["metric_value"] = pd.to_numeric(
-        combined_df["metric_value"], errors="coerce"
+
+def run_dataset_ingestion(
+    workers: int = 1,
+    *,
+    max_worker_rss_mb: Optional[int] = None,
+    spill_format: str = "ipc",
+    snapshot_path: Path = SNAPSHOT_PATH,
+    registry_path: Path = REGISTRY_PATH,
+    store: Optional[SnapshotStore] = None,
+    history: Optional[SnapshotHistory] = None,
+    dimensions_path: Optional[Path] = None,
+) -> SnapshotParquetWriter:
+    """
+    Run CPID ingestion across all studies, streaming each study's
+    snapshots into ``snapshot_path`` as its own row group(s).
+
+    Peak memory is one study, not the whole tree: nothing is
+    concatenated, and the unique metric registry is collected while
+    writing. With ``store`` each study is also appended to the
+    partitioned local snapshot store; with ``history`` only its changes
+    since the previous run are recorded (see ``storage.snapshot_history``).
+    With ``dimensions_path`` subjects, sites, metric names and sources are
+    written as that dimension registry's int32 IDs (new IDs are saved only
+    if the run succeeds); read the file back with
+    ``read_snapshot_file(path, dimensions=DimensionRegistry.load(...))``.
+
+    History records a study's complete state, so it is recorded once all
+    of the study's CPID files are in; a study with a failed file is left
+    out of history for this run rather than recorded with that file's
+    metrics deleted.
+    """
+    cpid_files = find_cpid_files(STUDY_ROOT_DIR)
+
+    print(f"🔍 Found {len(cpid_files)} CPID files")
+
+    files_left = Counter(file_path.parent.name for file_path in cpid_files)
+    study_runs = defaultdict(list)
+
+    transaction = DimensionRegistry.transaction(dimensions_path) if dimensions_path else nullcontext()
+    with transaction as dimensions, SnapshotParquetWriter(snapshot_path, dimensions=dimensions) as writer:
+        for study_folder, snapshots in iter_study_snapshots(
+            cpid_files,
+            workers,
+            max_worker_rss_mb=max_worker_rss_mb,
+            spill_format=spill_format,
+        ):
+            writer.write(snapshots)
+            if store is not None:
+                store.append(snapshots, study=study_folder)
+            if history is not None:
+                if isinstance(snapshots, pa.Table):
+                    snapshots = snapshots.to_pandas()
+                study_runs[study_folder].append(snapshots)
+                files_left[study_folder] -= 1
+                if files_left[study_folder] == 0:
+                    changes = history.record(
+                        pd.concat(study_runs.pop(study_folder), ignore_index=True), study=study_folder
+                    )
+                    print(
+                        f"🕰️ {study_folder}: +{changes.added} ~{changes.changed} "
+                        f"-{changes.deleted} ({changes.unchanged} unchanged)"
+                    )
+
+        for study_folder in study_runs:
+            print(f"⚠️ {study_folder}: not recorded in history (a CPID file failed)")
+
+        if writer.row_groups == 0:
+            raise RuntimeError("No CPID files were successfully processed")
+
+    writer.metric_registry().to_csv(registry_path, index=False)
+    return writer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Extraction worker processes (1 = sequential, in-process)",
+    )
+    parser.add_argument(
+        "--max-worker-rss-mb",
+        type=int,
+        default=None,
+        help="Recycle a worker once its RSS exceeds this after a file",
+    )
+    parser.add_argument(
+        "--spill-format",
+        choices=["ipc", "parquet"],
+        default="ipc",
+        help="Worker → parent result files",
+    )
+    parser.add_argument(
+        "--store",
+        action="store_true",
+        help="Also append to the partitioned snapshot store (artifacts/snapshot_store)",
     )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="Record per-study changes in the snapshot history (artifacts/snapshot_history)",
+    )
+    parser.add_argument(
+        "--dimensions",
+        action="store_true",
+        help="Store identifiers as dimension registry IDs (artifacts/dimensions.json)",
+    )
+    args = parser.parse_args()
 
-    # -------------------------------------------------
-    # Safe Parquet write
-    # -------------------------------------------------
-    snapshot_path = OUTPUT_DIR / "cpid_metric_snapshots.parquet"
-    combined_df.to_parquet(snapshot_path, index=False, engine="pyarrow")
+    store = SnapshotStore() if args.store else None
+    history = SnapshotHistory() if args.history else None
 
     # Save raw combined snapshot (DO NOT COMMIT)
-    snapshot_path = OUTPUT_DIR / "cpid_metric_snapshots.parquet"
-    
-
-    print(f"✅ Saved combined snapshot to {snapshot_path}")
+    writer = run_dataset_ingestion(
+        args.workers,
+        max_worker_rss_mb=args.max_worker_rss_mb,
+        spill_format=args.spill_format,
+        store=store,
+        history=history,
+        dimensions_path=DIMENSIONS_PATH if args.dimensions else None,
+    )
 
-    # Save unique metric registry (THIS feeds metrics.md)
-    metrics = (
-        combined_df[["metric_name"]]
-        .drop_duplicates()
-        .sort_values("metric_name")
-        .reset_index(drop=True)
+    print(
+        f"✅ Saved combined snapshot to {writer.path} "
+        f"({writer.rows_written} rows in {writer.row_groups} row groups)"
     )
 
-    metrics_path = OUTPUT_DIR / "cpid_metric_registry.csv"
-    metrics.to_csv(metrics_path, index=False)
+    # Unique metric registry (THIS feeds metrics.md)
+    print(f"📘 Saved metric registry to {REGISTRY_PATH}")
+    print(f"📊 Total unique metrics: {len(writer.metric_names)}")
 
-    print(f"📘 Saved metric registry to {metrics_path}")
-    print(f"📊 Total unique metrics: {len(metrics)}")
+    if store is not None:
+        compaction = store.compact()
+        print(
+            f"🗂️ Snapshot store updated    : {store.root} "
+            f"(compacted {compaction.files_before} → {compaction.files_after} files)"
+        )
 
 
 if __name__ == "__main__":
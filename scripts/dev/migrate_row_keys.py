@@ -0,0 +1,46 @@
+"""
+Add the unique ``row_key`` column keyed writes need to every ingestion
+table (see ``storage.row_keys``).
+
+The runners write with ``write_mode="skip_existing"`` by default, which
+fails against tables created before row keys existed. The DDL is
+idempotent: re-running it is a no-op.
+
+Usage:
+    PYTHONPATH=src python scripts/dev/migrate_row_keys.py            # print the SQL (e.g. for the Supabase SQL editor)
+    PYTHONPATH=src python scripts/dev/migrate_row_keys.py --apply    # run it against POSTGRES_DSN
+"""
+import argparse
+
+from ingestion.discovery import DATASETS
+from storage.row_keys import row_key_migration_sql
+
+
+def migration_sql(tables=None) -> list:
+    tables = tables or sorted({spec.table for spec in DATASETS.values()})
+    return [statement for table in tables for statement in row_key_migration_sql(table)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", nargs="+", help="Only these tables (default: every dataset table)")
+    parser.add_argument("--apply", action="store_true", help="Execute against POSTGRES_DSN in one transaction")
+    args = parser.parse_args()
+
+    statements = migration_sql(args.tables)
+    if not args.apply:
+        print("\n".join(statements))
+        return
+
+    from storage.postgres_writer import get_postgres_connection
+
+    conn = get_postgres_connection()
+    with conn:
+        with conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+    print(f"✅ Applied {len(statements)} statements ({len(statements) // 2} tables)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,47 @@
+"""
+CPID EDC metrics ingestion into ``cpid_metric_snapshots``.
+
+Runs the shared orchestrator (scripts/dev/run_ingestion.py) for this
+dataset only, over the configured CPID root; use that script to ingest
+every dataset in one pass.
+"""
+import argparse
 from pathlib import Path
 
 from core.config import get_settings
-from ingestion.cpid_extractor import extract_cpid_metrics
-from storage.supabase_writer import insert_dataframe
+from ingestion.orchestrator import run_ingestion
 
 
-TARGET_TABLE = "cpid_metric_snapshots"
+DATASET = "cpid"
 
 
-def main():
-    settings = get_settings()
-    root_dir = Path(settings.data.cpid_root_dir)
+def main(force: bool = False, spool: bool = False, changes_only: bool = False):
+    root_dir = Path(get_settings().data.cpid_root_dir)
 
     if not root_dir.exists():
         raise FileNotFoundError(f"CPID root directory not found: {root_dir}")
 
-    # ------------------------------------------------------------------
-    # Counters / diagnostics
-    # ------------------------------------------------------------------
-    studies_seen = 0
-    studies_attempted: set[str] = set()
-    files_attempted = 0
-    total_inserted = 0
-
-    print(f"📂 Scanning CPID root directory: {root_dir}")
-
-    # ------------------------------------------------------------------
-    # Traverse study folders
-    # ------------------------------------------------------------------
-    for study_dir in root_dir.iterdir():
-        if not study_dir.is_dir():
-            continue
-
-        studies_seen += 1
-        study_id = study_dir.name
-
-        for file_path in study_dir.glob("*.xlsx"):
-            name = file_path.name.lower()
-
-            # 🔑 Robust CPID discovery (no exact string match)
-            if not ("cpid" in name and "metric" in name):
-                continue
-
-            studies_attempted.add(study_id)
-            files_attempted += 1
-
-            print(
-                f"\n▶ Processing CPID "
-                f"study_folder='{study_id}' "
-                f"file='{file_path.name}'"
-            )
-
-            # -------------------------------------------------
-            # 1️⃣ Extract CPID metrics
-            # -------------------------------------------------
-            df = extract_cpid_metrics(str(file_path))
-
-            if df.empty:
-                print("⚠️ No numeric metrics extracted — skipping")
-                continue
-
-            print(f"📦 Extracted {len(df)} metric rows")
-
-            # -------------------------------------------------
-            # 2️⃣ Insert into Supabase
-            # -------------------------------------------------
-            insert_dataframe(
-                df=df,
-                table_name=TARGET_TABLE,
-            )
-
-            total_inserted += len(df)
-
-    # ------------------------------------------------------------------
-    # Final diagnostic summary
-    # ------------------------------------------------------------------
-    print("\n" + "=" * 72)
-    print("📊 CPID INGESTION SUMMARY")
-    print("=" * 72)
-    print(f"📁 Study folders found       : {studies_seen}")
-    print(f"📂 Studies attempted         : {len(studies_attempted)}")
-    print(f"📄 Files attempted           : {files_attempted}")
-    print(f"📥 Total rows inserted       : {total_inserted}")
-
-    skipped = {
-        d.name for d in root_dir.iterdir() if d.is_dir()
-    } - studies_attempted
-
-    if skipped:
-        print(f"⚠️ Studies skipped           : {sorted(skipped)}")
-
-    print("=" * 72)
-
-    if files_attempted == 0:
-        print("⚠️ No CPID files were ingested.")
-    else:
-        print("✅ CPID ingestion completed successfully")
+    report = run_ingestion(root_dir, datasets=[DATASET], force=force, spool=spool, changes_only=changes_only)
+    report.print_summary()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-ingest every file, ignoring the fingerprint manifest",
+    )
+    parser.add_argument(
+        "--spool",
+        action="store_true",
+        help="Write through the on-disk spool (survives backend outages and crashes)",
+    )
+    parser.add_argument(
+        "--changes-only",
+        action="store_true",
+        help="Write only metrics changed since the last written snapshot (artifacts/last_snapshots)",
+    )
+    args = parser.parse_args()
+
+    main(force=args.force, spool=args.spool, changes_only=args.changes_only)
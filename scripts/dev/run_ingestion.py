@@ -0,0 +1,65 @@
+"""
+Ingest every dataset in the study tree in one concurrent run.
+
+Usage:
+    PYTHONPATH=src python scripts/dev/run_ingestion.py [--datasets sae cpid] [--force]
+"""
+import argparse
+from pathlib import Path
+
+from ingestion.discovery import DATASETS, STUDY_ROOT_DIR
+from ingestion.orchestrator import DEFAULT_WRITE_WORKERS, run_ingestion
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", type=Path, default=STUDY_ROOT_DIR, help="Study root directory")
+    parser.add_argument(
+        "--datasets",
+        nargs="+",
+        choices=sorted(DATASETS),
+        help="Only these datasets (default: all)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-ingest every file, ignoring the fingerprint manifest",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument(
+        "--write-workers",
+        type=int,
+        default=DEFAULT_WRITE_WORKERS,
+        help="Concurrent table writes",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Extract but do not write")
+    parser.add_argument(
+        "--spool",
+        action="store_true",
+        help="Write through the on-disk spool (survives backend outages and crashes)",
+    )
+    parser.add_argument(
+        "--changes-only",
+        action="store_true",
+        help="CPID: write only metrics changed since the last written snapshot (artifacts/last_snapshots)",
+    )
+    args = parser.parse_args()
+
+    report = run_ingestion(
+        args.root,
+        datasets=args.datasets,
+        force=args.force,
+        extract_workers=args.workers,
+        write_workers=args.write_workers,
+        dry_run=args.dry_run,
+        spool=args.spool,
+        changes_only=args.changes_only,
+    )
+    report.print_summary()
+
+    if report.failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,35 @@
-from pathlib import Path
-from ingestion.sae_extractor import extract_sae_events
-from storage.supabase_writer import insert_dataframe
+"""
+SAE ingestion into ``sae_events``.
 
-STUDY_ROOT_DIR = Path("QC Anonymized Study Files")
-TARGET_TABLE = "sae_events"
+Runs the shared orchestrator (scripts/dev/run_ingestion.py) for this
+dataset only; use that script to ingest every dataset in one pass.
+"""
+import argparse
 
+from ingestion.discovery import STUDY_ROOT_DIR
+from ingestion.orchestrator import run_ingestion
 
-def run_sae_ingestion():
-    studies_seen = 0
-    studies_attempted = set()
-    files_attempted = 0
-    total_inserted = 0
 
-    for study_dir in STUDY_ROOT_DIR.iterdir():
-        if not study_dir.is_dir():
-            continue
+DATASET = "sae"
 
-        studies_seen += 1
-        study_id = study_dir.name
-        study_had_candidate = False
 
-        # 🔑 scan both xls + xlsx
-        for file in list(study_dir.glob("*.xlsx")) + list(study_dir.glob("*.xls")):
-            name = file.name.lower()
-
-            # 🔑 robust SAE detection
-            if not any(k in name for k in ["sae", "esae", "safety"]):
-                continue
-
-            study_had_candidate = True
-            studies_attempted.add(study_id)
-            files_attempted += 1
-
-            print(
-                f"\n▶ Processing SAE "
-                f"study='{study_id}' file='{file.name}'"
-            )
-
-            df = extract_sae_events(
-                filepath=str(file),
-                study_id_override=study_id,
-            )
-
-            print(f"📦 Extracted {len(df)} SAE events")
-
-            if df.empty:
-                print("⚠️ Empty extract — skipping insert")
-                continue
-
-            insert_dataframe(
-                df=df,
-                table_name=TARGET_TABLE,
-                batch_size=1000,
-            )
-
-            total_inserted += len(df)
-
-        if not study_had_candidate:
-            print(f"⚠️ No SAE files detected for study '{study_id}'")
-
-    # ------------------------------------------------------------------
-    # SUMMARY
-    # ------------------------------------------------------------------
-    print("\n" + "=" * 72)
-    print("📊 SAE INGESTION SUMMARY")
-    print("=" * 72)
-    print(f"📁 Study folders found       : {studies_seen}")
-    print(f"📂 Studies attempted         : {len(studies_attempted)}")
-    print(f"📄 Files attempted           : {files_attempted}")
-    print(f"📥 Total rows inserted       : {total_inserted}")
-    print("=" * 72)
-
-    if files_attempted == 0:
-        print("⚠️ No SAE files were ingested.")
-    else:
-        print("✅ SAE ingestion completed successfully")
+def run_sae_ingestion(force: bool = False, spool: bool = False):
+    report = run_ingestion(STUDY_ROOT_DIR, datasets=[DATASET], force=force, spool=spool)
+    report.print_summary()
 
 
 if __name__ == "__main__":
-    run_sae_ingestion()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-ingest every file, ignoring the fingerprint manifest",
+    )
+    parser.add_argument(
+        "--spool",
+        action="store_true",
+        help="Write through the on-disk spool (survives backend outages and crashes)",
+    )
+    args = parser.parse_args()
+
+    run_sae_ingestion(force=args.force, spool=args.spool)
@@ -1,5 +1,6 @@
 from pathlib import Path
 from functools import lru_cache
+from typing import Optional
 import os
 import yaml
 
@@ -34,6 +35,21 @@ class SupabaseConfig(BaseSettings):
         extra = "ignore"
 
 
+# ---------------------------------------------------------------------
+# Storage backend (YAML-driven; Postgres DSN is ENV-ONLY)
+# ---------------------------------------------------------------------
+class StorageConfig(BaseSettings):
+    # "supabase" (REST) or "postgres" (COPY bulk load)
+    backend: str = "supabase"
+    # COPY encoding for the postgres backend: "csv" or "binary"
+    copy_format: str = "csv"
+    postgres_dsn: Optional[str] = Field(None, alias="POSTGRES_DSN")
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+
 # ---------------------------------------------------------------------
 # Root application config
 # ---------------------------------------------------------------------
@@ -42,6 +58,7 @@ class AppConfig(BaseSettings):
     data: DataConfig
     snapshot: SnapshotConfig
     supabase: SupabaseConfig
+    storage: StorageConfig = Field(default_factory=StorageConfig)
 
 
 # ---------------------------------------------------------------------
@@ -0,0 +1,47 @@
+"""Platform-wide constants."""
+import os
+from pathlib import Path
+
+
+# ---------------------------------------------------------------------
+# Local artifacts / caches (never committed)
+# ---------------------------------------------------------------------
+ARTIFACTS_DIR = Path("artifacts")
+CACHE_ROOT_DIR = Path(os.getenv("CTP_CACHE_DIR", str(ARTIFACTS_DIR / "cache")))
+
+# Write-ahead spool of pending backend writes (must survive cache cleanup)
+SPOOL_DIR = Path(os.getenv("CTP_SPOOL_DIR", str(ARTIFACTS_DIR / "spool")))
+
+# Hive-partitioned local columnar store of metric snapshots
+SNAPSHOT_STORE_DIR = Path(
+    os.getenv("CTP_SNAPSHOT_STORE_DIR", str(ARTIFACTS_DIR / "snapshot_store"))
+)
+
+# Base + per-run delta history of metric snapshots (as-of reads)
+SNAPSHOT_HISTORY_DIR = Path(
+    os.getenv("CTP_SNAPSHOT_HISTORY_DIR", str(ARTIFACTS_DIR / "snapshot_history"))
+)
+
+# Last snapshot written per CPID file (the base of change-only writes)
+LAST_SNAPSHOTS_DIR = Path(
+    os.getenv("CTP_LAST_SNAPSHOTS_DIR", str(ARTIFACTS_DIR / "last_snapshots"))
+)
+
+# Surrogate-key dimension registry (IDs must stay stable; not a cache)
+DIMENSIONS_PATH = Path(
+    os.getenv("CTP_DIMENSIONS_PATH", str(ARTIFACTS_DIR / "dimensions.json"))
+)
+
+
+# ---------------------------------------------------------------------
+# Declarative report source specs (checked in, one YAML per source)
+# ---------------------------------------------------------------------
+SOURCE_SPECS_DIR = Path(
+    os.getenv(
+        "CTP_SOURCE_SPECS_DIR",
+        str(Path(__file__).resolve().parents[2] / "config" / "sources"),
+    )
+)
+
+# Spreadsheet reader engine for ingestion.file_ingest ("auto" detects)
+READER_ENGINE = os.getenv("CTP_READER_ENGINE", "auto")
@@ -1,20 +1,14 @@
 import pandas as pd
 from typing import Optional
 
+from ingestion.sources import get_source
+
 # ---------------------------------------------------------------------
-# Column contract (LOCKED)
+# Column contract (LOCKED) — config/sources/coding_whodrug.yaml
 # ---------------------------------------------------------------------
-COLUMN_MAP = {
-    "Study": "study_id",
-    "Subject": "subject_id",
-    "Dictionary": "dictionary",
-    "Dictionary Version number": "dictionary_version",
-    "Form OID": "form_oid",
-    "Logline": "logline",
-    "Field OID": "field_oid",
-    "Coding Status": "coding_status",
-    "Require Coding": "require_coding",
-}
+SOURCE = get_source("coding_whodrug")
+COLUMN_MAP = SOURCE.column_map
+NORMALIZATION_SPEC = SOURCE.normalization
 
 
 def extract_coding_whodrug_events(
@@ -25,76 +19,4 @@ def extract_coding_whodrug_events(
     """
     Normalize WHODrug Coding Report into canonical coding_whodrug_events.
     """
-
-    df = pd.read_excel(filepath)
-
-    # Rename columns
-    df = df.rename(columns=COLUMN_MAP)
-
-    # Ensure required columns exist
-    required_cols = [
-        "study_id",
-        "subject_id",
-        "dictionary",
-        "dictionary_version",
-        "form_oid",
-        "logline",
-        "field_oid",
-        "coding_status",
-        "require_coding",
-    ]
-    for col in required_cols:
-        if col not in df.columns:
-            df[col] = pd.NA
-
-    # Numeric coercion
-    df["logline"] = pd.to_numeric(df["logline"], errors="coerce")
-
-    # Inject study_id if needed
-    if study_id_override is not None:
-        df["study_id"] = study_id_override
-
-    # Add source
-    df["source"] = "Coding_WHODrug"
-
-    # Drop rows without subject_id (guardrail)
-    df = df[df["subject_id"].notna()]
-
-    # 🔑 JSON-safe conversion
-    df = df.astype(object)
-    df = df.where(pd.notna(df), None)
-
-    # Explicit string casting
-    string_cols = [
-        "study_id",
-        "subject_id",
-        "dictionary",
-        "dictionary_version",
-        "form_oid",
-        "field_oid",
-        "coding_status",
-        "require_coding",
-        "source",
-    ]
-    for col in string_cols:
-        df[col] = df[col].apply(lambda x: str(x) if x is not None else None)
-
-    # Ensure logline is int or None
-    df["logline"] = df["logline"].apply(
-        lambda x: int(x) if isinstance(x, (int, float)) and x is not None else None
-    )
-
-    return df[
-        [
-            "study_id",
-            "subject_id",
-            "dictionary",
-            "dictionary_version",
-            "form_oid",
-            "logline",
-            "field_oid",
-            "coding_status",
-            "require_coding",
-            "source",
-        ]
-    ]
+    return SOURCE.extract(filepath, study_id_override)
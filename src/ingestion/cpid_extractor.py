@@ -1,8 +1,19 @@
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
 import re
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from collections import defaultdict
-from typing import Dict, Tuple, Optional
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Optional
+
+from openpyxl import load_workbook
+
+from core.constants import CACHE_ROOT_DIR
+from ingestion.file_ingest import read_sheet
 
 
 # ---------------------------------------------------------------------
@@ -45,40 +56,156 @@ IDENTITY_COLS = {
 }
 
 
+SUBJECT_COL = ("Subject ID", "Unnamed: 4_level_1")
+SITE_COL = ("Site ID", "Unnamed: 3_level_1")
+
+SOURCE_NAME = "CPID_EDC_Metrics"
+
+# Streaming defaults
+DEFAULT_SNAPSHOT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_ROWS = 500
+
+SNAPSHOT_COLUMNS = [
+    "entity_type",
+    "entity_id",
+    "site_id",
+    "metric_name",
+    "metric_value",
+    "snapshot_time",
+    "source",
+]
+
+
 # ---------------------------------------------------------------------
-# Public API
+# Header plan (computed once per header, not per cell)
 # ---------------------------------------------------------------------
-def extract_cpid_metrics(filepath: str) -> pd.DataFrame:
+# Bump when metric naming changes so persisted plans are invalidated
+HEADER_PLAN_VERSION = 1
+HEADER_PLAN_CACHE_DIR = CACHE_ROOT_DIR / "cpid_header_plans"
+
+
+@dataclass(frozen=True)
+class CpidHeaderPlan:
     """
-    Extract CPID EDC Metrics into canonical MetricSnapshot rows.
+    Compiled metric resolution for one CPID header layout.
 
-    Parameters
-    ----------
-    filepath : str
-        Path to CPID_EDC_Metrics_*.xlsx file
+    ``metric_names[i]`` is the metric emitted for physical column
+    ``positions[i]``; identity columns are absent.
+    """
+
+    fingerprint: str
+    positions: np.ndarray
+    metric_names: np.ndarray
+
+
+_HEADER_PLANS: Dict[str, CpidHeaderPlan] = {}
+
+
+def _header_fingerprint(columns) -> str:
+    payload = json.dumps(
+        [HEADER_PLAN_VERSION, [list(col) for col in columns]],
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_header_plan(
+    columns,
+    *,
+    cache_dir: Optional[Path] = None,
+) -> CpidHeaderPlan:
+    """
+    Return the header plan for a two-row CPID header.
+
+    Plans are memoized in process and persisted as JSON under
+    ``cache_dir`` (default ``HEADER_PLAN_CACHE_DIR``), so studies that
+    share a CPID template skip header analysis entirely.
+    """
+    fingerprint = _header_fingerprint(columns)
+
+    plan = _HEADER_PLANS.get(fingerprint)
+    if plan is not None:
+        return plan
+
+    cache_dir = Path(cache_dir or HEADER_PLAN_CACHE_DIR)
+    plan_path = cache_dir / f"{fingerprint}.json"
+
+    plan = _load_header_plan(plan_path, fingerprint, len(columns))
+
+    if plan is None:
+        positions, metric_names = _build_metric_plan(columns)
+        plan = CpidHeaderPlan(
+            fingerprint=fingerprint,
+            positions=np.asarray(positions, dtype=np.int64),
+            metric_names=np.asarray(metric_names, dtype=object),
+        )
+        _save_header_plan(plan_path, plan)
+
+    _HEADER_PLANS[fingerprint] = plan
+    return plan
+
+
+def _load_header_plan(
+    plan_path: Path,
+    fingerprint: str,
+    n_columns: int,
+) -> Optional[CpidHeaderPlan]:
+    try:
+        with open(plan_path, "r") as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    positions = raw.get("positions", [])
+    metric_names = raw.get("metric_names", [])
+
+    # Never trust a plan that does not fit this header
+    if len(positions) != len(metric_names) or any(
+        not 0 <= p < n_columns for p in positions
+    ):
+        return None
+
+    return CpidHeaderPlan(
+        fingerprint=fingerprint,
+        positions=np.asarray(positions, dtype=np.int64),
+        metric_names=np.asarray(metric_names, dtype=object),
+    )
+
+
+def _save_header_plan(plan_path: Path, plan: CpidHeaderPlan) -> None:
+    # Best effort: an unwritable cache must never fail an extraction
+    try:
+        plan_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = plan_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": HEADER_PLAN_VERSION,
+                    "positions": plan.positions.tolist(),
+                    "metric_names": plan.metric_names.tolist(),
+                },
+                f,
+            )
+        os.replace(tmp_path, plan_path)
+    except OSError:
+        pass
+
+
+def _build_metric_plan(columns) -> Tuple[List[int], List[str]]:
+    """
+    Resolve every non-identity column of a CPID header to its
+    contract-frozen metric name.
 
     Returns
     -------
-    pd.DataFrame
-        Columns:
-        - entity_type
-        - entity_id
-        - site_id
-        - metric_name
-        - metric_value
-        - snapshot_time
-        - source
+    (positions, metric_names)
+        Physical column positions and the metric name emitted for each.
     """
 
-    # Load Excel with two-row header
-    df = pd.read_excel(filepath, header=[0, 1])
-
-    # -----------------------------------------------------------------
-    # STEP 1: Pre-compute bucket indices per COLUMN (global, deterministic)
-    # -----------------------------------------------------------------
+    # Pre-compute bucket indices per COLUMN (global, deterministic)
     column_bucket_map: Dict[Tuple[str, str], list] = defaultdict(list)
 
-    for group, label in df.columns:
+    for group, label in columns:
         base_label, bucket = _extract_base_and_bucket(label)
         column_bucket_map[(group, base_label)].append((label, bucket))
 
@@ -92,9 +219,7 @@ def extract_cpid_metrics(filepath: str) -> pd.DataFrame:
                 bucket_idx = bucket if bucket is not None else 0
                 column_bucket_index[(group, label)] = bucket_idx
 
-    # -----------------------------------------------------------------
     # Metric name normalizer (contract-frozen)
-    # -----------------------------------------------------------------
     def normalize_metric(group: str, label: str) -> str:
         base_label, _ = _extract_base_and_bucket(label)
         base_name = f"{_clean(group)}__{_clean(base_label)}"
@@ -105,15 +230,415 @@ def extract_cpid_metrics(filepath: str) -> pd.DataFrame:
 
         return base_name
 
-    # -----------------------------------------------------------------
-    # Emit MetricSnapshots
-    # -----------------------------------------------------------------
-    snapshots = []
+    positions: List[int] = []
+    metric_names: List[str] = []
+
+    for position, col in enumerate(columns):
+        if col in IDENTITY_COLS:
+            continue
+
+        group, label = col
+        positions.append(position)
+        metric_names.append(normalize_metric(group, label))
+
+    return positions, metric_names
+
+
+def _coerce_numeric(values: pd.Series) -> np.ndarray:
+    """
+    Column-wise equivalent of ``pd.to_numeric(cell, errors="coerce")``.
+
+    Datetime columns are treated as non-numeric, matching the scalar
+    behaviour (a Timestamp cell coerces to NaN, not to epoch nanoseconds).
+    """
+    dtype = values.dtype
+
+    if pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype):
+        return np.full(len(values), np.nan)
+
+    if pd.api.types.is_numeric_dtype(dtype):
+        return values.to_numpy(dtype="float64", na_value=np.nan)
+
+    return pd.to_numeric(values.astype(object), errors="coerce").to_numpy(
+        dtype="float64", na_value=np.nan
+    )
+
+
+def _empty_snapshots() -> pd.DataFrame:
+    return pd.DataFrame([], columns=SNAPSHOT_COLUMNS)
+
+
+# ---------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------
+def build_cpid_snapshots(
+    df: pd.DataFrame,
+    *,
+    snapshot_time: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Reshape a parsed two-row-header CPID frame into MetricSnapshot rows.
+
+    Columnar engine: the metric plan is looked up once per header (see
+    :func:`get_header_plan`), numeric coercion runs per column, and the wide matrix is reshaped
+    to long form with a NaN mask. Output rows are ordered subject-major
+    exactly as the original row-by-row loop emitted them.
+    """
+    if snapshot_time is None:
+        snapshot_time = datetime.now(timezone.utc).isoformat()
+
+    # Skip header / aggregate / empty rows
+    if SUBJECT_COL not in df.columns:
+        return _empty_snapshots()
+
+    row_mask = df[SUBJECT_COL].notna().to_numpy()
+    frame = df.loc[row_mask]
+
+    plan = get_header_plan(frame.columns)
+
+    if frame.empty or len(plan.positions) == 0:
+        return _empty_snapshots()
+
+    # 🔒 Enforce numeric-only metrics (text / categorical columns → NaN)
+    values = np.column_stack(
+        [_coerce_numeric(frame.iloc[:, position]) for position in plan.positions]
+    )
+
+    # Row-major nonzero keeps the subject → column emission order
+    row_idx, metric_idx = np.nonzero(~np.isnan(values))
+
+    if len(row_idx) == 0:
+        return _empty_snapshots()
+
+    entity_ids = frame[SUBJECT_COL].to_numpy()[row_idx]
+
+    if SITE_COL in frame.columns:
+        site_ids = frame[SITE_COL].to_numpy()[row_idx]
+    else:
+        site_ids = np.full(len(row_idx), None, dtype=object)
+
+    return pd.DataFrame(
+        {
+            "entity_type": "subject",
+            "entity_id": entity_ids,
+            "site_id": site_ids,
+            "metric_name": plan.metric_names[metric_idx],
+            "metric_value": values[row_idx, metric_idx],
+            "snapshot_time": snapshot_time,
+            "source": SOURCE_NAME,
+        },
+        columns=SNAPSHOT_COLUMNS,
+    )
+
+
+def extract_cpid_metrics(filepath: str) -> pd.DataFrame:
+    """
+    Extract CPID EDC Metrics into canonical MetricSnapshot rows.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to CPID_EDC_Metrics_*.xlsx file
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns:
+        - entity_type
+        - entity_id
+        - site_id
+        - metric_name
+        - metric_value
+        - snapshot_time
+        - source
+    """
+
+    # Load Excel with two-row header
+    df = read_sheet(filepath, header=[0, 1])
+
+    return build_cpid_snapshots(df)
+
+
+def iter_cpid_metric_batches(
+    filepath: str,
+    *,
+    batch_size: int = DEFAULT_SNAPSHOT_BATCH_SIZE,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """
+    Streaming variant of :func:`extract_cpid_metrics`.
+
+    The two-row header is parsed once; data rows are then read from a
+    read-only workbook in ``chunk_rows`` chunks and reshaped by the
+    columnar engine. Snapshot rows are yielded in DataFrames of exactly
+    ``batch_size`` rows (the last batch may be shorter), so peak memory
+    is bounded by one chunk plus one batch regardless of study size.
+
+    All batches of one call share a single ``snapshot_time``.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
+
+    header = read_sheet(filepath, header=[0, 1], nrows=0).columns
     snapshot_time = datetime.now(timezone.utc).isoformat()
 
+    pending: List[pd.DataFrame] = []
+    pending_rows = 0
+
+    for chunk in _iter_cpid_row_chunks(filepath, header, chunk_rows):
+        snapshots = build_cpid_snapshots(chunk, snapshot_time=snapshot_time)
+
+        if snapshots.empty:
+            continue
+
+        pending.append(snapshots)
+        pending_rows += len(snapshots)
+
+        if pending_rows < batch_size:
+            continue
+
+        buffered = pd.concat(pending, ignore_index=True)
+        full_batches = pending_rows // batch_size
+
+        for i in range(full_batches):
+            start = i * batch_size
+            yield buffered.iloc[start:start + batch_size].reset_index(drop=True)
+
+        rest = buffered.iloc[full_batches * batch_size:]
+        pending = [rest] if len(rest) else []
+        pending_rows = len(rest)
+
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def _iter_cpid_row_chunks(
+    filepath: str,
+    header: pd.MultiIndex,
+    chunk_rows: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the data rows below the two-row header as DataFrames of at
+    most ``chunk_rows`` rows, labelled with ``header``.
+    """
+    width = len(header)
+    # pandas' Excel reader turns integral floats into ints; mirror that
+    # for the identity columns so entity/site ids keep the same type.
+    id_positions = [
+        header.get_loc(col) for col in (SUBJECT_COL, SITE_COL) if col in header
+    ]
+
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+
+    try:
+        ws = wb.worksheets[0]
+        rows: List[list] = []
+
+        for values in ws.iter_rows(min_row=3, values_only=True):
+            row = list(values[:width])
+            if len(row) < width:
+                row.extend([None] * (width - len(row)))
+
+            for position in id_positions:
+                value = row[position]
+                if isinstance(value, float) and value.is_integer():
+                    row[position] = int(value)
+
+            rows.append(row)
+
+            if len(rows) >= chunk_rows:
+                yield _rows_to_frame(rows, header)
+                rows = []
+
+        if rows:
+            yield _rows_to_frame(rows, header)
+    finally:
+        wb.close()
+
+
+def _rows_to_frame(rows: List[list], header: pd.MultiIndex) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(rows, columns=range(len(header)))
+    df.columns = header
+    return df
+
+
+# ---------------------------------------------------------------------
+# Snapshot diff
+# ---------------------------------------------------------------------
+CPID_DIFF_KEY = ("entity_id", "metric_name")
+
+CHANGE_INSERTED = "inserted"
+CHANGE_CHANGED = "changed"
+CHANGE_REMOVED = "removed"
+
+DIFF_COLUMNS = SNAPSHOT_COLUMNS + ["change_type", "previous_value"]
+
+
+@dataclass
+class CpidSnapshotDiff:
+    """
+    Changed metric values between two snapshots of one study.
+
+    ``changes`` has the snapshot columns plus ``change_type`` and
+    ``previous_value``; removed metrics carry ``metric_value`` NaN and
+    the current run's ``snapshot_time``.
+    """
+
+    changes: pd.DataFrame
+    inserted: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+    @property
+    def empty(self) -> bool:
+        return self.changes.empty
+
+    def upserts(self) -> pd.DataFrame:
+        """Inserted + changed rows in snapshot columns (what to write)."""
+        rows = self.changes[self.changes["change_type"] != CHANGE_REMOVED]
+        return rows[SNAPSHOT_COLUMNS].reset_index(drop=True)
+
+
+def _key_strings(values: pd.Series) -> pd.Series:
+    """
+    A key column as ``string``, as ``snapshot_table`` stores it. Integral
+    floats lose their ".0": an id that went through a float column (a
+    Parquet / history read-back with nulls) must still match the int
+    Excel gives for it.
+    """
+    strings = values.astype("string")
+    if pd.api.types.is_float_dtype(values):
+        floats = values
+    elif values.dtype == object:
+        floats = pd.to_numeric(values.where(values.map(lambda v: isinstance(v, float))), errors="coerce")
+    else:
+        return strings
+
+    with np.errstate(invalid="ignore"):
+        integral = (floats % 1 == 0).fillna(False).to_numpy(dtype=bool)
+    strings[integral] = floats[integral].astype("int64").astype("string")
+    return strings
+
+
+def _diff_key_index(df: pd.DataFrame, key: Tuple[str, ...]) -> pd.MultiIndex:
+    # Entity ids come back as int, float or str depending on the run
+    return pd.MultiIndex.from_arrays([_key_strings(df[column]) for column in key])
+
+
+def diff_cpid_snapshots(
+    previous: pd.DataFrame,
+    current: pd.DataFrame,
+    *,
+    key: Tuple[str, ...] = CPID_DIFF_KEY,
+    tolerance: float = 0.0,
+) -> CpidSnapshotDiff:
+    """
+    Compare a freshly extracted snapshot with the previous one for the
+    same study.
+
+    The previous snapshot is hashed on ``key`` once and every current row
+    is probed against it (a hash join), so the cost is linear in the two
+    snapshot sizes.
+
+    Parameters
+    ----------
+    previous, current : pd.DataFrame
+        Snapshot rows (``SNAPSHOT_COLUMNS``); ``previous`` may be empty
+        (even column-less) for a study's first run, which makes every
+        current row an insert. Duplicate keys keep their last row.
+    key : tuple of str
+        Join columns identifying one metric value.
+    tolerance : float
+        Absolute difference below which a value counts as unchanged.
+
+    Returns
+    -------
+    CpidSnapshotDiff
+        Inserted, changed and removed rows only.
+    """
+    key = tuple(key)
+    if previous.empty:
+        previous = pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    previous = previous.loc[~_diff_key_index(previous, key).duplicated(keep="last")]
+    current = current.loc[~_diff_key_index(current, key).duplicated(keep="last")]
+
+    previous_index = _diff_key_index(previous, key)
+    position = previous_index.get_indexer(_diff_key_index(current, key))
+    matched = position >= 0
+
+    current_values = pd.to_numeric(current["metric_value"], errors="coerce").to_numpy(dtype="float64")
+    previous_values = pd.to_numeric(previous["metric_value"], errors="coerce").to_numpy(dtype="float64")
+
+    before = np.full(len(current), np.nan)
+    before[matched] = previous_values[position[matched]]
+
+    both_nan = np.isnan(current_values) & np.isnan(before)
+    with np.errstate(invalid="ignore"):
+        same = (np.abs(current_values - before) <= tolerance) | both_nan
+    changed = matched & ~same
+
+    kept = np.zeros(len(previous), dtype=bool)
+    kept[position[matched]] = True
+    removed = previous.loc[~kept, SNAPSHOT_COLUMNS].copy()
+
+    upserts = current.loc[~matched | changed, SNAPSHOT_COLUMNS].copy()
+    upserts["change_type"] = np.where(matched[~matched | changed], CHANGE_CHANGED, CHANGE_INSERTED)
+    upserts["previous_value"] = before[~matched | changed]
+
+    removed["previous_value"] = removed["metric_value"].astype("float64")
+    removed["metric_value"] = np.nan
+    removed["change_type"] = CHANGE_REMOVED
+    if len(current):
+        removed["snapshot_time"] = current["snapshot_time"].iloc[0]
+
+    frames = [frame for frame in (upserts, removed[DIFF_COLUMNS]) if len(frame)]
+    changes = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame([], columns=DIFF_COLUMNS)
+    )
+
+    return CpidSnapshotDiff(
+        changes=changes,
+        inserted=int((~matched).sum()),
+        changed=int(changed.sum()),
+        removed=int((~kept).sum()),
+        unchanged=int((matched & same).sum()),
+    )
+
+
+def extract_cpid_metric_changes(filepath: str, previous: pd.DataFrame) -> CpidSnapshotDiff:
+    """
+    :func:`extract_cpid_metrics` followed by :func:`diff_cpid_snapshots`
+    against ``previous`` (e.g. ``SnapshotHistory.as_of(study)``).
+    """
+    return diff_cpid_snapshots(previous, extract_cpid_metrics(filepath))
+
+
+# ---------------------------------------------------------------------
+# Reference implementation (row-by-row)
+# ---------------------------------------------------------------------
+def _build_cpid_snapshots_rowwise(
+    df: pd.DataFrame,
+    *,
+    snapshot_time: str,
+) -> pd.DataFrame:
+    """
+    Original iterrows engine. Kept as the equivalence oracle for tests
+    and as the baseline in scripts/analysis/benchmark_cpid_extraction.py.
+    """
+    positions, metric_names = _build_metric_plan(df.columns)
+    metric_name_by_col = {
+        df.columns[position]: name
+        for position, name in zip(positions, metric_names)
+    }
+
+    snapshots = []
+
     for _, row in df.iterrows():
-        subject_id = row.get(("Subject ID", "Unnamed: 4_level_1"))
-        site_id = row.get(("Site ID", "Unnamed: 3_level_1"))
+        subject_id = row.get(SUBJECT_COL)
+        site_id = row.get(SITE_COL)
 
         # Skip header / aggregate / empty rows
         if pd.isna(subject_id):
@@ -123,16 +648,13 @@ def extract_cpid_metrics(filepath: str) -> pd.DataFrame:
             if col in IDENTITY_COLS:
                 continue
 
-            group, label = col
             value = row[col]
 
             if pd.isna(value):
                 continue
 
-            # 🔒 Enforce numeric-only metrics
             numeric_value = pd.to_numeric(value, errors="coerce")
 
-            # Skip text / categorical / metadata columns
             if pd.isna(numeric_value):
                 continue
 
@@ -141,25 +663,14 @@ def extract_cpid_metrics(filepath: str) -> pd.DataFrame:
                     "entity_type": "subject",
                     "entity_id": subject_id,
                     "site_id": site_id,
-                    "metric_name": normalize_metric(group, label),
+                    "metric_name": metric_name_by_col[col],
                     "metric_value": float(numeric_value),
                     "snapshot_time": snapshot_time,
-                    "source": "CPID_EDC_Metrics",
+                    "source": SOURCE_NAME,
                 }
             )
 
-    return pd.DataFrame(
-        snapshots,
-        columns=[
-            "entity_type",
-            "entity_id",
-            "site_id",
-            "metric_name",
-            "metric_value",
-            "snapshot_time",
-            "source",
-        ],
-    )
+    return pd.DataFrame(snapshots, columns=SNAPSHOT_COLUMNS)
 
 
 # TODO: add ingestion_run_id for lineage in production
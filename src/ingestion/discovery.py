@@ -0,0 +1,156 @@
+"""
+Study-tree discovery and dataset classification.
+
+One pass over the study root lists every candidate workbook and
+classifies it to the dataset(s) whose file-name pattern it matches.
+Report datasets (and their patterns) come from the declarative source
+specs in ``ingestion.sources``.
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from ingestion.sources import SourceSpec, get_sources
+
+
+STUDY_ROOT_DIR = Path("QC Anonymized Study Files")
+
+
+# ---------------------------------------------------------------------
+# File-name matchers (case-insensitive, on the bare file name)
+# ---------------------------------------------------------------------
+def is_cpid_file(name: str) -> bool:
+    name = name.lower()
+    return "cpid" in name and "metric" in name
+
+
+# ---------------------------------------------------------------------
+# Extractor adapters: (filepath, study_id) -> canonical rows
+# ---------------------------------------------------------------------
+def _extract_cpid(filepath: str, study_id: str) -> pd.DataFrame:
+    from ingestion.cpid_extractor import extract_cpid_metrics
+
+    return extract_cpid_metrics(filepath)
+
+
+def _stream_cpid(filepath: str, study_id: str) -> Iterator[pd.DataFrame]:
+    from ingestion.cpid_extractor import iter_cpid_metric_batches
+
+    return iter_cpid_metric_batches(filepath)
+
+
+def _diff_cpid(previous: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    from ingestion.cpid_extractor import SNAPSHOT_COLUMNS, diff_cpid_snapshots
+
+    # Removed metrics go out as null values at the current snapshot_time
+    return diff_cpid_snapshots(previous, current).changes[SNAPSHOT_COLUMNS]
+
+
+# ---------------------------------------------------------------------
+# Dataset registry
+# ---------------------------------------------------------------------
+@dataclass(frozen=True)
+class DatasetSpec:
+    name: str
+    label: str
+    table: str
+    matches: Callable[[str], bool]
+    extract: Callable[[str, str], pd.DataFrame]
+    suffixes: Tuple[str, ...] = (".xlsx",)
+    # Extra storage.writer options for this table
+    write_options: Dict[str, object] = field(default_factory=dict)
+    # Batched variant of extract, for files too large to hold as one frame
+    stream: Optional[Callable[[str, str], Iterator[pd.DataFrame]]] = None
+    # (previous, current) -> the rows to write when only changes are sent
+    diff: Optional[Callable[[pd.DataFrame, pd.DataFrame], pd.DataFrame]] = None
+
+
+def _from_source(source: SourceSpec) -> DatasetSpec:
+    return DatasetSpec(
+        source.name, source.label, source.table, source.matches, source.extract,
+        suffixes=source.suffixes,
+        write_options=source.write_options,
+    )
+
+
+# CPID is the one hand-written extractor; every report source comes from
+# its config/sources/*.yaml spec
+DATASETS: Dict[str, DatasetSpec] = {
+    spec.name: spec
+    for spec in [
+        DatasetSpec(
+            "cpid", "CPID", "cpid_metric_snapshots", is_cpid_file, _extract_cpid,
+            stream=_stream_cpid,
+            diff=_diff_cpid,
+        ),
+        *(_from_source(source) for source in get_sources().values()),
+    ]
+}
+
+
+def classify_file(
+    path: Union[str, Path],
+    datasets: Optional[Iterable[str]] = None,
+) -> List[DatasetSpec]:
+    """
+    Every dataset whose pattern and suffix match ``path``, in registry
+    order (a file can feed more than one table, as it did when each
+    runner scanned the tree on its own).
+    """
+    path = Path(path)
+    names = DATASETS if datasets is None else list(datasets)
+    return [
+        DATASETS[name]
+        for name in names
+        if path.suffix.lower() in DATASETS[name].suffixes and DATASETS[name].matches(path.name)
+    ]
+
+
+@dataclass(frozen=True)
+class StudyFile:
+    study_id: str
+    path: Path
+    size: int
+    dataset: DatasetSpec
+
+
+def discover_study_files(
+    root_dir: Union[str, Path] = STUDY_ROOT_DIR,
+    datasets: Optional[Iterable[str]] = None,
+) -> Tuple[List[str], List[StudyFile]]:
+    """
+    Single pass over ``root_dir``: every study folder, and one
+    StudyFile per (workbook, matching dataset).
+
+    Returns
+    -------
+    (study_ids, files)
+        All study folder names (sorted) and the classified files.
+    """
+    datasets = None if datasets is None else list(datasets)
+    unknown = set(datasets or ()) - set(DATASETS)
+    if unknown:
+        raise ValueError(f"Unknown datasets {sorted(unknown)}; expected {sorted(DATASETS)}")
+
+    study_ids: List[str] = []
+    files: List[StudyFile] = []
+
+    with os.scandir(root_dir) as studies:
+        for study in sorted(studies, key=lambda entry: entry.name):
+            if not study.is_dir():
+                continue
+            study_ids.append(study.name)
+
+            with os.scandir(study.path) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if not entry.is_file():
+                        continue
+                    for spec in classify_file(entry.name, datasets):
+                        files.append(
+                            StudyFile(study.name, Path(entry.path), entry.stat().st_size, spec)
+                        )
+
+    return study_ids, files
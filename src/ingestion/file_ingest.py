@@ -1,4 +1,509 @@
 """
 Snapshot file ingestion (CSV / XLSX).
 Primary ingestion path for hackathon datasets.
+
+All extractors read workbooks through :func:`read_sheet`, which serves
+repeat reads of an unchanged file from the content-addressed Parquet
+sheet cache instead of re-parsing the xlsx.
+
+Reads can be column-projected: the header row is sniffed first and only
+the physical columns an extractor's contract names are parsed. With the
+streaming engine only those columns' cells are converted and handed to
+pandas' parser.
+
+Parsing goes through a pluggable reader engine (:data:`READER_ENGINES`):
+pandas' ``default``, ``openpyxl_stream`` (openpyxl's read-only mode)
+and ``calamine`` when python-calamine is installed. The engine is set with
+``CTP_READER_ENGINE`` / :func:`configure_reader_engine` or picked per
+file (``auto``); every engine returns the frame ``pd.read_excel`` would.
+
+Multi-sheet workbooks are opened once with :func:`open_workbook`; every
+sheet's header and (projected) read then share that one open.
 """
+import importlib.util
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+from core.constants import CACHE_ROOT_DIR, READER_ENGINE
+from storage.cache.sheet_cache import SheetCache
+from utils.hashing import file_sha256
+
+
+SHEET_CACHE_DIR = CACHE_ROOT_DIR / "sheets"
+
+_sheet_cache: Optional[SheetCache] = None
+_sheet_cache_enabled = True
+
+
+def get_sheet_cache() -> SheetCache:
+    """
+    Returns the process-wide sheet cache (hit/miss stats live on
+    ``get_sheet_cache().stats``).
+    """
+    global _sheet_cache
+
+    if _sheet_cache is None:
+        _sheet_cache = SheetCache(SHEET_CACHE_DIR)
+
+    return _sheet_cache
+
+
+def configure_sheet_cache(
+    *,
+    enabled: bool = True,
+    cache_dir: Optional[Path] = None,
+    max_bytes: Optional[int] = None,
+    max_age_days: Optional[float] = None,
+) -> None:
+    """
+    Override sheet cache location / eviction limits, or disable it.
+    """
+    global _sheet_cache, _sheet_cache_enabled
+
+    _sheet_cache_enabled = enabled
+
+    kwargs = {}
+    if max_bytes is not None:
+        kwargs["max_bytes"] = max_bytes
+    if max_age_days is not None:
+        kwargs["max_age_days"] = max_age_days
+
+    _sheet_cache = SheetCache(cache_dir or SHEET_CACHE_DIR, **kwargs)
+
+
+# ---------------------------------------------------------------------
+# Header sniffing / column projection
+# ---------------------------------------------------------------------
+def resolve_usecols(header: List[Any], columns: Iterable[str]) -> List[int]:
+    """Positions of the header labels listed in ``columns``."""
+    wanted = set(columns)
+    return [i for i, label in enumerate(header) if label in wanted]
+
+
+def _split_sheet_kwargs(read_kwargs: Dict[str, Any]):
+    sheet_name = read_kwargs.get("sheet_name", 0)
+    header = read_kwargs.get("header", 0)
+    rest = {k: v for k, v in read_kwargs.items() if k not in ("sheet_name", "header", "engine")}
+    return sheet_name, header, rest
+
+
+# ---------------------------------------------------------------------
+# Streaming openpyxl engine
+# ---------------------------------------------------------------------
+# read_excel options _StreamingXlsxBook hands to pandas' text parser
+# itself; anything else is read by pandas' openpyxl reader
+_STREAMED_KWARGS = (
+    "nrows", "dtype", "na_values", "keep_default_na", "na_filter",
+    "true_values", "false_values", "thousands", "decimal",
+)
+
+
+def _convert_cell(cell) -> Any:
+    # As pandas' openpyxl reader converts a cell
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+    return value
+
+
+class _StreamingXlsxBook:
+    """
+    A ``pd.ExcelFile``-like book over openpyxl's read-only mode
+    (``load_workbook(read_only=True)`` / ``iter_rows``). Rows stream
+    from the sheet XML and stop once ``nrows`` are read; a projected
+    read converts only the selected columns' cells and hands just those
+    to pandas' text parser, so header handling and type inference stay
+    pandas' own. One open serves every header sniff and read.
+    """
+
+    def __init__(self, filepath: Union[str, Path]):
+        self.filepath = filepath
+        self._book = openpyxl.load_workbook(filepath, read_only=True, data_only=True, keep_links=False)
+        self._fallback: Optional[pd.ExcelFile] = None
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self._book.sheetnames
+
+    def _rows(self, sheet, usecols: Optional[List[int]], limit: Optional[int]) -> list:
+        # Rows as pandas' reader builds them: trailing blank rows dropped
+        # (a value outside usecols still keeps its row), short rows padded
+        sheet.reset_dimensions()
+        data: list = []
+        last_row_with_data = -1
+        for cells in sheet.iter_rows():
+            if limit is not None and len(data) >= limit:
+                break
+            if any(cell.value is not None and cell.value != "" for cell in cells):
+                last_row_with_data = len(data)
+            if usecols is None:
+                row = [_convert_cell(cell) for cell in cells]
+                while row and row[-1] == "":
+                    row.pop()
+            else:
+                row = [_convert_cell(cells[i]) if i < len(cells) else "" for i in usecols]
+            data.append(row)
+
+        data = data[: last_row_with_data + 1]
+        if data:
+            width = max(len(row) for row in data)
+            data = [row + [""] * (width - len(row)) for row in data]
+        return data
+
+    def parse(
+        self,
+        sheet_name: Union[str, int] = 0,
+        header: Optional[int] = 0,
+        usecols: Optional[List[int]] = None,
+        **kwargs,
+    ) -> pd.DataFrame:
+        streamed = (
+            (header is None or isinstance(header, int))
+            and (usecols is None or all(isinstance(i, int) for i in usecols))
+            and set(kwargs) <= set(_STREAMED_KWARGS)
+        )
+        if not streamed:
+            if self._fallback is None:
+                self._fallback = pd.ExcelFile(self.filepath, engine="openpyxl")
+            return self._fallback.parse(sheet_name=sheet_name, header=header, usecols=usecols, **kwargs)
+
+        sheet = self._book[sheet_name] if isinstance(sheet_name, str) else self._book.worksheets[sheet_name]
+        nrows = kwargs.get("nrows")
+        header_rows = 1 + (header or 0)
+        data = self._rows(sheet, usecols, None if nrows is None else header_rows + nrows)
+        if not data:
+            return pd.DataFrame()
+
+        df = TextParser(data, header=header, skip_blank_lines=False, **kwargs).read(nrows)
+        if usecols is not None:
+            # Labels as the full header row gives them (duplicates mangled,
+            # blanks "Unnamed: <position>")
+            if header is None:
+                df.columns = usecols
+            else:
+                full = self._rows(sheet, None, header_rows)
+                width = max([len(full[0]) if full else 0, max(usecols) + 1])
+                full = [row + [""] * (width - len(row)) for row in full]
+                labels = TextParser(full, header=header, skip_blank_lines=False).read(0).columns
+                df.columns = labels[usecols]
+        return df
+
+    def close(self) -> None:
+        self._book.close()
+        if self._fallback is not None:
+            self._fallback.close()
+
+
+def _parse_book(
+    book,
+    columns: Optional[Iterable[str]],
+    read_kwargs: Dict[str, Any],
+    header_labels: Optional[List[Any]] = None,
+) -> pd.DataFrame:
+    """
+    One (projected) sheet read on an open book: ``pd.ExcelFile`` or
+    :class:`_StreamingXlsxBook`. ``header_labels`` skips the header
+    sniff when the caller already has them.
+    """
+    sheet_name, header, rest = _split_sheet_kwargs(read_kwargs)
+
+    usecols = None
+    if columns is not None:
+        if header_labels is None:
+            # Row limits are for the read itself, not the header sniff
+            sniff = {k: v for k, v in rest.items() if k not in ("nrows", "usecols")}
+            header_labels = book.parse(sheet_name=sheet_name, header=header, nrows=0, **sniff).columns.tolist()
+        # Positions, not labels: the selected columns keep the names a
+        # full read gives them. Nothing matched → full read, as before
+        usecols = resolve_usecols(header_labels, columns) or None
+
+    return book.parse(sheet_name=sheet_name, header=header, usecols=usecols, **rest)
+
+
+# ---------------------------------------------------------------------
+# Reader engines
+# ---------------------------------------------------------------------
+def _pandas_book(engine: Optional[str]):
+    """Opens a ``pd.ExcelFile`` with the given pandas engine."""
+
+    def open_book(filepath: Union[str, Path]) -> pd.ExcelFile:
+        return pd.ExcelFile(filepath, engine=engine)
+
+    return open_book
+
+
+def _minor_version(version: str) -> Tuple[int, int]:
+    major, minor = version.split(".")[:2]
+    return int(major), int(minor)
+
+
+def _calamine_available() -> bool:
+    # pandas gained engine="calamine" in 2.2
+    return importlib.util.find_spec("python_calamine") is not None and _minor_version(pd.__version__) >= (2, 2)
+
+
+@dataclass(frozen=True)
+class ReaderEngine:
+    """
+    One way of turning workbook sheets into DataFrames.
+
+    ``open(filepath)`` returns a book with ``sheet_names``,
+    ``parse(sheet_name=..., **read_excel_kwargs)`` and ``close()`` (the
+    ``pd.ExcelFile`` interface). Its reads must return exactly what
+    ``pd.read_excel`` returns, so engines are interchangeable.
+    """
+
+    name: str
+    open: Callable[[Union[str, Path]], Any]
+    suffixes: Tuple[str, ...]
+    available: Callable[[], bool] = lambda: True
+
+    def read(
+        self,
+        filepath: Union[str, Path],
+        columns: Optional[Iterable[str]],
+        read_kwargs: Dict[str, Any],
+    ) -> pd.DataFrame:
+        book = self.open(filepath)
+        try:
+            return _parse_book(book, columns, read_kwargs)
+        finally:
+            book.close()
+
+
+READER_ENGINES: Dict[str, ReaderEngine] = {}
+
+# "auto" takes the first available engine that handles the suffix
+AUTO_ENGINE_ORDER: List[str] = ["calamine", "openpyxl_stream", "default"]
+
+
+def register_reader_engine(engine: ReaderEngine, *, prefer: bool = False) -> None:
+    """Add (or replace) an engine; ``prefer`` puts it first for "auto"."""
+    READER_ENGINES[engine.name] = engine
+    if engine.name in AUTO_ENGINE_ORDER:
+        AUTO_ENGINE_ORDER.remove(engine.name)
+    if prefer:
+        AUTO_ENGINE_ORDER.insert(0, engine.name)
+    else:
+        AUTO_ENGINE_ORDER.insert(len(AUTO_ENGINE_ORDER) - 1, engine.name)
+
+
+for _engine in (
+    # pandas' own choice per format (openpyxl for xlsx, xlrd for xls)
+    ReaderEngine("default", _pandas_book(None), (".xlsx", ".xlsm", ".xls", ".xlsb", ".ods")),
+    ReaderEngine("openpyxl_stream", _StreamingXlsxBook, (".xlsx", ".xlsm")),
+    ReaderEngine(
+        "calamine", _pandas_book("calamine"), (".xlsx", ".xlsm", ".xls", ".xlsb", ".ods"),
+        available=_calamine_available,
+    ),
+):
+    READER_ENGINES[_engine.name] = _engine
+
+_reader_engine = READER_ENGINE
+
+
+def available_reader_engines() -> List[str]:
+    return [name for name, engine in READER_ENGINES.items() if engine.available()]
+
+
+def configure_reader_engine(engine: str = "auto") -> None:
+    """Set the process-wide reader engine (``"auto"`` to detect)."""
+    global _reader_engine
+
+    if engine != "auto":
+        _check_engine(engine)
+    _reader_engine = engine
+
+
+def _check_engine(name: str) -> ReaderEngine:
+    if name not in READER_ENGINES:
+        raise ValueError(f"Unknown reader engine {name!r}; expected 'auto' or one of {sorted(READER_ENGINES)}")
+    engine = READER_ENGINES[name]
+    if not engine.available():
+        raise ValueError(f"Reader engine {name!r} is not available here; available: {available_reader_engines()}")
+    return engine
+
+
+def resolve_reader_engine(filepath: Union[str, Path], engine: Optional[str] = None) -> ReaderEngine:
+    """
+    The engine that reads ``filepath``: ``engine``, else the configured
+    one (``CTP_READER_ENGINE`` / :func:`configure_reader_engine`), else
+    the first available engine in ``AUTO_ENGINE_ORDER`` that handles
+    the file's suffix.
+    """
+    name = engine or _reader_engine
+    if name != "auto":
+        return _check_engine(name)
+
+    suffix = Path(filepath).suffix.lower()
+    for candidate in AUTO_ENGINE_ORDER:
+        found = READER_ENGINES.get(candidate)
+        if found is not None and suffix in found.suffixes and found.available():
+            return found
+    return READER_ENGINES["default"]
+
+
+def _read_excel(
+    filepath: Union[str, Path],
+    columns: Optional[Iterable[str]],
+    read_kwargs: Dict[str, Any],
+    reader: Optional[str] = None,
+) -> pd.DataFrame:
+    # An explicit pandas engine (read_excel(engine=...)) is honoured as is
+    if "engine" in read_kwargs and reader is None:
+        return ReaderEngine("pandas", _pandas_book(read_kwargs["engine"]), ()).read(filepath, columns, read_kwargs)
+    return resolve_reader_engine(filepath, reader).read(filepath, columns, read_kwargs)
+
+
+def _cache_kwargs(read_kwargs: Dict[str, Any], columns: Optional[List[str]], reader: Optional[str]) -> Dict[str, Any]:
+    # Engines are meant to agree, but a cached frame is only ever served
+    # to reads through the engine that parsed it
+    key_kwargs = dict(read_kwargs)
+    if columns is not None:
+        key_kwargs["columns"] = columns
+    if reader is not None:
+        key_kwargs["reader"] = reader
+    return key_kwargs
+
+
+def read_sheet(
+    filepath: Union[str, Path],
+    *,
+    columns: Optional[Iterable[str]] = None,
+    reader: Optional[str] = None,
+    use_cache: bool = True,
+    **read_kwargs,
+) -> pd.DataFrame:
+    """
+    ``pd.read_excel`` with a content-addressed Parquet cache in front.
+
+    The cache key is the file's SHA-256 plus ``read_kwargs`` and the
+    reader engine, so a modified workbook (or a different header / sheet
+    selection) is always re-parsed. Reads that return several sheets bypass the cache.
+
+    Parameters
+    ----------
+    columns : iterable of str, optional
+        Header labels the caller needs (e.g. every key and target of an
+        extractor's ``COLUMN_MAP``). Only the matching physical columns
+        are parsed; the rest of the sheet is skipped.
+    reader : str, optional
+        Reader engine name (see :data:`READER_ENGINES`); defaults to the
+        configured / auto-detected one. A pandas ``engine`` in
+        ``read_kwargs`` is passed through to ``pd.read_excel``.
+    """
+    if columns is not None:
+        if "usecols" in read_kwargs:
+            raise ValueError("Pass either columns or usecols, not both")
+        columns = sorted(set(columns), key=str)
+
+    if not (use_cache and _sheet_cache_enabled):
+        return _read_excel(filepath, columns, read_kwargs, reader)
+
+    if "engine" not in read_kwargs or reader is not None:
+        reader = resolve_reader_engine(filepath, reader).name
+
+    cache = get_sheet_cache()
+    key = cache.make_key(file_sha256(filepath), _cache_kwargs(read_kwargs, columns, reader))
+
+    df = cache.get(key)
+    if df is not None:
+        return df
+
+    df = _read_excel(filepath, columns, read_kwargs, reader)
+
+    if isinstance(df, pd.DataFrame):
+        cache.put(key, df)
+
+    return df
+
+
+# ---------------------------------------------------------------------
+# Multi-sheet workbooks
+# ---------------------------------------------------------------------
+class Workbook:
+    """
+    One open workbook, read sheet by sheet.
+
+    Study files often carry several report sheets. Opening the file once
+    and reading every sheet through the same book pays decompression and
+    the shared-strings parse once per file instead of once per sheet
+    (or per extractor). Sheet reads go through the sheet cache under the
+    key ``read_sheet(filepath, sheet_name=..., columns=...)`` uses.
+    """
+
+    def __init__(
+        self,
+        filepath: Union[str, Path],
+        *,
+        reader: Optional[str] = None,
+        use_cache: bool = True,
+    ):
+        self.filepath = Path(filepath)
+        self.engine = resolve_reader_engine(filepath, reader)
+        self.use_cache = use_cache and _sheet_cache_enabled
+        self._book = self.engine.open(filepath)
+        self._headers: Dict[Union[str, int], List[Any]] = {}
+        self._sha: Optional[str] = None
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._book.sheet_names)
+
+    def header(self, sheet_name: Union[str, int]) -> List[Any]:
+        """Column labels of ``sheet_name`` (header row only)."""
+        if sheet_name not in self._headers:
+            frame = self._book.parse(sheet_name=sheet_name, nrows=0)
+            self._headers[sheet_name] = frame.columns.tolist()
+        return self._headers[sheet_name]
+
+    def read(self, sheet_name: Union[str, int], *, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """``read_sheet(filepath, sheet_name=sheet_name, columns=columns)`` on the open book."""
+        if columns is not None:
+            columns = sorted(set(columns), key=str)
+        read_kwargs = {"sheet_name": sheet_name}
+
+        if not self.use_cache:
+            return _parse_book(self._book, columns, read_kwargs, self.header(sheet_name))
+
+        cache = get_sheet_cache()
+        if self._sha is None:
+            self._sha = file_sha256(self.filepath)
+        key = cache.make_key(self._sha, _cache_kwargs(read_kwargs, columns, self.engine.name))
+
+        df = cache.get(key)
+        if df is None:
+            df = _parse_book(self._book, columns, read_kwargs, self.header(sheet_name))
+            cache.put(key, df)
+        return df
+
+    def close(self) -> None:
+        self._book.close()
+
+    def __enter__(self) -> "Workbook":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_workbook(
+    filepath: Union[str, Path],
+    *,
+    reader: Optional[str] = None,
+    use_cache: bool = True,
+) -> Workbook:
+    """Open ``filepath`` once for several sheet reads (use as a context manager)."""
+    return Workbook(filepath, reader=reader, use_cache=use_cache)
@@ -0,0 +1,224 @@
+"""
+Persistent file fingerprint manifest for ingestion runs.
+
+Records path, size, mtime and content hash of every study file together
+with the ingestion outcome per target table, so reruns over the full
+study tree only touch new or modified files.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+from core.constants import CACHE_ROOT_DIR
+from utils.hashing import file_sha256
+
+
+MANIFEST_VERSION = 1
+DEFAULT_MANIFEST_PATH = CACHE_ROOT_DIR / "ingestion_manifest.json"
+
+# record() rewrites the file at most this often; flush() writes the rest
+AUTOSAVE_INTERVAL_S = 30.0
+
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+@dataclass
+class ManifestRunStats:
+    processed_files: int = 0
+    processed_bytes: int = 0
+    skipped_files: int = 0
+    skipped_bytes: int = 0
+
+
+@dataclass
+class IngestionOutcome:
+    """Mutable handle filled in by the caller inside ``track()``."""
+
+    rows: int = 0
+
+
+class IngestionManifest:
+    """
+    JSON manifest of ingested files.
+
+    Layout::
+
+        {"version": 1,
+         "files": {"<abs path>": {"size": ..., "mtime_ns": ..., "sha256": ...,
+                                  "tables": {"<table>": {"status": ..., "rows": ...,
+                                                         "sha256": ..., "ingested_at": ...}}}}}
+
+    Outcomes are recorded in memory and written in batches (see
+    ``AUTOSAVE_INTERVAL_S``); call :meth:`flush` when a run ends.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_MANIFEST_PATH):
+        self.path = Path(path)
+        self.files: Dict[str, dict] = {}
+        self.stats = ManifestRunStats()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    # -----------------------------------------------------------------
+    # Persistence
+    # -----------------------------------------------------------------
+    @classmethod
+    def load(cls, path: Union[str, Path] = DEFAULT_MANIFEST_PATH) -> "IngestionManifest":
+        manifest = cls(path)
+
+        try:
+            with open(manifest.path, "r") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return manifest
+
+        if raw.get("version") == MANIFEST_VERSION:
+            manifest.files = raw.get("files", {})
+
+        return manifest
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, indent=2)
+
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """Write outcomes recorded since the last save, if any."""
+        if self._dirty:
+            self.save()
+
+    # -----------------------------------------------------------------
+    # Fingerprinting
+    # -----------------------------------------------------------------
+    def fingerprint(self, file_path: Union[str, Path]) -> FileFingerprint:
+        """
+        Fingerprint a file. The content hash is reused from the manifest
+        when size and mtime are unchanged, so unchanged files are not
+        re-read.
+        """
+        resolved = Path(file_path).resolve()
+        st = resolved.stat()
+        key = str(resolved)
+
+        entry = self.files.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            sha256 = entry["sha256"]
+        else:
+            sha256 = file_sha256(resolved)
+
+        return FileFingerprint(
+            path=key,
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            sha256=sha256,
+        )
+
+    # -----------------------------------------------------------------
+    # Decisions / outcomes
+    # -----------------------------------------------------------------
+    def is_unchanged(self, fingerprint: FileFingerprint, table: str) -> bool:
+        """True if this exact content was already ingested into ``table``."""
+        entry = self.files.get(fingerprint.path)
+        if not entry:
+            return False
+
+        outcome = entry.get("tables", {}).get(table)
+        return bool(
+            outcome
+            and outcome["status"] == STATUS_SUCCESS
+            and outcome["sha256"] == fingerprint.sha256
+        )
+
+    def should_skip(
+        self,
+        fingerprint: FileFingerprint,
+        table: str,
+        *,
+        force: bool = False,
+    ) -> bool:
+        """
+        Decide whether ``fingerprint`` can be skipped for ``table`` and
+        count it in the run stats if so.
+        """
+        if force or not self.is_unchanged(fingerprint, table):
+            return False
+
+        self.stats.skipped_files += 1
+        self.stats.skipped_bytes += fingerprint.size
+        return True
+
+    def record(
+        self,
+        fingerprint: FileFingerprint,
+        table: str,
+        *,
+        status: str,
+        rows: int = 0,
+        error: Optional[str] = None,
+    ) -> None:
+        entry = self.files.setdefault(fingerprint.path, {"tables": {}})
+        entry.update(
+            size=fingerprint.size,
+            mtime_ns=fingerprint.mtime_ns,
+            sha256=fingerprint.sha256,
+        )
+
+        outcome = {
+            "status": status,
+            "rows": rows,
+            "sha256": fingerprint.sha256,
+            "ingested_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if error is not None:
+            outcome["error"] = error
+
+        entry.setdefault("tables", {})[table] = outcome
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= AUTOSAVE_INTERVAL_S:
+            self.save()
+
+    @contextmanager
+    def track(
+        self,
+        fingerprint: FileFingerprint,
+        table: str,
+    ) -> Iterator[IngestionOutcome]:
+        """
+        Record the outcome of ingesting ``fingerprint`` into ``table``:
+        success when the block exits normally, failed (and re-raised)
+        otherwise. The manifest is flushed as the block exits.
+        """
+        self.stats.processed_files += 1
+        self.stats.processed_bytes += fingerprint.size
+
+        outcome = IngestionOutcome()
+
+        try:
+            yield outcome
+        except Exception as e:
+            self.record(fingerprint, table, status=STATUS_FAILED, rows=outcome.rows, error=str(e))
+            self.flush()
+            raise
+
+        self.record(fingerprint, table, status=STATUS_SUCCESS, rows=outcome.rows)
+        self.flush()
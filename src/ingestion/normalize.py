@@ -0,0 +1,331 @@
+"""
+Shared normalization kernel for the tabular (non-CPID) extractors.
+
+Every report extractor does the same thing: rename the sheet's columns
+to the locked contract, fill in missing columns, coerce dates / numbers
+/ text, stamp ``study_id`` and ``source``, and drop junk rows. This
+module does all of it column-wise from one :class:`NormalizationSpec`:
+
+* text columns become pandas ``string`` (values as ``str(x)`` would give),
+* integer columns ``Int64`` (truncated, like ``int(x)``),
+* float columns ``Float64``,
+* date columns ISO-formatted ``string``.
+
+:func:`compile_spec` turns a spec into one fused pass over the sheet:
+project (only the headers the contract names are touched), resolve
+aliases, evaluate the guardrail filters on just the columns they need,
+and run the remaining conversions on the surviving rows only.
+
+Nulls stay ``pd.NA`` in the typed columns; they only become ``None``
+when a frame is serialized (``storage.serialization``), so no extractor
+boxes its frame to Python objects.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Date output formats
+DATE_ISO = "iso"                      # Timestamp.isoformat(): 2024-01-31T00:00:00
+DATE_DAY = "day"                      # 2024-01-31
+DATE_UTC_TIMESTAMP = "utc_timestamp"  # 2024-01-31T00:00:00.000000Z (parsed as UTC)
+
+DATE_FORMATS = (DATE_ISO, DATE_DAY, DATE_UTC_TIMESTAMP)
+
+
+@dataclass(frozen=True)
+class NormalizationSpec:
+    """
+    Column contract of one extractor's output table.
+
+    Parameters
+    ----------
+    columns : tuple of str
+        Output columns, in order. Any not listed under ``int_columns``,
+        ``float_columns`` or ``date_columns`` are text.
+    source : str
+        Constant ``source`` column value.
+    column_map : mapping
+        Sheet header → output column. Several headers may map to the
+        same column (per-study spellings); they are coalesced.
+    require : tuple of str
+        Rows with a null in any of these are dropped.
+    require_any : tuple of tuple of str
+        For each group, rows where every column of the group is null
+        are dropped.
+    """
+
+    columns: Tuple[str, ...]
+    source: str
+    column_map: Mapping[str, str] = field(default_factory=dict)
+    int_columns: Tuple[str, ...] = ()
+    float_columns: Tuple[str, ...] = ()
+    date_columns: Mapping[str, str] = field(default_factory=dict)
+    require: Tuple[str, ...] = ()
+    require_any: Tuple[Tuple[str, ...], ...] = ()
+
+    def __post_init__(self):
+        unknown = set(self.date_columns.values()) - set(DATE_FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown date formats {sorted(unknown)}; expected {DATE_FORMATS}")
+
+    @property
+    def text_columns(self) -> Tuple[str, ...]:
+        typed = set(self.int_columns) | set(self.float_columns) | set(self.date_columns)
+        return tuple(c for c in self.columns if c not in typed)
+
+    def dtypes(self) -> Dict[str, str]:
+        """Output dtype per column."""
+        return {
+            column: "Int64" if column in self.int_columns
+            else "Float64" if column in self.float_columns
+            else "string"
+            for column in self.columns
+        }
+
+
+# ---------------------------------------------------------------------
+# Column kernels
+# ---------------------------------------------------------------------
+def to_text(values: pd.Series) -> pd.Series:
+    """``str(x)`` for every non-null value, as a ``string`` Series."""
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        # string dtype would drop a midnight time part; str(Timestamp) keeps it
+        values = values.astype(object)
+    return values.astype("string")
+
+
+def to_int(values: pd.Series) -> pd.Series:
+    """Numeric coercion then truncation toward zero, as ``Int64``."""
+    numeric = pd.to_numeric(values, errors="coerce").astype("float64")
+    numeric = numeric.where(np.isfinite(numeric))
+    return np.trunc(numeric).astype("Int64")
+
+
+def to_float(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values, errors="coerce").astype("Float64")
+
+
+def parse_dates(values: pd.Series, date_format: str) -> pd.Series:
+    """Parsed (NaT for unparseable) timestamps for one date column."""
+    return pd.to_datetime(values, errors="coerce", utc=date_format == DATE_UTC_TIMESTAMP)
+
+
+def _iso_strings(stamps: pd.Series, unit: str) -> np.ndarray:
+    # numpy formats in C; Series.dt.strftime is a per-value Python call
+    if stamps.dt.tz is not None:
+        stamps = stamps.dt.tz_convert("UTC").dt.tz_localize(None)
+    return np.datetime_as_string(stamps.to_numpy(dtype=f"datetime64[{unit}]"), unit=unit)
+
+
+def format_dates(stamps: pd.Series, date_format: str) -> pd.Series:
+    """ISO strings for parsed timestamps; NaT → NA."""
+    if not pd.api.types.is_datetime64_any_dtype(stamps.dtype) or (
+        date_format == DATE_ISO and stamps.dt.tz is not None
+    ):
+        # Mixed offsets / tz-aware: isoformat carries the offset per value
+        return stamps.map(lambda ts: ts.isoformat() if pd.notna(ts) else None).astype("string")
+
+    if date_format == DATE_DAY:
+        out = _iso_strings(stamps, "D")
+    elif date_format == DATE_UTC_TIMESTAMP:
+        out = np.char.add(_iso_strings(stamps, "us"), "Z")
+    else:
+        # isoformat() shows microseconds only when they are non-zero
+        out = _iso_strings(stamps, "s")
+        has_micros = (stamps.dt.microsecond != 0).to_numpy()
+        if has_micros.any():
+            out = np.where(has_micros, _iso_strings(stamps, "us"), out)
+
+    return pd.Series(out, index=stamps.index, dtype="string").mask(stamps.isna())
+
+
+# ---------------------------------------------------------------------
+# Compiled pipeline
+# ---------------------------------------------------------------------
+KIND_TEXT, KIND_INT, KIND_FLOAT, KIND_DATE = "text", "int", "float", "date"
+
+
+def _parse(values: pd.Series, kind: str, date_format: Optional[str]) -> pd.Series:
+    """Stage 1: whatever decides nullness (numeric / date parsing)."""
+    if kind == KIND_DATE:
+        return parse_dates(values, date_format)
+    if kind in (KIND_INT, KIND_FLOAT):
+        return pd.to_numeric(values, errors="coerce").astype("float64")
+    return values
+
+
+def _finish(parsed: pd.Series, kind: str, date_format: Optional[str]) -> pd.Series:
+    """Stage 2: output dtype / formatting."""
+    if kind == KIND_DATE:
+        return format_dates(parsed, date_format)
+    if kind == KIND_INT:
+        return np.trunc(parsed.where(np.isfinite(parsed))).astype("Int64")
+    if kind == KIND_FLOAT:
+        return parsed.astype("Float64")
+    return to_text(parsed)
+
+
+def _parse_kept_dates(values: pd.Series, keep: np.ndarray, date_format: Optional[str]) -> pd.Series:
+    """
+    Parse ``values[keep]`` exactly as parsing the whole column would.
+
+    ``pd.to_datetime`` infers one format from the first non-null string;
+    if that row was filtered out it is parsed along (then dropped) so the
+    surviving rows see the same format.
+    """
+    kept = values[keep]
+    if values.dtype != object:
+        return _parse(kept, KIND_DATE, date_format)
+
+    # The null-likes pd.to_datetime skips while looking for the first value
+    leading = (values.notna() & ~values.isin(["", "now", "today"])).to_numpy()
+    first = int(leading.argmax()) if leading.any() else -1
+    if first < 0 or keep[first]:
+        return _parse(kept, KIND_DATE, date_format)
+    return _parse(pd.concat([values.iloc[first:first + 1], kept]), KIND_DATE, date_format).iloc[1:]
+
+
+@dataclass(frozen=True)
+class _ColumnPlan:
+    name: str
+    # Raw headers feeding the column, first non-null wins
+    headers: Tuple[str, ...]
+    kind: str
+    date_format: Optional[str] = None
+
+
+class CompiledSpec:
+    """
+    A :class:`NormalizationSpec` resolved into per-column plans.
+
+    Calling it on a raw sheet frame runs the fused pass::
+
+        project → alias-coalesce → parse filter columns → filter
+                → parse/format the rest (surviving rows only) → tag
+    """
+
+    def __init__(self, spec: NormalizationSpec):
+        self.spec = spec
+
+        headers: Dict[str, List[str]] = {column: [] for column in spec.columns}
+        for header, column in spec.column_map.items():
+            if column in headers:
+                headers[column].append(header)
+        for column in spec.columns:
+            if column not in headers[column]:
+                # Sheets that already use the canonical name
+                headers[column].append(column)
+
+        self.plans: Dict[str, _ColumnPlan] = {}
+        for column in spec.columns:
+            if column in spec.date_columns:
+                kind = KIND_DATE
+            elif column in spec.int_columns:
+                kind = KIND_INT
+            elif column in spec.float_columns:
+                kind = KIND_FLOAT
+            else:
+                kind = KIND_TEXT
+            self.plans[column] = _ColumnPlan(
+                column, tuple(headers[column]), kind, spec.date_columns.get(column)
+            )
+
+        filter_columns = list(spec.require) + [c for group in spec.require_any for c in group]
+        unknown = set(filter_columns) - set(spec.columns)
+        if unknown:
+            raise ValueError(f"Guardrail columns {sorted(unknown)} are not output columns")
+        self.filter_columns: Tuple[str, ...] = tuple(dict.fromkeys(filter_columns))
+
+    @property
+    def source_headers(self) -> Tuple[str, ...]:
+        """Every raw header the pipeline can read (for projected reads)."""
+        return tuple(h for plan in self.plans.values() for h in plan.headers)
+
+    def _constant(self, column: str, study_id_override: Optional[str]):
+        if column == "source":
+            return self.spec.source
+        if column == "study_id":
+            return study_id_override
+        return None
+
+    def _raw(self, df: pd.DataFrame, plan: _ColumnPlan) -> pd.Series:
+        # Aliases coalesce left to right in sheet order (first non-null wins)
+        present = df.columns.isin(plan.headers)
+        if not present.any():
+            return pd.Series(pd.NA, index=df.index, dtype=object)
+        block = df.iloc[:, present]
+        return block.iloc[:, 0] if block.shape[1] == 1 else block.bfill(axis=1).iloc[:, 0]
+
+    def __call__(self, df: pd.DataFrame, *, study_id_override: Optional[str] = None) -> pd.DataFrame:
+        # Project + coalesce aliases; nothing else in the sheet is touched
+        raw = {
+            column: self._raw(df, plan)
+            for column, plan in self.plans.items()
+            if self._constant(column, study_id_override) is None
+        }
+
+        # Guardrails first, parsing only the columns they read
+        parsed: Dict[str, pd.Series] = {}
+        keep = np.ones(len(df), dtype=bool)
+        if len(df):
+            notna: Dict[str, np.ndarray] = {}
+            for column in self.filter_columns:
+                if column not in raw:
+                    notna[column] = np.ones(len(df), dtype=bool)
+                    continue
+                plan = self.plans[column]
+                parsed[column] = _parse(raw[column], plan.kind, plan.date_format)
+                notna[column] = parsed[column].notna().to_numpy()
+
+            for column in self.spec.require:
+                keep &= notna[column]
+            for group in self.spec.require_any:
+                keep &= np.logical_or.reduce([notna[column] for column in group])
+
+        filtered = not keep.all()
+        index = df.index[keep] if filtered else df.index
+
+        out: Dict[str, pd.Series] = {}
+        for column, plan in self.plans.items():
+            constant = self._constant(column, study_id_override)
+            if constant is not None:
+                out[column] = pd.Series(constant, index=index, dtype="string")
+                continue
+
+            values = parsed.get(column)
+            if values is None:
+                values = raw[column]
+                if filtered and plan.kind == KIND_DATE:
+                    values = _parse_kept_dates(values, keep, plan.date_format)
+                else:
+                    values = _parse(values[keep] if filtered else values, plan.kind, plan.date_format)
+            elif filtered:
+                values = values[keep]
+            out[column] = _finish(values, plan.kind, plan.date_format)
+
+        return pd.DataFrame(out, index=index, columns=list(self.spec.columns))
+
+
+def compile_spec(spec: NormalizationSpec) -> CompiledSpec:
+    return CompiledSpec(spec)
+
+
+def normalize_frame(
+    df: pd.DataFrame,
+    spec: NormalizationSpec,
+    *,
+    study_id_override: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Apply ``spec`` to a raw sheet frame (compiling it on the fly; hold
+    on to :func:`compile_spec` output to reuse the plan).
+
+    Returns
+    -------
+    pd.DataFrame
+        ``spec.columns`` in order, typed per ``spec.dtypes()``.
+    """
+    return compile_spec(spec)(df, study_id_override=study_id_override)
@@ -0,0 +1,584 @@
+"""
+Concurrent ingestion orchestrator.
+
+One discovery pass classifies every study workbook to its dataset
+(``ingestion.discovery``). Extraction (CPU-bound Excel parsing) runs in
+a process pool and writes run in a separate thread pool, so parsing the
+next workbooks overlaps with sending the previous ones, and a full-tree
+ingest takes roughly as long as its slowest files rather than the sum
+of all of them.
+
+Report workbooks are extracted once per file, not once per dataset:
+the file is opened a single time and each sheet goes to the source its
+headers match (``ingestion.sources.extract_workbook``), so a workbook
+carrying several reports is decompressed and parsed once.
+
+Datasets with a batched extractor (CPID) never cross the process
+boundary as one frame: the worker spills each batch to disk as it is
+extracted and the write streams the batches back, so memory stays at a
+few batches however large the study is.
+
+With ``changes_only`` datasets that can diff (CPID) write only what
+changed since the file's last written snapshot (kept under
+``LAST_SNAPSHOTS_DIR``), which moves forward once the write succeeds.
+
+Unchanged files are skipped through the ingestion manifest exactly as
+the per-dataset runners did.
+"""
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from core.constants import LAST_SNAPSHOTS_DIR
+from ingestion.discovery import DATASETS, STUDY_ROOT_DIR, DatasetSpec, StudyFile, discover_study_files
+from ingestion.manifest import STATUS_FAILED, STATUS_SUCCESS, FileFingerprint, IngestionManifest, ManifestRunStats
+from ingestion.parallel import extraction_context, iter_spill_frames, spill_frames, spill_table
+from ingestion.sources import extract_workbook, get_sources
+from utils.formatters import format_bytes
+
+
+DEFAULT_WRITE_WORKERS = 4
+DEFAULT_WRITE_MODE = "skip_existing"
+DEFAULT_BATCH_SIZE = 1000
+
+STATUS_SKIPPED = "skipped"
+STATUS_EMPTY = "empty"
+
+
+@dataclass
+class FileResult:
+    study_id: str
+    dataset: str
+    table: str
+    path: Path
+    status: str
+    rows: int = 0
+    error: Optional[str] = None
+    extract_s: float = 0.0
+    write_s: float = 0.0
+
+
+@dataclass(frozen=True)
+class SpilledFrames:
+    """A streamed extraction's batches, one spill file each, in order."""
+    directory: Path
+    paths: Tuple[Path, ...]
+    rows: int
+    # Change-only writes: the file's new snapshot, moved to
+    # snapshot_target once the changes are written
+    snapshot: Optional[Path] = None
+    snapshot_target: Optional[Path] = None
+
+    def settle(self, written: bool) -> None:
+        """Advance the file's last snapshot if the write went through; drop the spill."""
+        if self.snapshot is not None:
+            if written:
+                os.replace(self.snapshot, self.snapshot_target)
+            else:
+                self.snapshot.unlink(missing_ok=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _rows(frame: Union[pd.DataFrame, SpilledFrames]) -> int:
+    return frame.rows if isinstance(frame, SpilledFrames) else len(frame)
+
+
+@dataclass
+class IngestionReport:
+    study_ids: List[str]
+    results: List[FileResult] = field(default_factory=list)
+    elapsed_s: float = 0.0
+    manifest_stats: ManifestRunStats = field(default_factory=ManifestRunStats)
+
+    @property
+    def failed(self) -> List[FileResult]:
+        return [r for r in self.results if r.status == STATUS_FAILED]
+
+    def totals_by(self, key: str) -> Dict[str, Dict[str, int]]:
+        """Per study / table (``key`` = "study_id" or "table") counts."""
+        totals: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"files": 0, "rows": 0, "skipped": 0, "failed": 0}
+        )
+        for result in self.results:
+            bucket = totals[getattr(result, key)]
+            if result.status == STATUS_SKIPPED:
+                bucket["skipped"] += 1
+            elif result.status == STATUS_FAILED:
+                bucket["failed"] += 1
+            else:
+                bucket["files"] += 1
+                bucket["rows"] += result.rows
+        return dict(totals)
+
+    def print_summary(self) -> None:
+        print("\n" + "=" * 72)
+        print("📊 INGESTION SUMMARY")
+        print("=" * 72)
+
+        for title, key in (("Per study", "study_id"), ("Per table", "table")):
+            print(f"\n{title}:")
+            totals = self.totals_by(key)
+            for name in sorted(totals):
+                t = totals[name]
+                print(
+                    f"  {name:<40} files={t['files']:<4} rows={t['rows']:<9} "
+                    f"skipped={t['skipped']:<4} failed={t['failed']}"
+                )
+
+        untouched = sorted(set(self.study_ids) - {r.study_id for r in self.results})
+        ingested = sum(1 for r in self.results if r.status in (STATUS_SUCCESS, STATUS_EMPTY))
+        cpu_s = sum(r.extract_s for r in self.results)
+
+        print()
+        print(f"📁 Study folders found       : {len(self.study_ids)}")
+        print(f"📄 Files ingested            : {ingested}")
+        print(f"📥 Total rows written        : {sum(r.rows for r in self.results)}")
+        print(f"⏭️ Files skipped (unchanged)  : {self.manifest_stats.skipped_files}")
+        print(
+            f"💾 Bytes processed/skipped   : "
+            f"{format_bytes(self.manifest_stats.processed_bytes)} / "
+            f"{format_bytes(self.manifest_stats.skipped_bytes)}"
+        )
+        print(f"⏱️ Wall / extraction time    : {self.elapsed_s:.1f}s / {cpu_s:.1f}s")
+        if untouched:
+            print(f"⚠️ Studies with no files     : {untouched}")
+        for result in self.failed:
+            print(f"❌ {result.study_id} / {result.path.name} → {result.table}: {result.error}")
+        print("=" * 72)
+
+
+# ---------------------------------------------------------------------
+# Pool tasks
+# ---------------------------------------------------------------------
+def _extract_task(dataset: str, filepath: str, study_id: str) -> Tuple[Dict[str, pd.DataFrame], float]:
+    """Runs in a worker process; looked up by name so nothing unpicklable is sent."""
+    started = time.perf_counter()
+    df = DATASETS[dataset].extract(filepath, study_id)
+    return {dataset: df}, time.perf_counter() - started
+
+
+def _extract_stream_task(
+    dataset: str,
+    filepath: str,
+    study_id: str,
+    spill_dir: str,
+) -> Tuple[Dict[str, SpilledFrames], float]:
+    """
+    A batched extraction spilled batch by batch; only the file paths go
+    back to the parent, never a pickled frame.
+    """
+    started = time.perf_counter()
+    directory = Path(tempfile.mkdtemp(prefix=f"{dataset}-", dir=spill_dir))
+    try:
+        paths, rows = spill_frames(DATASETS[dataset].stream(filepath, study_id), directory)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return {dataset: SpilledFrames(directory, tuple(paths), rows)}, time.perf_counter() - started
+
+
+def last_snapshot_path(snapshot_dir: Union[str, Path], study_id: str, filepath: Union[str, Path]) -> Path:
+    """Where the last written snapshot of one study file is kept."""
+    return Path(snapshot_dir) / quote(study_id, safe="") / f"{Path(filepath).name}.parquet"
+
+
+def _extract_changes_task(
+    dataset: str,
+    filepath: str,
+    study_id: str,
+    spill_dir: str,
+    snapshot_dir: str,
+) -> Tuple[Dict[str, SpilledFrames], float]:
+    """
+    Extract a file and spill only its changes against the last written
+    snapshot; the new snapshot is staged next to the old one.
+    """
+    started = time.perf_counter()
+    spec = DATASETS[dataset]
+    target = last_snapshot_path(snapshot_dir, study_id, filepath)
+    previous = pd.read_parquet(target) if target.exists() else pd.DataFrame()
+
+    current = spec.extract(filepath, study_id)
+    changes = spec.diff(previous, current)
+    del previous
+
+    directory = Path(tempfile.mkdtemp(prefix=f"{dataset}-", dir=spill_dir))
+    staged = target.parent / f".{target.name}.pending"
+    try:
+        paths, rows = spill_frames([changes], directory)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(spill_table(current), staged)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        staged.unlink(missing_ok=True)
+        raise
+    spilled = SpilledFrames(directory, tuple(paths), rows, snapshot=staged, snapshot_target=target)
+    return {dataset: spilled}, time.perf_counter() - started
+
+
+def _extract_workbook_task(
+    filepath: str,
+    study_id: str,
+    sources: List[str],
+    expected: List[str],
+) -> Tuple[Dict[str, pd.DataFrame], float]:
+    """Every sheet of a report workbook, from one open of the file."""
+    started = time.perf_counter()
+    frames = extract_workbook(filepath, study_id, sources=sources, expected=expected)
+    return frames, time.perf_counter() - started
+
+
+def _write_task(
+    spec: DatasetSpec,
+    df: Union[pd.DataFrame, SpilledFrames],
+    *,
+    write_mode: str,
+    dry_run: bool,
+    backend: Optional[str],
+    write_spool,
+) -> float:
+    from storage.writer import insert_dataframe, insert_stream
+
+    started = time.perf_counter()
+    if isinstance(df, SpilledFrames):
+        written = False
+        try:
+            frames = iter_spill_frames(df.paths)
+            if write_spool is not None:
+                for frame in frames:
+                    write_spool.append_dataframe(
+                        spec.table, frame, batch_size=DEFAULT_BATCH_SIZE, write_mode=write_mode
+                    )
+            else:
+                insert_stream(
+                    spec.table,
+                    frames,
+                    batch_size=DEFAULT_BATCH_SIZE,
+                    write_mode=write_mode,
+                    dry_run=dry_run,
+                    backend=backend,
+                    **spec.write_options,
+                )
+            written = not dry_run
+        finally:
+            df.settle(written)
+    elif write_spool is not None:
+        write_spool.append_dataframe(
+            spec.table, df, batch_size=DEFAULT_BATCH_SIZE, write_mode=write_mode
+        )
+    else:
+        insert_dataframe(
+            df,
+            spec.table,
+            batch_size=DEFAULT_BATCH_SIZE,
+            write_mode=write_mode,
+            dry_run=dry_run,
+            backend=backend,
+            **spec.write_options,
+        )
+    return time.perf_counter() - started
+
+
+# ---------------------------------------------------------------------
+# Orchestration
+# ---------------------------------------------------------------------
+def _check_row_keys(
+    jobs: Dict[Tuple[Path, str], List[Tuple[StudyFile, FileFingerprint]]],
+    sheet_sources: List[str],
+    write_mode: str,
+    backend: Optional[str],
+) -> None:
+    """Fail before any extraction if a table to write lacks the row_key keyed writes need."""
+    from storage.writer import tables_missing_row_key
+
+    tables = {study_file.dataset.table for entries in jobs.values() for study_file, _ in entries}
+    if any(kind == "workbook" for _, kind in jobs):
+        # A workbook sheet may feed any sheet source's table
+        tables |= {DATASETS[name].table for name in sheet_sources}
+
+    missing = tables_missing_row_key(sorted(tables), backend=backend)
+    if missing:
+        raise RuntimeError(
+            f"write_mode={write_mode!r} needs a unique row_key column, which "
+            f"{', '.join(missing)} lack(s): run scripts/dev/migrate_row_keys.py "
+            f"first, or write with write_mode='insert'"
+        )
+
+
+def run_ingestion(
+    root_dir: Union[str, Path] = STUDY_ROOT_DIR,
+    *,
+    datasets: Optional[Iterable[str]] = None,
+    force: bool = False,
+    extract_workers: Optional[int] = None,
+    write_workers: int = DEFAULT_WRITE_WORKERS,
+    write_mode: str = DEFAULT_WRITE_MODE,
+    dry_run: bool = False,
+    spool: bool = False,
+    backend: Optional[str] = None,
+    manifest: Optional[IngestionManifest] = None,
+    changes_only: bool = False,
+    snapshot_dir: Union[str, Path] = LAST_SNAPSHOTS_DIR,
+) -> IngestionReport:
+    """
+    Ingest every (or the named) dataset under ``root_dir``.
+
+    Parameters
+    ----------
+    root_dir : path
+        Study root (one folder per study).
+    datasets : iterable of str, optional
+        ``ingestion.discovery.DATASETS`` names; default all.
+    force : bool
+        Re-ingest files the manifest marks unchanged.
+    extract_workers : int, optional
+        Extraction processes (default: CPU count).
+    write_workers : int
+        Concurrent table writes.
+    write_mode, dry_run, backend
+        Passed to ``storage.writer.insert_dataframe``. A dry run records
+        nothing in the manifest, so the next real run ingests every file.
+        Keyed write modes check up front that every table to be written
+        has its ``row_key`` column.
+    spool : bool
+        Append to the on-disk write spool instead of writing directly
+        (see ``storage.spool``). Ignored on a dry run.
+    manifest : IngestionManifest, optional
+        Defaults to ``IngestionManifest.load()``.
+    changes_only : bool
+        For datasets with a ``diff`` (CPID), write only the rows that
+        changed since the file's last written snapshot (everything on a
+        file's first run). These files are extracted whole to be diffed.
+    snapshot_dir : path
+        Where those last snapshots are kept.
+
+    Returns
+    -------
+    IngestionReport
+        Per-file results; ``print_summary()`` for the per-study /
+        per-table summary. Failures are reported, not raised.
+
+    Raises
+    ------
+    RuntimeError
+        A keyed ``write_mode`` against a table without ``row_key``.
+    """
+    started = time.perf_counter()
+    manifest = manifest or IngestionManifest.load()
+    extract_workers = extract_workers or os.cpu_count() or 1
+
+    study_ids, files = discover_study_files(root_dir, datasets)
+    report = IngestionReport(study_ids=study_ids, manifest_stats=manifest.stats)
+    # Datasets a workbook sheet may be dispatched to
+    sheet_sources = [name for name in (DATASETS if datasets is None else datasets) if name in get_sources()]
+
+    print(f"📂 Discovered {len(files)} dataset files in {len(study_ids)} studies under {root_dir}")
+
+    # One extraction job per report workbook (CPID files stay one per
+    # dataset); every entry of a job shares the file
+    jobs: Dict[Tuple[Path, str], List[Tuple[StudyFile, FileFingerprint]]] = {}
+    fingerprints: Dict[Path, FileFingerprint] = {}
+    for study_file in files:
+        if study_file.path not in fingerprints:
+            fingerprints[study_file.path] = manifest.fingerprint(study_file.path)
+        fingerprint = fingerprints[study_file.path]
+        if manifest.should_skip(fingerprint, study_file.dataset.table, force=force):
+            report.results.append(
+                FileResult(
+                    study_file.study_id,
+                    study_file.dataset.name,
+                    study_file.dataset.table,
+                    study_file.path,
+                    STATUS_SKIPPED,
+                )
+            )
+            continue
+        kind = "workbook" if study_file.dataset.name in sheet_sources else study_file.dataset.name
+        jobs.setdefault((study_file.path, kind), []).append((study_file, fingerprint))
+
+    # Largest workbooks first so they do not end up as the long tail
+    pending = sorted(jobs.items(), key=lambda item: -item[1][0][0].size)
+
+    if write_mode != "insert" and not dry_run and jobs:
+        _check_row_keys(jobs, sheet_sources, write_mode, backend)
+
+    def finish(study_file: StudyFile, fingerprint: FileFingerprint, result: FileResult) -> None:
+        manifest.stats.processed_files += 1
+        manifest.stats.processed_bytes += fingerprint.size
+        if not dry_run:
+            manifest.record(
+                fingerprint,
+                study_file.dataset.table,
+                status=STATUS_FAILED if result.status == STATUS_FAILED else STATUS_SUCCESS,
+                rows=result.rows,
+                error=result.error,
+            )
+        report.results.append(result)
+
+        mark = "❌" if result.status == STATUS_FAILED else "✅"
+        print(
+            f"{mark} {study_file.dataset.label:<20} study='{study_file.study_id}' "
+            f"file='{study_file.path.name}' rows={result.rows} "
+            f"(extract {result.extract_s:.1f}s, write {result.write_s:.1f}s)"
+            + (f" — {result.error}" if result.error else "")
+        )
+
+    with ExitStack() as stack:
+        from storage.writer import close_connections
+
+        # Registered first, so they run after the writers below have
+        # exited (also when the run is interrupted)
+        stack.callback(manifest.flush)
+        stack.callback(close_connections)
+
+        write_spool = None
+        # Spooled batches are delivered for real; a dry run goes through
+        # insert_dataframe(dry_run=True) instead
+        if spool and not dry_run:
+            from storage.spool import spooled_writes
+
+            write_spool = stack.enter_context(spooled_writes())
+
+        spill_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="ctp-ingest-"))
+        extract_pool = stack.enter_context(
+            ProcessPoolExecutor(max_workers=extract_workers, mp_context=extraction_context())
+        )
+        write_pool = stack.enter_context(
+            ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="ingest-writer")
+        )
+
+        extracting: Dict[Future, List[Tuple[StudyFile, FileFingerprint]]] = {}
+        writing: Dict[Future, Tuple[StudyFile, FileFingerprint, FileResult]] = {}
+        queue = list(reversed(pending))
+
+        while queue or extracting or writing:
+            # Back-pressure: parsed frames wait in memory only while the
+            # write pool is saturated, never for the whole tree
+            while queue and len(extracting) < extract_workers and len(writing) < 2 * write_workers:
+                (path, kind), entries = queue.pop()
+                study_file = entries[0][0]
+                if kind == "workbook":
+                    future = extract_pool.submit(
+                        _extract_workbook_task,
+                        str(path),
+                        study_file.study_id,
+                        sheet_sources,
+                        [entry.dataset.name for entry, _ in entries],
+                    )
+                elif changes_only and study_file.dataset.diff is not None:
+                    future = extract_pool.submit(
+                        _extract_changes_task,
+                        study_file.dataset.name,
+                        str(path),
+                        study_file.study_id,
+                        spill_dir,
+                        str(snapshot_dir),
+                    )
+                elif study_file.dataset.stream is not None:
+                    future = extract_pool.submit(
+                        _extract_stream_task, study_file.dataset.name, str(path), study_file.study_id, spill_dir
+                    )
+                else:
+                    future = extract_pool.submit(
+                        _extract_task, study_file.dataset.name, str(path), study_file.study_id
+                    )
+                extracting[future] = entries
+
+            done, _ = wait(list(extracting) + list(writing), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future in extracting:
+                    entries = extracting.pop(future)
+                    try:
+                        frames, extract_s = future.result()
+                    except Exception as e:
+                        for study_file, fingerprint in entries:
+                            result = FileResult(
+                                study_file.study_id,
+                                study_file.dataset.name,
+                                study_file.dataset.table,
+                                study_file.path,
+                                STATUS_FAILED,
+                                error=f"extract: {e}",
+                            )
+                            finish(study_file, fingerprint, result)
+                        continue
+
+                    # Every entry shares the file, hence the fingerprint
+                    first, fingerprint = entries[0]
+                    expected = {study_file.dataset.name: study_file for study_file, _ in entries}
+                    for name, df in frames.items():
+                        if name in expected:
+                            study_file = expected[name]
+                        else:
+                            # A sheet whose file name did not announce it
+                            study_file = StudyFile(first.study_id, first.path, first.size, DATASETS[name])
+                            if manifest.should_skip(fingerprint, study_file.dataset.table, force=force):
+                                report.results.append(
+                                    FileResult(
+                                        first.study_id, name, study_file.dataset.table, first.path, STATUS_SKIPPED
+                                    )
+                                )
+                                continue
+
+                        result = FileResult(
+                            study_file.study_id,
+                            study_file.dataset.name,
+                            study_file.dataset.table,
+                            study_file.path,
+                            STATUS_SUCCESS,
+                            rows=_rows(df),
+                            # One parse fed every table of the file
+                            extract_s=extract_s / len(frames),
+                        )
+                        if result.rows == 0:
+                            result.status = STATUS_EMPTY
+                            if isinstance(df, SpilledFrames):
+                                # Nothing to send: the snapshot is current
+                                df.settle(written=not dry_run)
+                            finish(study_file, fingerprint, result)
+                            continue
+
+                        write = write_pool.submit(
+                            _write_task,
+                            study_file.dataset,
+                            df,
+                            write_mode=write_mode,
+                            dry_run=dry_run,
+                            backend=backend,
+                            write_spool=write_spool,
+                        )
+                        writing[write] = (study_file, fingerprint, result)
+
+                    for name, study_file in expected.items():
+                        if name not in frames:
+                            result = FileResult(
+                                study_file.study_id,
+                                study_file.dataset.name,
+                                study_file.dataset.table,
+                                study_file.path,
+                                STATUS_FAILED,
+                                error="extract: the workbook returned no rows for this dataset",
+                            )
+                            finish(study_file, fingerprint, result)
+                else:
+                    study_file, fingerprint, result = writing.pop(future)
+                    try:
+                        result.write_s = future.result()
+                    except Exception as e:
+                        result.status, result.error = STATUS_FAILED, f"write: {e}"
+                    finish(study_file, fingerprint, result)
+
+    report.elapsed_s = time.perf_counter() - started
+    return report
@@ -0,0 +1,326 @@
+"""
+Process-pool extraction with on-disk spill files and memory-capped workers.
+
+Workers run the dataset extractors from ``ingestion.discovery`` and
+write each result to an Arrow IPC (or Parquet) spill file; only the
+file path and a few counters travel back to the parent, never a pickled
+DataFrame. A worker whose RSS exceeds ``max_worker_rss_bytes`` after a
+task exits and is replaced, so one huge workbook cannot leave a bloated
+process behind for the rest of the run.
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+
+SPILL_FORMATS = ("ipc", "parquet")
+
+# Never fork the (possibly multi-threaded) parent; forkserver children start
+# from a clean single-threaded server with the extractors preloaded
+EXTRACT_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# How often the parent checks for workers that died without reporting
+_POLL_INTERVAL_S = 0.5
+# Grace period for workers to take their sentinel once every task is done
+_JOIN_TIMEOUT_S = 5.0
+
+
+def extraction_context():
+    """multiprocessing context for extraction worker processes."""
+    context = multiprocessing.get_context(EXTRACT_START_METHOD)
+    if EXTRACT_START_METHOD == "forkserver":
+        context.set_forkserver_preload(["pandas", "ingestion.discovery"])
+    return context
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # KiB on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass(frozen=True)
+class ExtractionTask:
+    task_id: int
+    dataset: str
+    filepath: str
+    study_id: str
+    # Constant columns added to the extracted rows (e.g. study_folder)
+    extra_columns: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class SpillResult:
+    task: ExtractionTask
+    spill_path: Optional[Path] = None
+    rows: int = 0
+    extract_s: float = 0.0
+    worker_pid: int = 0
+    worker_rss_bytes: int = 0
+    error: Optional[str] = None
+
+
+# ---------------------------------------------------------------------
+# Spill files
+# ---------------------------------------------------------------------
+def write_spill(table: pa.Table, path: Path, spill_format: str) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    if spill_format == "parquet":
+        pq.write_table(table, tmp)
+    else:
+        with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_spill(path: Path) -> pa.Table:
+    """Read a spill file written by either format (memory-mapped for IPC)."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return pq.read_table(path)
+    with pa.memory_map(str(path), "r") as source:
+        return ipc.open_file(source).read_all()
+
+
+def spill_frames(
+    frames: Iterable[pd.DataFrame],
+    directory: Path,
+    spill_format: str = "ipc",
+) -> Tuple[List[Path], int]:
+    """
+    Write each frame of a stream to its own spill file under
+    ``directory`` as it arrives; returns the files (in stream order) and
+    the total rows. Nothing is kept once a frame is on disk.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = ".parquet" if spill_format == "parquet" else ".arrow"
+
+    paths: List[Path] = []
+    rows = 0
+    for frame in frames:
+        if frame.empty:
+            continue
+        path = directory / f"{len(paths):06d}{suffix}"
+        write_spill(spill_table(frame), path, spill_format)
+        paths.append(path)
+        rows += len(frame)
+    return paths, rows
+
+
+def iter_spill_frames(paths: Iterable[Path]) -> Iterator[pd.DataFrame]:
+    """Read spill files back one DataFrame at a time."""
+    for path in paths:
+        yield read_spill(path).to_pandas()
+
+
+def spill_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table for a spill file. Object columns are stringified (nulls
+    stay null), as ``storage.snapshot_files.snapshot_table`` does: Excel
+    hands back ints next to strings (site 101 next to "S2"), which Arrow
+    cannot infer one type for.
+    """
+    text = df.columns[df.dtypes == object]
+    if len(text):
+        df = df.copy()
+        for column in text:
+            values = df[column]
+            df[column] = values.astype("string").astype(object).where(values.notna(), None)
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+# ---------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------
+def _worker_main(tasks, results, spill_dir: str, spill_format: str, max_rss: Optional[int]) -> None:
+    from ingestion.discovery import DATASETS
+
+    pid = os.getpid()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        results.put(("start", pid, task))
+        result = SpillResult(task, worker_pid=pid)
+        started = time.perf_counter()
+
+        try:
+            df = DATASETS[task.dataset].extract(task.filepath, task.study_id)
+            for column, value in task.extra_columns.items():
+                df[column] = value
+
+            table = spill_table(df)
+            suffix = ".parquet" if spill_format == "parquet" else ".arrow"
+            path = Path(spill_dir) / f"{task.task_id:06d}-{task.dataset}{suffix}"
+            write_spill(table, path, spill_format)
+
+            result.spill_path, result.rows = path, table.num_rows
+            del df, table
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+
+        result.extract_s = time.perf_counter() - started
+        result.worker_rss_bytes = current_rss_bytes()
+        results.put(("result", pid, result))
+
+        if max_rss is not None and result.worker_rss_bytes > max_rss:
+            results.put(("recycle", pid, None))
+            return
+
+
+# ---------------------------------------------------------------------
+# Pool
+# ---------------------------------------------------------------------
+class ExtractionPool:
+    """
+    ``workers`` extraction processes fed from a shared task queue.
+
+    Parameters
+    ----------
+    spill_dir : path
+        Where workers write spill files (caller owns cleanup).
+    workers : int, optional
+        Concurrent worker processes (default: CPU count).
+    max_worker_rss_bytes : int, optional
+        Recycle a worker once its RSS exceeds this after a task.
+    spill_format : {"ipc", "parquet"}
+        Arrow IPC files are memory-mapped back without decoding; Parquet
+        is smaller on disk.
+    """
+
+    def __init__(
+        self,
+        spill_dir: Path,
+        *,
+        workers: Optional[int] = None,
+        max_worker_rss_bytes: Optional[int] = None,
+        spill_format: str = "ipc",
+    ):
+        if spill_format not in SPILL_FORMATS:
+            raise ValueError(f"spill_format must be one of {SPILL_FORMATS}, got {spill_format!r}")
+
+        self.spill_dir = Path(spill_dir)
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_worker_rss_bytes = max_worker_rss_bytes
+        self.spill_format = spill_format
+        # Workers replaced after exceeding the RSS ceiling / dying mid-task
+        self.recycled = 0
+        self.crashed = 0
+
+    def run(self, tasks: Iterable[ExtractionTask]) -> Iterator[SpillResult]:
+        """Yield one SpillResult per task, in completion order."""
+        tasks: List[ExtractionTask] = list(tasks)
+        if not tasks:
+            return
+
+        context = extraction_context()
+        task_queue = context.Queue()
+        result_queue = context.Queue()
+
+        for task in tasks:
+            task_queue.put(task)
+        # One sentinel per worker slot; replacements inherit the slot
+        for _ in range(self.workers):
+            task_queue.put(None)
+
+        processes: Dict[int, multiprocessing.Process] = {}
+        running: Dict[int, ExtractionTask] = {}
+
+        def spawn() -> None:
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    task_queue,
+                    result_queue,
+                    str(self.spill_dir),
+                    self.spill_format,
+                    self.max_worker_rss_bytes,
+                ),
+                name="extract-worker",
+                daemon=True,
+            )
+            process.start()
+            processes[process.pid] = process
+
+        for _ in range(min(self.workers, len(tasks))):
+            spawn()
+
+        done = 0
+        try:
+            while done < len(tasks):
+                try:
+                    kind, pid, payload = result_queue.get(timeout=_POLL_INTERVAL_S)
+                except queue.Empty:
+                    for pid, process in list(processes.items()):
+                        if process.is_alive():
+                            continue
+                        process.join()
+                        del processes[pid]
+                        task = running.pop(pid, None)
+                        if task is not None:
+                            self.crashed += 1
+                            done += 1
+                            yield SpillResult(
+                                task,
+                                worker_pid=pid,
+                                error=f"worker exited with code {process.exitcode}",
+                            )
+                        # A clean exit took its sentinel (a recycled
+                        # worker is replaced on its notice); only a crash
+                        # leaves a slot, and its sentinel, behind
+                        crashed = task is not None or process.exitcode != 0
+                        if crashed and done < len(tasks):
+                            spawn()
+                    continue
+
+                if kind == "start":
+                    running[pid] = payload
+                elif kind == "result":
+                    running.pop(pid, None)
+                    done += 1
+                    yield payload
+                elif kind == "recycle":
+                    # The worker may already have been reaped above
+                    process = processes.pop(pid, None)
+                    if process is not None:
+                        process.join()
+                    self.recycled += 1
+                    if done < len(tasks):
+                        spawn()
+        finally:
+            for process in processes.values():
+                process.join(timeout=_JOIN_TIMEOUT_S if done == len(tasks) else 0)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+
+            # Recycle notices sent after the last result
+            while True:
+                try:
+                    kind, _, _ = result_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.recycled += kind == "recycle"
@@ -0,0 +1,316 @@
+"""
+Declarative report sources.
+
+Every tabular (non-CPID) report is described by one YAML file under
+``config/sources/`` — file-name matcher, accepted suffixes, output
+columns with their types, header aliases and guardrails. Each spec is
+compiled once into a fused :class:`ingestion.normalize.CompiledSpec`
+pipeline, and discovery registers every source it finds, so a new
+report type needs a YAML file and no Python.
+
+The same contracts classify the sheets of multi-sheet workbooks: a
+sheet belongs to the source whose headers it carries
+(:func:`classify_sheet`), and :func:`extract_workbook` opens a file once
+and dispatches each sheet to its source.
+
+Spec layout::
+
+    name: visit_projection
+    label: Visit Projection
+    table: visit_projection_events
+    source: Visit_Projection          # constant ``source`` column
+    match:
+      keywords: [visit projection]    # or  regex: 'missing[_\\s]*lab'
+    suffixes: [.xlsx, .xls]
+    write_options: {}                 # extra storage.writer options
+    columns:                          # output order; type per column
+      subject_id: text                # text | int | float | date[:fmt]
+      projected_date: date:day        # fmt: iso (default) | day | utc_timestamp
+    column_map:
+      Subject: subject_id             # sheet header → column (aliases allowed)
+    require: [subject_id]
+    require_any:
+      - [visit_name, projected_date]
+"""
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import yaml
+
+from core.constants import SOURCE_SPECS_DIR
+from ingestion.file_ingest import open_workbook, read_sheet
+from ingestion.normalize import DATE_ISO, CompiledSpec, NormalizationSpec, compile_spec
+
+
+COLUMN_TYPES = ("text", "int", "float", "date")
+
+# Share of a contract's columns a sheet header must carry to be
+# classified as that source
+MIN_HEADER_MATCH = 0.6
+# ... and to be dispatched to a source the file name did not announce
+MIN_UNDECLARED_HEADER_MATCH = 0.8
+
+# Filled from the study folder / spec, never expected in the sheet
+_CONSTANT_COLUMNS = ("study_id", "source")
+
+
+# ---------------------------------------------------------------------
+# Spec
+# ---------------------------------------------------------------------
+@dataclass(frozen=True)
+class SourceSpec:
+    name: str
+    label: str
+    table: str
+    normalization: NormalizationSpec
+    keywords: Tuple[str, ...] = ()
+    pattern: Optional[str] = None
+    suffixes: Tuple[str, ...] = (".xlsx",)
+    write_options: Dict[str, object] = field(default_factory=dict)
+    pipeline: CompiledSpec = field(init=False, repr=False, compare=False)
+    # Per contract column, the headers that can carry it
+    fingerprint: Tuple[FrozenSet[str], ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.keywords and not self.pattern:
+            raise ValueError(f"Source {self.name!r} needs match keywords or a regex")
+        pipeline = compile_spec(self.normalization)
+        object.__setattr__(self, "pipeline", pipeline)
+        object.__setattr__(
+            self,
+            "fingerprint",
+            tuple(
+                frozenset(plan.headers)
+                for column, plan in pipeline.plans.items()
+                if column not in _CONSTANT_COLUMNS
+            ),
+        )
+
+    @property
+    def column_map(self) -> Dict[str, str]:
+        return dict(self.normalization.column_map)
+
+    def matches(self, name: str) -> bool:
+        """Case-insensitive file-name match."""
+        if self.pattern is not None and re.search(self.pattern, name, re.IGNORECASE):
+            return True
+        name = name.lower()
+        return any(k in name for k in self.keywords)
+
+    def normalize(self, df: pd.DataFrame, study_id: Optional[str] = None) -> pd.DataFrame:
+        return self.pipeline(df, study_id_override=study_id)
+
+    def header_score(self, header: Iterable[Any]) -> float:
+        """
+        Share of the contract's columns present in a sheet header (0 when
+        a ``require`` column is missing: every row would be dropped).
+        """
+        present = set(header)
+        plans = self.pipeline.plans
+        if any(present.isdisjoint(plans[column].headers) for column in self.normalization.require):
+            return 0.0
+        if not self.fingerprint:
+            return 0.0
+        return sum(not present.isdisjoint(aliases) for aliases in self.fingerprint) / len(self.fingerprint)
+
+    def covers_guardrails(self, header: Iterable[Any]) -> bool:
+        """Every ``require`` column and one of each ``require_any`` group is in the header."""
+        present = set(header)
+
+        def has(column: str) -> bool:
+            return not present.isdisjoint(self.pipeline.plans[column].headers)
+
+        return all(has(column) for column in self.normalization.require) and all(
+            any(has(column) for column in group) for group in self.normalization.require_any
+        )
+
+    def extract(self, filepath: str, study_id: Optional[str] = None) -> pd.DataFrame:
+        """The file's first sheet (see :func:`extract_workbook` for every sheet)."""
+        # Parse only the columns the contract (with its aliases) names
+        df = read_sheet(filepath, columns=self.pipeline.source_headers)
+        return self.normalize(df, study_id)
+
+
+# ---------------------------------------------------------------------
+# YAML → SourceSpec
+# ---------------------------------------------------------------------
+def _column_types(columns: Mapping[str, str], where: str):
+    int_columns, float_columns, date_columns = [], [], {}
+    for column, kind in columns.items():
+        kind, _, date_format = str(kind or "text").partition(":")
+        if kind not in COLUMN_TYPES:
+            raise ValueError(f"{where}: column {column!r} has unknown type {kind!r}; expected {COLUMN_TYPES}")
+        if date_format and kind != "date":
+            raise ValueError(f"{where}: only date columns take a format ({column!r})")
+        if kind == "int":
+            int_columns.append(column)
+        elif kind == "float":
+            float_columns.append(column)
+        elif kind == "date":
+            date_columns[column] = date_format or DATE_ISO
+    return tuple(int_columns), tuple(float_columns), date_columns
+
+
+def source_from_dict(raw: Mapping[str, Any], where: str = "<spec>") -> SourceSpec:
+    """Build (and compile) a :class:`SourceSpec` from a parsed YAML mapping."""
+    missing = {"name", "table", "source", "columns", "match"} - set(raw)
+    if missing:
+        raise ValueError(f"{where}: missing keys {sorted(missing)}")
+
+    columns = raw["columns"]
+    int_columns, float_columns, date_columns = _column_types(columns, where)
+    normalization = NormalizationSpec(
+        columns=tuple(columns),
+        source=raw["source"],
+        column_map={str(k): v for k, v in (raw.get("column_map") or {}).items()},
+        int_columns=int_columns,
+        float_columns=float_columns,
+        date_columns=date_columns,
+        require=tuple(raw.get("require") or ()),
+        require_any=tuple(tuple(group) for group in raw.get("require_any") or ()),
+    )
+
+    match = raw["match"]
+    return SourceSpec(
+        name=raw["name"],
+        label=raw.get("label", raw["name"]),
+        table=raw["table"],
+        normalization=normalization,
+        keywords=tuple(k.lower() for k in match.get("keywords") or ()),
+        pattern=match.get("regex"),
+        suffixes=tuple(s.lower() for s in raw.get("suffixes") or (".xlsx",)),
+        write_options=dict(raw.get("write_options") or {}),
+    )
+
+
+def load_source_specs(spec_dir: Union[str, Path] = SOURCE_SPECS_DIR) -> Dict[str, SourceSpec]:
+    """
+    Every ``*.yaml`` under ``spec_dir``, compiled, keyed by name (file
+    name order).
+    """
+    sources: Dict[str, SourceSpec] = {}
+    for path in sorted(Path(spec_dir).glob("*.yaml")):
+        with open(path, "r") as f:
+            spec = source_from_dict(yaml.safe_load(f) or {}, where=str(path))
+        if spec.name in sources:
+            raise ValueError(f"{path}: duplicate source name {spec.name!r}")
+        sources[spec.name] = spec
+    return sources
+
+
+@lru_cache
+def get_sources() -> Dict[str, SourceSpec]:
+    """The checked-in sources (loaded once per process)."""
+    return load_source_specs(SOURCE_SPECS_DIR)
+
+
+def get_source(name: str) -> SourceSpec:
+    sources = get_sources()
+    if name not in sources:
+        raise KeyError(f"Unknown source {name!r}; expected one of {sorted(sources)}")
+    return sources[name]
+
+
+# ---------------------------------------------------------------------
+# Multi-sheet workbooks
+# ---------------------------------------------------------------------
+def classify_sheet(
+    header: Iterable[Any],
+    sources: Optional[Iterable[SourceSpec]] = None,
+    *,
+    names: Sequence[str] = (),
+) -> Optional[SourceSpec]:
+    """
+    The source whose column contract a sheet header fits best.
+
+    Sources scoring below ``MIN_HEADER_MATCH`` are out. Contracts that
+    tie (MedDRA and WHODrug coding reports share one) are told apart by
+    their file-name matchers against ``names``, most specific first
+    (e.g. sheet name, then file name); a tie that survives is left
+    unclassified.
+    """
+    header = list(header)
+    sources = list(get_sources().values() if sources is None else sources)
+
+    scores = {source.name: source.header_score(header) for source in sources}
+    best = max(scores.values(), default=0.0)
+    if best < MIN_HEADER_MATCH:
+        return None
+
+    tied = [source for source in sources if scores[source.name] == best]
+    for name in names:
+        if len(tied) == 1:
+            break
+        named = [source for source in tied if source.matches(name)]
+        tied = named or tied
+    return tied[0] if len(tied) == 1 else None
+
+
+def extract_workbook(
+    filepath: Union[str, Path],
+    study_id: Optional[str] = None,
+    *,
+    sources: Optional[Iterable[str]] = None,
+    expected: Iterable[str] = (),
+) -> Dict[str, pd.DataFrame]:
+    """
+    Every sheet of a workbook, each normalized by the source it
+    classifies as, from a single open of the file.
+
+    Parameters
+    ----------
+    sources : iterable of str, optional
+        Source names sheets may classify as (default: all).
+    expected : iterable of str
+        Sources the file name matched. One no sheet classifies as still
+        reads the first sheet, as :meth:`SourceSpec.extract` does.
+        Sheets an expected source reads go to no other source; any other
+        sheet goes to a source the file name did not announce only on a
+        ``MIN_UNDECLARED_HEADER_MATCH`` score that covers the source's
+        guardrail columns.
+
+    Returns
+    -------
+    dict
+        Source name → normalized rows (several sheets of one source are
+        concatenated), ``expected`` first.
+    """
+    candidates = [get_source(name) for name in (get_sources() if sources is None else sources)]
+    expected = list(expected)
+    path = Path(filepath)
+
+    frames: Dict[str, List[pd.DataFrame]] = defaultdict(list)
+    with open_workbook(path) as book:
+        sheet_names = book.sheet_names
+        classified = {
+            sheet_name: classify_sheet(book.header(sheet_name), candidates, names=(sheet_name, path.name))
+            for sheet_name in sheet_names
+        }
+
+        dispatch: List[Tuple[Union[str, int], SourceSpec]] = []
+        for name in expected:
+            sheets = [sheet for sheet, source in classified.items() if source is not None and source.name == name]
+            dispatch += [(sheet, get_source(name)) for sheet in sheets or sheet_names[:1]]
+
+        consumed = {sheet for sheet, _ in dispatch}
+        for sheet_name, source in classified.items():
+            if source is None or sheet_name in consumed:
+                continue
+            header = book.header(sheet_name)
+            if source.header_score(header) >= MIN_UNDECLARED_HEADER_MATCH and source.covers_guardrails(header):
+                dispatch.append((sheet_name, source))
+
+        for sheet_name, source in dispatch:
+            df = book.read(sheet_name, columns=source.pipeline.source_headers)
+            frames[source.name].append(source.normalize(df, study_id))
+
+    order = expected + [name for name in frames if name not in expected]
+    return {
+        name: frames[name][0] if len(frames[name]) == 1 else pd.concat(frames[name], ignore_index=True)
+        for name in order
+    }
@@ -0,0 +1,124 @@
+"""
+Adaptive batch sizing for the Supabase writer.
+
+Batch size starts from the caller's ``batch_size``, is capped by the
+estimated serialized payload bytes, grows multiplicatively while
+requests come back under the latency target, and shrinks on slow
+responses or on payload-too-large / timeout errors.
+"""
+import json
+import threading
+from dataclasses import dataclass
+from typing import Sequence
+
+import httpx
+
+
+# PostgREST error codes that mean "send less per request"
+_OVERLOAD_CODES = {
+    "413",    # HTTP Payload Too Large
+    "57014",  # Postgres statement_timeout
+}
+
+_SAMPLE_ROWS = 16
+
+
+@dataclass(frozen=True)
+class BatchSizingConfig:
+    min_batch_size: int = 50
+    max_batch_size: int = 5000
+    max_batch_bytes: int = 2 * 1024 ** 2  # 2 MiB serialized JSON
+    target_latency_s: float = 2.0
+    growth_factor: float = 1.5
+    shrink_factor: float = 0.5
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """True for 413 / timeout failures that a smaller batch may avoid."""
+    if isinstance(exc, (httpx.TimeoutException, TimeoutError)):
+        return True
+    return str(getattr(exc, "code", "")) in _OVERLOAD_CODES
+
+
+def estimate_row_bytes(rows: Sequence[dict]) -> float:
+    """
+    Average serialized JSON bytes per row, from an evenly spaced sample.
+    """
+    if not rows:
+        return 0.0
+
+    step = max(1, len(rows) // _SAMPLE_ROWS)
+    sample = rows[::step][:_SAMPLE_ROWS]
+    encoded = sum(len(json.dumps(row, default=str)) for row in sample)
+    # +1 per row for the separating comma in the JSON array
+    return encoded / len(sample) + 1
+
+
+class AdaptiveBatchSizer:
+    """
+    Thread-safe AIMD-style controller shared by concurrent batch senders.
+    """
+
+    def __init__(self, initial_size: int, config: BatchSizingConfig = BatchSizingConfig()):
+        self.config = config
+        self._size = float(self._clamp(initial_size))
+        # Running estimate of serialized bytes per row (streams only)
+        self._row_bytes = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current_size(self) -> int:
+        return int(self._size)
+
+    def _clamp(self, size: float) -> float:
+        return min(max(size, self.config.min_batch_size), self.config.max_batch_size)
+
+    def next_batch_size(self, rows: Sequence[dict], start: int = 0) -> int:
+        """
+        Rows to take for the next batch starting at ``rows[start]``.
+        The byte cap always wins over ``min_batch_size``.
+        """
+        size = self.current_size
+        row_bytes = estimate_row_bytes(rows[start:start + size])
+
+        if row_bytes > 0:
+            size = min(size, int(self.config.max_batch_bytes // row_bytes))
+
+        return max(1, size)
+
+    def observe_row_bytes(self, rows: Sequence[dict]) -> None:
+        """
+        Update the running bytes-per-row estimate from sample rows, for
+        streams where upcoming rows cannot be inspected in advance.
+        """
+        estimate = estimate_row_bytes(rows)
+        if estimate <= 0:
+            return
+        with self._lock:
+            self._row_bytes = (
+                estimate if not self._row_bytes else 0.7 * self._row_bytes + 0.3 * estimate
+            )
+
+    def stream_batch_size(self) -> int:
+        """Batch size for the next streamed batch (byte cap from the running estimate)."""
+        size = self.current_size
+        if self._row_bytes > 0:
+            size = min(size, int(self.config.max_batch_bytes // self._row_bytes))
+        return max(1, size)
+
+    def on_success(self, rows: int, latency_s: float) -> None:
+        with self._lock:
+            if latency_s <= self.config.target_latency_s:
+                # Only grow if this batch actually used the current size
+                if rows >= self.current_size:
+                    self._size = self._clamp(self._size * self.config.growth_factor)
+            else:
+                self._size = self._clamp(
+                    self._size * self.config.target_latency_s / latency_s
+                )
+
+    def on_overload(self, rows: int) -> None:
+        with self._lock:
+            self._size = self._clamp(
+                min(self._size, rows) * self.config.shrink_factor
+            )
@@ -0,0 +1,354 @@
+"""
+Dense subject × metric matrices for cross-metric analytics.
+
+The long snapshot format (one row per subject and metric) is what gets
+stored, but questions such as "subjects whose page-status buckets sum
+above N" want every metric of a subject side by side. A
+:class:`MetricMatrix` is that pivot: a float32 ``(subjects, metrics)``
+array with NaN where a subject has no value, plus the subject, site and
+metric labels.
+
+:class:`MetricMatrixCache` builds the matrix once per snapshot (keyed by
+the snapshot file's fingerprint, or one the caller already has, such as
+the manifest's) and memory-maps it from disk afterwards, so repeat
+queries neither re-read the snapshot, re-pivot nor load the whole array.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from core.constants import CACHE_ROOT_DIR
+
+
+# Bump when the on-disk layout changes so old matrices are rebuilt
+MATRIX_FORMAT_VERSION = 1
+
+DEFAULT_MATRIX_CACHE_DIR = CACHE_ROOT_DIR / "metric_matrices"
+
+VALUES_FILE = "values.npy"
+META_FILE = "meta.json"
+
+REDUCTIONS = ("sum", "mean", "min", "max", "count")
+
+MetricSelector = Union[str, Sequence[str]]
+
+# Snapshot columns a matrix is built from
+MATRIX_COLUMNS = ["entity_id", "site_id", "metric_name", "metric_value"]
+
+
+def snapshot_file_fingerprint(path: Union[str, Path]) -> str:
+    """
+    Fingerprint of a snapshot file from its path, size and mtime (a
+    stat, no read): rewriting the file changes it.
+    """
+    resolved = Path(path).resolve()
+    st = resolved.stat()
+    token = f"{resolved}\0{st.st_size}\0{st.st_mtime_ns}"
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+
+class MetricMatrix:
+    """
+    Subject × metric float32 matrix.
+
+    Attributes
+    ----------
+    values : np.ndarray or np.memmap
+        ``(len(subjects), len(metric_names))``; NaN = no value.
+    subjects : np.ndarray
+        Entity id per row.
+    sites : np.ndarray
+        Site id per row (first site seen for the subject).
+    metric_names : np.ndarray
+        Metric name per column, sorted.
+    metric_ids : np.ndarray, optional
+        Dimension-registry ID per column when built with a registry.
+    """
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        subjects: Sequence[str],
+        sites: Sequence[Optional[str]],
+        metric_names: Sequence[str],
+        metric_ids: Optional[Sequence[int]] = None,
+    ):
+        self.values = values
+        self.subjects = np.asarray(subjects, dtype=object)
+        self.sites = np.asarray(sites, dtype=object)
+        self.metric_names = np.asarray(metric_names, dtype=object)
+        self.metric_ids = None if metric_ids is None else np.asarray(metric_ids, dtype=np.int32)
+        self._columns = {name: i for i, name in enumerate(self.metric_names)}
+
+        site_codes, site_labels = pd.factorize(pd.Series(self.sites, dtype=object), use_na_sentinel=False)
+        self._site_codes = site_codes
+        self._site_labels = site_labels
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def mask(self) -> np.ndarray:
+        """True where a subject has a value for the metric."""
+        return ~np.isnan(self.values)
+
+    # -----------------------------------------------------------------
+    # Build / persist
+    # -----------------------------------------------------------------
+    @classmethod
+    def build(cls, snapshots: pd.DataFrame, registry=None) -> "MetricMatrix":
+        """
+        Pivot long snapshot rows (``extract_cpid_metrics`` output) into
+        a matrix. Duplicate (subject, metric) rows keep the last value;
+        rows without an entity_id or metric_name are left out.
+
+        ``registry`` (a ``storage.dimensions.DimensionRegistry``) adds
+        the metric ID of each column.
+        """
+        # A missing key has no row / column to land in
+        snapshots = snapshots[snapshots["entity_id"].notna() & snapshots["metric_name"].notna()]
+
+        entity_ids = snapshots["entity_id"].astype("string")
+        row_codes, subjects = pd.factorize(entity_ids, sort=True)
+        metric_names = np.sort(snapshots["metric_name"].astype(str).unique())
+        col_codes = np.searchsorted(metric_names, snapshots["metric_name"].astype(str).to_numpy())
+
+        values = np.full((len(subjects), len(metric_names)), np.nan, dtype=np.float32)
+        values[row_codes, col_codes] = pd.to_numeric(
+            snapshots["metric_value"], errors="coerce"
+        ).to_numpy(dtype=np.float32)
+
+        # First row of each subject supplies its site
+        first = np.unique(row_codes, return_index=True)[1]
+        sites = snapshots["site_id"].astype("string").to_numpy(dtype=object, na_value=None)[first]
+
+        metric_ids = None
+        if registry is not None:
+            metric_ids = registry.dimension("metric_name").encode(metric_names)
+
+        return cls(values, np.asarray(subjects, dtype=object), sites, metric_names, metric_ids)
+
+    def save(self, directory: Union[str, Path]) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        array = np.lib.format.open_memmap(
+            directory / VALUES_FILE, mode="w+", dtype=np.float32, shape=self.values.shape
+        )
+        array[:] = self.values
+        array.flush()
+        del array
+
+        meta = {
+            "version": MATRIX_FORMAT_VERSION,
+            "subjects": self.subjects.tolist(),
+            "sites": self.sites.tolist(),
+            "metric_names": self.metric_names.tolist(),
+            "metric_ids": None if self.metric_ids is None else self.metric_ids.tolist(),
+        }
+        with open(directory / META_FILE, "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, directory: Union[str, Path]) -> "MetricMatrix":
+        """Memory-map a saved matrix read-only."""
+        directory = Path(directory)
+        with open(directory / META_FILE, "r") as f:
+            meta = json.load(f)
+        if meta.get("version") != MATRIX_FORMAT_VERSION:
+            raise ValueError(f"{directory} has matrix format {meta.get('version')!r}")
+
+        values = np.load(directory / VALUES_FILE, mmap_mode="r")
+        return cls(values, meta["subjects"], meta["sites"], meta["metric_names"], meta["metric_ids"])
+
+    # -----------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------
+    def columns(self, metrics: Optional[MetricSelector] = None, *, prefix: Optional[str] = None) -> np.ndarray:
+        """
+        Column indices for metric name(s) and/or every metric starting
+        with ``prefix`` (e.g. ``"cpmd__page_status__bucket_"``).
+        """
+        selected: List[int] = []
+        if metrics is not None:
+            names = [metrics] if isinstance(metrics, str) else list(metrics)
+            missing = [n for n in names if n not in self._columns]
+            if missing:
+                raise KeyError(f"Unknown metrics: {missing}")
+            selected.extend(self._columns[n] for n in names)
+        if prefix is not None:
+            selected.extend(i for i, n in enumerate(self.metric_names) if n.startswith(prefix))
+        if metrics is None and prefix is None:
+            return np.arange(len(self.metric_names))
+        return np.unique(np.asarray(selected, dtype=np.intp))
+
+    def frame(self, metrics: Optional[MetricSelector] = None, *, prefix: Optional[str] = None) -> pd.DataFrame:
+        """Selected columns as a subject-indexed DataFrame."""
+        cols = self.columns(metrics, prefix=prefix)
+        return pd.DataFrame(
+            np.asarray(self.values[:, cols]),
+            index=pd.Index(self.subjects, name="entity_id"),
+            columns=self.metric_names[cols],
+        )
+
+    def row_sum(self, metrics: Optional[MetricSelector] = None, *, prefix: Optional[str] = None) -> pd.Series:
+        """
+        Per-subject sum over the selected metrics; NaN for subjects with
+        none of them (not 0).
+        """
+        block = np.asarray(self.values[:, self.columns(metrics, prefix=prefix)])
+        present = ~np.isnan(block)
+        sums = np.where(present.any(axis=1), np.nansum(block, axis=1, dtype=np.float64), np.nan)
+        return pd.Series(sums, index=pd.Index(self.subjects, name="entity_id"))
+
+    def subjects_where(
+        self,
+        metrics: Optional[MetricSelector] = None,
+        *,
+        prefix: Optional[str] = None,
+        above: Optional[float] = None,
+        below: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """
+        Subjects (with site) whose summed selected metrics are strictly
+        above ``above`` and/or below ``below``.
+
+        Examples
+        --------
+        >>> matrix.subjects_where(prefix="cpmd__page_status__bucket_", above=10)
+        """
+        sums = self.row_sum(metrics, prefix=prefix).to_numpy()
+        keep = ~np.isnan(sums)
+        if above is not None:
+            keep &= sums > above
+        if below is not None:
+            keep &= sums < below
+        return pd.DataFrame(
+            {"entity_id": self.subjects[keep], "site_id": self.sites[keep], "value": sums[keep]}
+        )
+
+    def site_reduce(
+        self,
+        metrics: Optional[MetricSelector] = None,
+        *,
+        prefix: Optional[str] = None,
+        how: str = "sum",
+    ) -> pd.DataFrame:
+        """
+        Sites × selected metrics, reducing subjects with ``how`` (one of
+        ``REDUCTIONS``). Missing values are skipped; a site with no
+        values for a metric gets NaN (0 for ``count``).
+        """
+        if how not in REDUCTIONS:
+            raise ValueError(f"how must be one of {REDUCTIONS}, got {how!r}")
+
+        cols = self.columns(metrics, prefix=prefix)
+        block = np.asarray(self.values[:, cols], dtype=np.float64)
+        present = ~np.isnan(block)
+        n_sites = len(self._site_labels)
+
+        counts = np.zeros((n_sites, len(cols)))
+        np.add.at(counts, self._site_codes, present)
+
+        if how == "count":
+            out = counts
+        elif how in ("sum", "mean"):
+            out = np.zeros((n_sites, len(cols)))
+            np.add.at(out, self._site_codes, np.where(present, block, 0.0))
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    out = out / counts
+            out[counts == 0] = np.nan
+        else:
+            fill = np.inf if how == "min" else -np.inf
+            out = np.full((n_sites, len(cols)), fill)
+            ufunc = np.minimum if how == "min" else np.maximum
+            ufunc.at(out, self._site_codes, np.where(present, block, fill))
+            out[counts == 0] = np.nan
+
+        return pd.DataFrame(
+            out,
+            index=pd.Index(list(self._site_labels), name="site_id"),
+            columns=self.metric_names[cols],
+        )
+
+
+class MetricMatrixCache:
+    """
+    On-disk matrices, one per (study, snapshot fingerprint).
+
+    Building a study's matrix for a new snapshot replaces that study's
+    older matrices.
+    """
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_MATRIX_CACHE_DIR):
+        self.root = Path(root)
+
+    def _dir(self, study: str, fingerprint: str) -> Path:
+        return self.root / quote(str(study), safe="") / fingerprint
+
+    def get(
+        self,
+        study: str,
+        snapshots: Union[str, Path, pd.DataFrame],
+        registry=None,
+        *,
+        fingerprint: Optional[str] = None,
+    ) -> MetricMatrix:
+        """
+        Memory-mapped matrix for ``snapshots``, building it on first use.
+
+        Parameters
+        ----------
+        snapshots : path or pd.DataFrame
+            A snapshot file (``storage.snapshot_files``), read only when
+            the matrix is built, or the snapshot rows themselves.
+        registry : DimensionRegistry, optional
+            Decodes a file written with registry IDs and adds the
+            matrix's metric IDs.
+        fingerprint : str, optional
+            Identifies the snapshot's content (e.g. the manifest's
+            ``FileFingerprint.sha256`` of the source workbook). Required
+            for a DataFrame; a file defaults to
+            :func:`snapshot_file_fingerprint`.
+        """
+        if fingerprint is None:
+            if isinstance(snapshots, pd.DataFrame):
+                raise ValueError("Pass the fingerprint of the snapshot the DataFrame holds")
+            fingerprint = snapshot_file_fingerprint(snapshots)
+
+        directory = self._dir(study, fingerprint)
+        if (directory / META_FILE).exists():
+            try:
+                return MetricMatrix.open(directory)
+            except ValueError:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        if not isinstance(snapshots, pd.DataFrame):
+            from storage.snapshot_files import read_snapshot_file
+
+            snapshots = read_snapshot_file(snapshots, MATRIX_COLUMNS, dimensions=registry)
+        matrix = MetricMatrix.build(snapshots, registry)
+
+        tmp = directory.with_name(f".{directory.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        matrix.save(tmp)
+        for stale in directory.parent.iterdir():
+            if stale != tmp and not stale.name.startswith("."):
+                shutil.rmtree(stale, ignore_errors=True)
+        os.replace(tmp, directory)
+
+        return MetricMatrix.open(directory)
+
+    def studies(self) -> Iterable[str]:
+        if not self.root.exists():
+            return []
+        return sorted(unquote(p.name) for p in self.root.iterdir() if p.is_dir())
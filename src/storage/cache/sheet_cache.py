@@ -0,0 +1,361 @@
+"""
+Content-addressed Parquet cache for parsed spreadsheet sheets.
+
+Entries are keyed by the source file's content hash plus the read
+arguments, so an unchanged workbook is parsed by Excel once and then
+loaded from Parquet on every later run. Eviction is by age (last use)
+and by total size (least recently used first).
+"""
+import datetime as dt
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Bump when the on-disk layout changes so old entries are ignored
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB
+DEFAULT_MAX_AGE_DAYS = 30
+
+_METADATA_KEY = b"ctp_sheet_cache"
+_TAG_SUFFIX = "__tag"
+
+
+# ---------------------------------------------------------------------
+# Tagged scalar encoding (mixed-type object columns + column labels)
+# ---------------------------------------------------------------------
+# Excel columns routinely mix ints and strings (e.g. a numeric footer in
+# a text column). Arrow cannot store those natively, so each cell is
+# stored as (type tag, string) and rebuilt exactly on load.
+_TAG_NULL, _TAG_STR, _TAG_BOOL, _TAG_INT, _TAG_FLOAT = 0, 1, 2, 3, 4
+_TAG_TIMESTAMP, _TAG_DATETIME, _TAG_DATE, _TAG_TIME = 5, 6, 7, 8
+
+_DECODERS = {
+    _TAG_STR: str,
+    _TAG_BOOL: lambda s: s == "True",
+    _TAG_INT: int,
+    _TAG_FLOAT: float,
+    _TAG_TIMESTAMP: pd.Timestamp,
+    _TAG_DATETIME: dt.datetime.fromisoformat,
+    _TAG_DATE: dt.date.fromisoformat,
+    _TAG_TIME: dt.time.fromisoformat,
+}
+
+
+class UncacheableFrame(ValueError):
+    """Frame contains values the cache cannot round-trip exactly."""
+
+
+def _encode_scalar(value: Any) -> Tuple[int, Optional[str]]:
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return _TAG_NULL, None
+    if isinstance(value, str):
+        return _TAG_STR, value
+    if isinstance(value, (bool, np.bool_)):
+        return _TAG_BOOL, str(bool(value))
+    if isinstance(value, (int, np.integer)):
+        return _TAG_INT, str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return _TAG_FLOAT, repr(float(value))
+    if isinstance(value, pd.Timestamp):
+        return _TAG_TIMESTAMP, value.isoformat()
+    if isinstance(value, dt.datetime):
+        return _TAG_DATETIME, value.isoformat()
+    if isinstance(value, dt.date):
+        return _TAG_DATE, value.isoformat()
+    if isinstance(value, dt.time):
+        return _TAG_TIME, value.isoformat()
+    raise UncacheableFrame(f"Unsupported cell type: {type(value).__name__}")
+
+
+def _decode_scalar(tag: int, text: Optional[str]) -> Any:
+    if tag == _TAG_NULL:
+        return np.nan
+    return _DECODERS[tag](text)
+
+
+def _encode_column(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [_encode_scalar(v) for v in values.to_numpy(dtype=object)]
+    tags = np.fromiter((t for t, _ in encoded), dtype=np.int8, count=len(encoded))
+    texts = np.array([s for _, s in encoded], dtype=object)
+    return tags, texts
+
+
+def _decode_column(tags: np.ndarray, texts: np.ndarray) -> np.ndarray:
+    out = np.full(len(tags), np.nan, dtype=object)
+
+    for tag in np.unique(tags):
+        if tag == _TAG_NULL:
+            continue
+        mask = tags == tag
+        decode = _DECODERS[int(tag)]
+        out[mask] = [decode(s) for s in texts[mask]]
+
+    return out
+
+
+def _is_plain_text(values: pd.Series) -> bool:
+    """Object column Arrow stores natively and returns unchanged (str / null)."""
+    try:
+        arr = pa.array(values, from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        return False
+    return pa.types.is_string(arr.type) or pa.types.is_null(arr.type)
+
+
+def _encode_label(label: Any) -> list:
+    if isinstance(label, tuple):
+        return [list(_encode_scalar(part)) for part in label]
+    return [list(_encode_scalar(label))]
+
+
+def _decode_label(parts: list, nlevels: int) -> Any:
+    values = tuple(_decode_scalar(tag, text) for tag, text in parts)
+    return values if nlevels > 1 else values[0]
+
+
+# ---------------------------------------------------------------------
+# Stats
+# ---------------------------------------------------------------------
+@dataclass
+class SheetCacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    uncacheable: int = 0
+    evictions: int = 0
+    bytes_evicted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+# ---------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------
+class SheetCache:
+    """
+    Parquet-backed cache of parsed sheets.
+
+    Parameters
+    ----------
+    cache_dir : Path
+        Directory holding ``<key>.parquet`` entries.
+    max_bytes : int
+        Total size budget; least recently used entries go first.
+    max_age_days : float
+        Entries not read or written for this long are evicted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 86400
+        self.stats = SheetCacheStats()
+
+    # -----------------------------------------------------------------
+    # Keys
+    # -----------------------------------------------------------------
+    @staticmethod
+    def make_key(content_hash: str, read_kwargs: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {
+                "format": CACHE_FORMAT_VERSION,
+                "pandas": pd.__version__,
+                "content": content_hash,
+                "read_kwargs": read_kwargs,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    # -----------------------------------------------------------------
+    # Lookup / store
+    # -----------------------------------------------------------------
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._path(key)
+
+        try:
+            table = pq.read_table(path)
+        except (OSError, pa.ArrowException):
+            self.stats.misses += 1
+            return None
+
+        try:
+            df = self._from_table(table)
+        except (KeyError, ValueError, TypeError):
+            # Corrupt or foreign entry: drop it and treat as a miss
+            path.unlink(missing_ok=True)
+            self.stats.misses += 1
+            return None
+
+        # Refresh last-use time for LRU / age eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.stats.hits += 1
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """
+        Store ``df``; returns False (and counts it) if the frame cannot
+        be round-tripped exactly. Never raises on cache I/O failure.
+        """
+        try:
+            table = self._to_table(df)
+        except (UncacheableFrame, pa.ArrowException):
+            self.stats.uncacheable += 1
+            return False
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            return False
+
+        self.stats.writes += 1
+        self.evict()
+        return True
+
+    # -----------------------------------------------------------------
+    # Eviction
+    # -----------------------------------------------------------------
+    def evict(self) -> None:
+        if not self.cache_dir.exists():
+            return
+
+        now = time.time()
+        entries: List[Tuple[float, int, Path]] = []
+
+        for path in self.cache_dir.glob("*.parquet"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+
+            if now - st.st_mtime > self.max_age_seconds:
+                self._remove(path, st.st_size)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path, size)
+            total -= size
+
+    def _remove(self, path: Path, size: int) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            return
+        self.stats.evictions += 1
+        self.stats.bytes_evicted += size
+
+    def size_bytes(self) -> int:
+        if not self.cache_dir.exists():
+            return 0
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*.parquet"))
+
+    # -----------------------------------------------------------------
+    # DataFrame <-> Arrow
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _to_table(df: pd.DataFrame) -> pa.Table:
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            raise UncacheableFrame("Only default RangeIndex frames are cached")
+
+        data: Dict[str, Any] = {}
+        mixed: List[int] = []
+
+        for i in range(df.shape[1]):
+            values = df.iloc[:, i]
+            name = f"c{i}"
+
+            if values.dtype == object and not _is_plain_text(values):
+                tags, texts = _encode_column(values)
+                data[name] = pd.Series(texts, dtype=object)
+                data[name + _TAG_SUFFIX] = tags
+                mixed.append(i)
+                continue
+
+            data[name] = values.reset_index(drop=True)
+
+        frame = pd.DataFrame(data, index=pd.RangeIndex(len(df)))
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+
+        meta = {
+            "nlevels": df.columns.nlevels,
+            "columns": [_encode_label(col) for col in df.columns],
+            "mixed": mixed,
+        }
+        schema_meta = dict(table.schema.metadata or {})
+        schema_meta[_METADATA_KEY] = json.dumps(meta).encode("utf-8")
+        return table.replace_schema_metadata(schema_meta)
+
+    @staticmethod
+    def _from_table(table: pa.Table) -> pd.DataFrame:
+        meta = json.loads(table.schema.metadata[_METADATA_KEY])
+        frame = table.to_pandas()
+        mixed = set(meta["mixed"])
+
+        data: Dict[int, Any] = {}
+
+        for i in range(len(meta["columns"])):
+            name = f"c{i}"
+
+            if i in mixed:
+                data[i] = _decode_column(
+                    frame[name + _TAG_SUFFIX].to_numpy(),
+                    frame[name].to_numpy(dtype=object),
+                )
+                continue
+
+            values = frame[name]
+            if values.dtype == object:
+                # Arrow nulls come back as None; pandas' Excel reader uses NaN
+                values = values.where(values.notna(), np.nan)
+            data[i] = values
+
+        df = pd.DataFrame(data, index=pd.RangeIndex(len(frame)))
+
+        nlevels = meta["nlevels"]
+        labels = [_decode_label(parts, nlevels) for parts in meta["columns"]]
+        df.columns = (
+            pd.MultiIndex.from_tuples(labels) if nlevels > 1 else pd.Index(labels)
+        )
+        return df
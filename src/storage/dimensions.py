@@ -0,0 +1,224 @@
+"""
+Persistent dimension registry: integer surrogate keys for identifiers.
+
+Snapshot rows repeat the same few thousand strings (subjects, sites,
+metric names, sources) millions of times. The registry
+interns each distinct value of a dimension once and hands out dense
+int32 IDs that are stable across runs, so frames can be carried as
+int32 code columns plus one shared dictionary per dimension.
+
+IDs are append-only: a value keeps its ID forever, and new values get
+the next free one. Assignment is serialized across processes with a
+file lock (see :meth:`DimensionRegistry.transaction`).
+"""
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from core.constants import DIMENSIONS_PATH
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+DIMENSIONS_VERSION = 1
+
+# Snapshot columns interned by default (entity_type is a 1-value column;
+# snapshot_time is a timestamp, which would decode back as a string)
+SNAPSHOT_DIMENSIONS = ("entity_id", "site_id", "metric_name", "source")
+
+# Code for null values
+NULL_ID = -1
+
+ID_DTYPE = np.int32
+
+
+class Dimension:
+    """
+    One interned value space. ``values[i]`` is the value with ID ``i``.
+    """
+
+    def __init__(self, name: str, values: Optional[List[str]] = None):
+        self.name = name
+        self.values: List[str] = list(values or [])
+        self._ids: Dict[str, int] = {value: i for i, value in enumerate(self.values)}
+        self.added = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, values: Union[pd.Series, Sequence]) -> np.ndarray:
+        """
+        int32 IDs for ``values`` (stringified), assigning IDs to values
+        not seen before. Nulls map to ``NULL_ID``.
+
+        Only the distinct values are looked up, so cost is one
+        factorize plus one dict probe per distinct value.
+        """
+        series = pd.Series(values, copy=False).astype("string")
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+
+        lookup = np.empty(len(uniques), dtype=ID_DTYPE)
+        for i, value in enumerate(uniques):
+            id_ = self._ids.get(value)
+            if id_ is None:
+                id_ = len(self.values)
+                if id_ > np.iinfo(ID_DTYPE).max:
+                    raise OverflowError(f"Dimension {self.name!r} exceeds int32 IDs")
+                self.values.append(value)
+                self._ids[value] = id_
+                self.added += 1
+            lookup[i] = id_
+
+        out = np.full(len(codes), NULL_ID, dtype=ID_DTYPE)
+        present = codes >= 0
+        out[present] = lookup[codes[present]]
+        return out
+
+    def decode(self, ids: Union[np.ndarray, Sequence[int]]) -> pd.Series:
+        """Values for ``ids`` as a ``string`` Series (``NULL_ID`` → NA)."""
+        ids = np.asarray(ids)
+        lookup = np.array(self.values + [None], dtype=object)
+        return pd.Series(lookup[np.where(ids == NULL_ID, len(self.values), ids)], dtype="string")
+
+    def dictionary(self) -> pa.Array:
+        return pa.array(self.values, type=pa.string())
+
+
+class DimensionRegistry:
+    """
+    Named dimensions persisted as one JSON file.
+
+    The on-disk layout is::
+
+        {"version": 1, "dimensions": {"<name>": ["<value for ID 0>", ...]}}
+    """
+
+    def __init__(self, path: Union[str, Path] = DIMENSIONS_PATH):
+        self.path = Path(path)
+        self.dimensions: Dict[str, Dimension] = {}
+
+    # -----------------------------------------------------------------
+    # Persistence
+    # -----------------------------------------------------------------
+    @classmethod
+    def load(cls, path: Union[str, Path] = DIMENSIONS_PATH) -> "DimensionRegistry":
+        registry = cls(path)
+        registry._read()
+        return registry
+
+    def _read(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+
+        if raw.get("version") != DIMENSIONS_VERSION:
+            raise ValueError(
+                f"{self.path} has dimensions version {raw.get('version')!r}; "
+                f"expected {DIMENSIONS_VERSION} (IDs cannot be silently reassigned)"
+            )
+        for name, values in raw.get("dimensions", {}).items():
+            self.dimensions[name] = Dimension(name, values)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+
+        payload = {name: dim.values for name, dim in self.dimensions.items()}
+        with open(tmp_path, "w") as f:
+            json.dump({"version": DIMENSIONS_VERSION, "dimensions": payload}, f)
+
+        os.replace(tmp_path, self.path)
+        for dimension in self.dimensions.values():
+            dimension.added = 0
+
+    @classmethod
+    @contextmanager
+    def transaction(cls, path: Union[str, Path] = DIMENSIONS_PATH) -> Iterator["DimensionRegistry"]:
+        """
+        Load, use and save the registry while holding an exclusive lock,
+        so concurrent runs (or extraction workers) never hand out the
+        same ID twice. Nothing is saved if the block raises.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path.with_suffix(".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                registry = cls.load(path)
+                yield registry
+                if any(dim.added for dim in registry.dimensions.values()):
+                    registry.save()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -----------------------------------------------------------------
+    # Encoding
+    # -----------------------------------------------------------------
+    def dimension(self, name: str) -> Dimension:
+        if name not in self.dimensions:
+            self.dimensions[name] = Dimension(name)
+        return self.dimensions[name]
+
+    def encode_frame(
+        self,
+        df: pd.DataFrame,
+        columns: Iterable[str] = SNAPSHOT_DIMENSIONS,
+    ) -> pd.DataFrame:
+        """
+        Copy of ``df`` with each of ``columns`` (that is present)
+        replaced by its int32 IDs.
+        """
+        out = df.copy()
+        for column in columns:
+            if column in out.columns:
+                out[column] = self.dimension(column).encode(out[column])
+        return out
+
+    def decode_frame(
+        self,
+        df: pd.DataFrame,
+        columns: Iterable[str] = SNAPSHOT_DIMENSIONS,
+    ) -> pd.DataFrame:
+        """Inverse of :meth:`encode_frame` (values come back as ``string``)."""
+        out = df.copy()
+        for column in columns:
+            if column in out.columns:
+                out[column] = self.dimension(column).decode(out[column].to_numpy()).array
+        return out
+
+    def to_arrow(
+        self,
+        df: pd.DataFrame,
+        columns: Iterable[str] = SNAPSHOT_DIMENSIONS,
+    ) -> pa.Table:
+        """
+        Arrow table whose ``columns`` are dictionary arrays: the int32
+        registry IDs as indices over the registry's shared dictionary.
+        Tables built from the same registry therefore share IDs and can
+        be concatenated or joined without re-encoding.
+        """
+        columns = [c for c in columns if c in df.columns]
+        encoded = self.encode_frame(df, columns)
+        table = pa.Table.from_pandas(encoded.drop(columns=columns), preserve_index=False)
+
+        for column in columns:
+            ids = encoded[column].to_numpy()
+            indices = pa.array(ids, type=pa.int32(), mask=ids == NULL_ID)
+            array = pa.DictionaryArray.from_arrays(indices, self.dimension(column).dictionary())
+            table = table.append_column(column, array)
+
+        return table.select(list(df.columns))
@@ -0,0 +1,548 @@
+"""
+PostgreSQL ``COPY FROM STDIN`` bulk-load backend.
+
+DataFrames are encoded batch by batch (CSV text or PGCOPY binary) into
+a file-like stream that ``cursor.copy_expert`` pulls from, so one COPY
+statement loads a whole frame / stream without building it in memory.
+
+Keyed write modes (see ``storage.row_keys``) COPY into a temporary
+staging table and merge with ``INSERT ... ON CONFLICT (row_key)``.
+
+Each writing thread gets its own connection, so concurrent table writes
+(the orchestrator's write pool) run in separate transactions.
+
+Selected with ``storage.backend: "postgres"`` in the YAML config; the
+connection string comes from ``POSTGRES_DSN`` (see ``storage.writer``).
+"""
+import atexit
+import io
+import struct
+import threading
+import uuid
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.config import get_settings
+from storage.row_keys import ROW_KEY_COLUMN, frame_row_keys
+
+
+COPY_FORMATS = ("csv", "binary")
+
+# Rows encoded per chunk handed to COPY (bounds encoder memory only; the
+# COPY itself is a single statement)
+DEFAULT_COPY_CHUNK_ROWS = 50_000
+
+CSV_NULL = r"\N"
+
+# Prefix of the per-COPY temporary staging tables
+STAGING_TABLE = "_ctp_copy_stage"
+
+_local = threading.local()
+
+# Every connection handed out (the write pool's threads each open one),
+# so close_postgres_connections can close them after the threads are gone
+_connections: List = []
+_connections_lock = threading.Lock()
+
+
+def _connect():
+    import psycopg2
+
+    dsn = get_settings().storage.postgres_dsn
+    if not dsn:
+        raise RuntimeError("Postgres DSN not configured (set POSTGRES_DSN)")
+
+    return psycopg2.connect(dsn)
+
+
+def get_postgres_connection():
+    """
+    Returns this thread's psycopg2 connection to ``POSTGRES_DSN``
+    (a psycopg2 connection is one session: threads sharing it would
+    share one transaction).
+    """
+    connection = getattr(_local, "connection", None)
+
+    if connection is None or connection.closed:
+        connection = _local.connection = _connect()
+        with _connections_lock:
+            _connections[:] = [conn for conn in _connections if not conn.closed]
+            _connections.append(connection)
+
+    return connection
+
+
+def close_postgres_connections() -> int:
+    """
+    Close every connection :func:`get_postgres_connection` opened, in any
+    thread (also registered to run at exit). A thread that writes again
+    afterwards gets a new connection.
+
+    Returns
+    -------
+    int
+        Connections closed.
+    """
+    with _connections_lock:
+        opened, _connections[:] = list(_connections), []
+
+    closed = 0
+    for connection in opened:
+        if not connection.closed:
+            connection.close()
+            closed += 1
+    return closed
+
+
+atexit.register(close_postgres_connections)
+
+
+def _quote_ident(name: str) -> str:
+    # Schema-qualified names ("public.sae_events") are quoted per part
+    return ".".join('"' + part.replace('"', '""') + '"' for part in name.split("."))
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of ``bytes`` chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._chunk = b""
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            rest = b"".join(self._chunks)
+            out, self._chunk, self._pos = self._chunk[self._pos:] + rest, b"", 0
+            return out
+
+        # Serves at most the rest of the current chunk (short reads are
+        # fine for COPY), so large chunks are never re-copied
+        while self._pos >= len(self._chunk):
+            self._chunk, self._pos = next(self._chunks, None), 0
+            if self._chunk is None:
+                self._chunk = b""
+                return b""
+
+        out = self._chunk[self._pos:self._pos + size]
+        self._pos += len(out)
+        return out
+
+
+# ---------------------------------------------------------------------
+# CSV encoding
+# ---------------------------------------------------------------------
+def _csv_chunk(df: pd.DataFrame) -> bytes:
+    return df.to_csv(
+        header=False,
+        index=False,
+        na_rep=CSV_NULL,
+        date_format="%Y-%m-%dT%H:%M:%S.%f%z",
+    ).encode("utf-8")
+
+
+# ---------------------------------------------------------------------
+# Binary (PGCOPY) encoding
+# ---------------------------------------------------------------------
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+# Postgres epoch is 2000-01-01
+_PG_EPOCH_US = 946_684_800_000_000
+_PG_EPOCH_DATE = date(2000, 1, 1).toordinal()
+
+_FIXED_WIDTH = {
+    "double precision": ">f8",
+    "real": ">f4",
+    "bigint": ">i8",
+    "integer": ">i4",
+    "smallint": ">i2",
+}
+
+
+# A column's fields are built as one uint8 buffer (each field a ">i4"
+# length, -1 for NULL, followed by the payload) plus per-row field sizes;
+# _binary_chunk then scatters the column buffers into row order
+Fields = Tuple[np.ndarray, np.ndarray]
+
+
+def _pack_fields(lengths: np.ndarray, data: np.ndarray, offsets: np.ndarray) -> Fields:
+    """
+    Fields whose payload for row ``i`` is ``data[offsets[i]:][:lengths[i]]``
+    (``lengths[i] == -1`` for NULL, which has no payload).
+    """
+    payload = np.maximum(lengths, 0)
+    sizes = 4 + payload
+    starts = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+
+    out[(starts[:, None] + np.arange(4)).ravel()] = lengths.astype(">i4").view(np.uint8)
+
+    total = int(payload.sum())
+    if total:
+        within = np.arange(total) - np.repeat(np.cumsum(payload) - payload, payload)
+        out[np.repeat(starts + 4, payload) + within] = data[np.repeat(offsets, payload) + within]
+
+    return out, sizes
+
+
+def _fixed_fields(values: np.ndarray, mask: np.ndarray, dtype: str) -> Fields:
+    width = np.dtype(dtype).itemsize
+    raw = np.where(mask, 0, values).astype(dtype).view(np.uint8)
+    lengths = np.where(mask, -1, width)
+    return _pack_fields(lengths, raw, np.arange(len(values), dtype=np.int64) * width)
+
+
+def _text_fields(series: pd.Series, mask: np.ndarray, prefix: str = "") -> Fields:
+    import pyarrow as pa
+
+    text = series.astype("string")
+    if prefix:
+        text = prefix + text
+    strings = pa.array(text.to_numpy(dtype=object, na_value=None), type=pa.large_string())
+
+    _, offset_buffer, data_buffer = strings.buffers()
+    offsets = np.frombuffer(offset_buffer, dtype=np.int64, count=len(strings) + 1)
+    data = np.frombuffer(data_buffer, dtype=np.uint8) if data_buffer is not None else np.empty(0, np.uint8)
+    lengths = np.where(mask, -1, np.diff(offsets))
+    return _pack_fields(lengths, data, offsets[:-1])
+
+
+def _binary_fields(series: pd.Series, pg_type: str) -> Fields:
+    """Length-prefixed PGCOPY fields for one column."""
+    mask = series.isna().to_numpy()
+
+    if pg_type in _FIXED_WIDTH:
+        numeric = pd.to_numeric(series.where(~mask, 0), errors="raise")
+        if _FIXED_WIDTH[pg_type].startswith(">i"):
+            numeric = numeric.astype(np.int64)
+        return _fixed_fields(numeric.to_numpy(), mask, _FIXED_WIDTH[pg_type])
+
+    if pg_type == "boolean":
+        values = series.fillna(False).astype(bool).to_numpy()
+        return _fixed_fields(values, mask, "?")
+
+    if pg_type.startswith("timestamp"):
+        utc = pg_type == "timestamp with time zone"
+        stamps = pd.to_datetime(series, errors="raise", utc=utc)
+        if not utc and getattr(stamps.dt, "tz", None) is not None:
+            stamps = stamps.dt.tz_localize(None)
+        micros = stamps.to_numpy(dtype="datetime64[us]").astype(np.int64)
+        return _fixed_fields(micros - _PG_EPOCH_US, mask, ">i8")
+
+    if pg_type == "date":
+        days = pd.to_datetime(series, errors="raise").to_numpy(dtype="datetime64[D]")
+        values = days.astype(np.int64) - (_PG_EPOCH_DATE - date(1970, 1, 1).toordinal())
+        return _fixed_fields(values, mask, ">i4")
+
+    if pg_type in ("text", "jsonb", "json") or pg_type.startswith(("character", "varchar")):
+        # jsonb binary format is a version byte followed by the text
+        return _text_fields(series, mask, prefix="\x01" if pg_type == "jsonb" else "")
+
+    raise ValueError(
+        f"Column '{series.name}' has type '{pg_type}', which binary COPY does "
+        f"not encode; use copy_format='csv'"
+    )
+
+
+def _binary_chunk(df: pd.DataFrame, pg_types: Dict[str, str]) -> bytes:
+    columns = [_binary_fields(df[col], pg_types[col]) for col in df.columns]
+
+    row_sizes = 2 + sum((sizes for _, sizes in columns), np.zeros(len(df), dtype=np.int64))
+    row_starts = np.cumsum(row_sizes) - row_sizes
+    out = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+
+    count = np.full(len(df), len(columns), dtype=">i2").view(np.uint8)
+    out[(row_starts[:, None] + np.arange(2)).ravel()] = count
+
+    # Each column's fields land after the row's earlier fields
+    position = row_starts + 2
+    for data, sizes in columns:
+        field_starts = np.cumsum(sizes) - sizes
+        out[np.repeat(position - field_starts, sizes) + np.arange(len(data))] = data
+        position = position + sizes
+
+    return out.tobytes()
+
+
+def _table_types(cur, table_name: str) -> Dict[str, str]:
+    cur.execute(
+        "SELECT attname, format_type(atttypid, atttypmod) "
+        "FROM pg_attribute "
+        "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped",
+        (_quote_ident(table_name),),
+    )
+    return {name: pg_type for name, pg_type in cur.fetchall()}
+
+
+
+def table_columns(table_name: str, *, conn=None) -> List[str]:
+    """Column names of ``table_name``."""
+    conn = conn or get_postgres_connection()
+    with conn:
+        with conn.cursor() as cur:
+            return list(_table_types(cur, table_name))
+
+def encode_copy_chunks(
+    frames: Iterable[pd.DataFrame],
+    copy_format: str,
+    *,
+    pg_types: Optional[Dict[str, str]] = None,
+) -> Iterator[bytes]:
+    """
+    COPY payload for ``frames`` (same columns, in order), one chunk per
+    frame. ``pg_types`` (column → ``format_type``) is required for
+    binary, which must match the target column types exactly.
+    """
+    if copy_format == "binary":
+        yield PGCOPY_HEADER
+        for frame in frames:
+            yield _binary_chunk(frame, pg_types)
+        yield PGCOPY_TRAILER
+    else:
+        for frame in frames:
+            yield _csv_chunk(frame)
+
+
+# ---------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------
+def _copy_sql(table: str, columns: Sequence[str], copy_format: str) -> str:
+    column_list = ", ".join(_quote_ident(col) for col in columns)
+    options = "FORMAT binary" if copy_format == "binary" else f"FORMAT csv, NULL '{CSV_NULL}'"
+    return f"COPY {table} ({column_list}) FROM STDIN WITH ({options})"
+
+
+def _merge_sql(table_name: str, columns: Sequence[str], write_mode: str, staging: str) -> str:
+    column_list = ", ".join(_quote_ident(col) for col in columns)
+    key = _quote_ident(ROW_KEY_COLUMN)
+
+    if write_mode == "upsert":
+        updates = ", ".join(
+            f"{_quote_ident(col)} = EXCLUDED.{_quote_ident(col)}"
+            for col in columns
+            if col != ROW_KEY_COLUMN
+        )
+        conflict = f"DO UPDATE SET {updates}"
+    else:
+        conflict = "DO NOTHING"
+
+    return (
+        f"INSERT INTO {_quote_ident(table_name)} ({column_list}) "
+        f"SELECT DISTINCT ON ({key}) {column_list} FROM {staging} "
+        f"ON CONFLICT ({key}) {conflict}"
+    )
+
+
+def _copy_frames(
+    frames: Iterator[pd.DataFrame],
+    columns: List[str],
+    table_name: str,
+    *,
+    copy_format: str,
+    write_mode: str,
+    conn,
+) -> int:
+    """
+    COPY ``frames`` into ``table_name`` in one transaction. Returns the
+    number of rows written (for keyed modes: rows not already present).
+    """
+    # Unique per call, so a connection shared by the caller never sees
+    # two COPYs stage into the same table
+    staging = f"{STAGING_TABLE}_{uuid.uuid4().hex[:12]}"
+
+    with conn:
+        with conn.cursor() as cur:
+            target = _quote_ident(table_name)
+            if write_mode != "insert":
+                cur.execute(
+                    f"CREATE TEMP TABLE {staging} "
+                    f"(LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                target = staging
+
+            pg_types = _table_types(cur, table_name) if copy_format == "binary" else None
+            cur.copy_expert(
+                _copy_sql(target, columns, copy_format),
+                _ChunkReader(encode_copy_chunks(frames, copy_format, pg_types=pg_types)),
+            )
+            written = cur.rowcount
+
+            if write_mode != "insert":
+                cur.execute(_merge_sql(table_name, columns, write_mode, staging))
+                written = cur.rowcount
+
+    return written
+
+
+def _prepare(df: pd.DataFrame, table_name: str, write_mode: str) -> pd.DataFrame:
+    if write_mode != "insert" and ROW_KEY_COLUMN not in df.columns:
+        df = df.assign(**{ROW_KEY_COLUMN: frame_row_keys(df, table_name)})
+    return df
+
+
+def _check_options(copy_format: str, write_mode: str) -> None:
+    from storage.supabase_writer import WRITE_MODES
+
+    if copy_format not in COPY_FORMATS:
+        raise ValueError(f"copy_format must be one of {COPY_FORMATS}, got {copy_format!r}")
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"write_mode must be one of {WRITE_MODES}, got {write_mode!r}")
+
+
+def copy_dataframe(
+    df: pd.DataFrame,
+    table_name: str,
+    *,
+    copy_format: Optional[str] = None,
+    write_mode: str = "insert",
+    chunk_rows: int = DEFAULT_COPY_CHUNK_ROWS,
+    dry_run: bool = False,
+    conn=None,
+) -> int:
+    """
+    Bulk-load a DataFrame with a single ``COPY FROM STDIN``.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Rows to load; column names must match the target table.
+    table_name : str
+        Target table (optionally schema-qualified).
+    copy_format : {"csv", "binary"}, optional
+        Defaults to ``storage.copy_format`` from the config. Binary skips
+        text parsing on the server but needs the frame's values to be
+        convertible to the exact column types.
+    write_mode : {"insert", "upsert", "skip_existing"}
+        As for ``storage.supabase_writer.insert_rows``.
+    chunk_rows : int
+        Rows encoded per chunk streamed to the server.
+    dry_run : bool
+        Print what would be loaded and return 0.
+    conn : psycopg2 connection, optional
+        Defaults to :func:`get_postgres_connection`.
+
+    Returns
+    -------
+    int
+        Rows written.
+    """
+    copy_format = copy_format or get_settings().storage.copy_format
+    _check_options(copy_format, write_mode)
+
+    if df.empty:
+        return 0
+
+    if dry_run:
+        print(f"[DRY RUN] Would COPY {len(df)} rows into '{table_name}' ({copy_format})")
+        return 0
+
+    df = _prepare(df, table_name, write_mode)
+    frames = (df.iloc[start:start + chunk_rows] for start in range(0, len(df), chunk_rows))
+
+    written = _copy_frames(
+        frames,
+        [str(col) for col in df.columns],
+        table_name,
+        copy_format=copy_format,
+        write_mode=write_mode,
+        conn=conn or get_postgres_connection(),
+    )
+
+    print(f"✅ Copied {written} rows into '{table_name}' ({copy_format})")
+    return written
+
+
+def copy_stream(
+    table_name: str,
+    source: Iterable,
+    *,
+    copy_format: Optional[str] = None,
+    write_mode: str = "insert",
+    chunk_rows: int = DEFAULT_COPY_CHUNK_ROWS,
+    dry_run: bool = False,
+    conn=None,
+    on_progress: Optional[Callable] = None,
+):
+    """
+    :func:`copy_dataframe` for a stream of DataFrame chunks and / or dict
+    rows (as ``storage.supabase_writer.insert_stream``), loaded in a
+    single COPY as the chunks arrive. The column set is taken from the
+    first chunk.
+
+    Returns
+    -------
+    StreamInsertStats
+    """
+    from storage.supabase_writer import StreamInsertStats
+
+    copy_format = copy_format or get_settings().storage.copy_format
+    _check_options(copy_format, write_mode)
+
+    stats = StreamInsertStats()
+    columns: List[str] = []
+
+    def frames() -> Iterator[pd.DataFrame]:
+        rows: List[dict] = []
+        for item in source:
+            if isinstance(item, pd.DataFrame):
+                if rows:
+                    yield pd.DataFrame(rows)
+                    rows = []
+                if not item.empty:
+                    yield item
+            else:
+                rows.append(item)
+                if len(rows) >= chunk_rows:
+                    yield pd.DataFrame(rows)
+                    rows = []
+        if rows:
+            yield pd.DataFrame(rows)
+
+    def prepared() -> Iterator[pd.DataFrame]:
+        for frame in frames():
+            frame = _prepare(frame, table_name, write_mode)
+            if columns:
+                frame = frame.reindex(columns=columns)
+            else:
+                columns.extend(str(col) for col in frame.columns)
+            stats.rows_read += len(frame)
+            stats.batches_written += 1
+            if on_progress is not None:
+                on_progress(stats)
+            yield frame
+
+    chunks = prepared()
+    first = next(chunks, None)
+
+    if first is None:
+        return stats
+
+    def chained() -> Iterator[pd.DataFrame]:
+        yield first
+        yield from chunks
+
+    if dry_run:
+        for _ in chunks:
+            pass
+        print(f"[DRY RUN] Would COPY {stats.rows_read} rows into '{table_name}' ({copy_format})")
+        return stats
+
+    stats.rows_written = _copy_frames(
+        chained(),
+        columns,
+        table_name,
+        copy_format=copy_format,
+        write_mode=write_mode,
+        conn=conn or get_postgres_connection(),
+    )
+    stats.rows_skipped = stats.rows_read - stats.rows_written
+
+    print(f"✅ Copied {stats.rows_written} rows into '{table_name}' ({copy_format})")
+    return stats
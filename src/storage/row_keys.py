@@ -0,0 +1,108 @@
+"""
+Deterministic row keys for idempotent writes.
+
+A row key is a 128-bit content hash of a row's natural key plus payload,
+computed column-wise with ``pd.util.hash_pandas_object`` (a fixed-key
+SipHash, stable across processes and runs). Re-extracting an unchanged
+file yields the same keys, so the writer can upsert on / skip existing
+``row_key`` values instead of appending duplicates.
+
+Columns that change on every run without changing the fact (e.g. the
+CPID ``snapshot_time``) are excluded from the hash via
+``VOLATILE_COLUMNS``.
+
+Target tables need a unique ``row_key`` column before keyed writes
+(upsert / skip_existing, the runners' default) can run against them;
+``scripts/dev/migrate_row_keys.py`` prints or applies the DDL from
+:func:`row_key_migration_sql` for every ingestion table.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from storage.serialization import _json_safe_values
+
+
+ROW_KEY_COLUMN = "row_key"
+
+# Per-table columns left out of the hash (set per run, not per fact)
+VOLATILE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "cpid_metric_snapshots": ("snapshot_time",),
+}
+
+# Two independent 64-bit hashes → 128-bit keys (collisions negligible
+# at any realistic table size)
+_HASH_KEYS = ("ctp-row-key-0001", "ctp-row-key-0002")
+
+
+def compute_row_keys(df: pd.DataFrame, *, exclude: Iterable[str] = ()) -> np.ndarray:
+    """
+    Row keys for every row of ``df``, as 32-char hex strings.
+
+    Columns are hashed in name order and as object dtype, so a row's key
+    depends only on its own values, not on column order or on the other
+    rows in the frame (which could otherwise change a column's dtype).
+    ``exclude`` and any existing ``row_key`` column are ignored.
+    """
+    skip = set(exclude) | {ROW_KEY_COLUMN}
+    columns = sorted(str(col) for col in df.columns if str(col) not in skip)
+
+    if len(df) == 0:
+        return np.array([], dtype=object)
+
+    frame = df.set_axis([str(col) for col in df.columns], axis=1)[columns].astype(object)
+    high, low = (
+        pd.util.hash_pandas_object(frame, index=False, hash_key=key).to_numpy()
+        for key in _HASH_KEYS
+    )
+    return np.array(
+        [f"{h:016x}{l:016x}" for h, l in zip(high.tolist(), low.tolist())],
+        dtype=object,
+    )
+
+
+def with_row_keys(records: List[dict], table_name: str) -> List[dict]:
+    """
+    ``records`` with a ``row_key`` added to each row that lacks one.
+    Keys are computed in bulk over the whole batch.
+    """
+    if not records or all(ROW_KEY_COLUMN in record for record in records):
+        return records
+
+    keys = compute_row_keys(
+        pd.DataFrame(records, dtype=object),
+        exclude=VOLATILE_COLUMNS.get(table_name, ()),
+    )
+    return [
+        record if ROW_KEY_COLUMN in record else {**record, ROW_KEY_COLUMN: key}
+        for record, key in zip(records, keys)
+    ]
+
+
+def frame_row_keys(df: pd.DataFrame, table_name: str) -> np.ndarray:
+    """
+    Row keys for a DataFrame, identical to what :func:`with_row_keys`
+    gives for the same rows sent as records (values are boxed the same
+    way first).
+    """
+    boxed = pd.DataFrame(
+        {col: _json_safe_values(df[col]) for col in df.columns},
+        index=df.index,
+        dtype=object,
+    )
+    return compute_row_keys(boxed, exclude=VOLATILE_COLUMNS.get(table_name, ()))
+
+
+def row_key_migration_sql(table_name: str) -> List[str]:
+    """
+    Idempotent DDL adding the ``row_key`` column and its unique index to
+    ``table_name`` (optionally schema-qualified). Existing rows keep a
+    null key, which the unique index allows.
+    """
+    quoted = ".".join('"' + part.replace('"', '""') + '"' for part in table_name.split("."))
+    index = '"' + f"{table_name.split('.')[-1]}_{ROW_KEY_COLUMN}_idx".replace('"', '""') + '"'
+    return [
+        f'ALTER TABLE {quoted} ADD COLUMN IF NOT EXISTS "{ROW_KEY_COLUMN}" text;',
+        f'CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {quoted} ("{ROW_KEY_COLUMN}");',
+    ]
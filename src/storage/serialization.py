@@ -0,0 +1,98 @@
+"""
+Columnar DataFrame → JSON-ready record serialization.
+
+Null masks are computed once per column and values are boxed to Python
+natives per column, so a batch of records is built straight from a
+DataFrame slice; the full frame is never turned into a list of dicts.
+"""
+from collections.abc import Sequence
+from typing import Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+
+def _json_safe_values(values: pd.Series) -> np.ndarray:
+    """
+    Object array of Python natives with every null (NaN / NaT / pd.NA /
+    None) replaced by None.
+    """
+    out = values.to_numpy(dtype=object, copy=True)
+    mask = values.isna().to_numpy()
+
+    if mask.any():
+        out[mask] = None
+
+    return out
+
+
+def frame_to_records(df: pd.DataFrame) -> List[dict]:
+    """
+    Equivalent of ``df.to_dict(orient="records")`` followed by NaN → None
+    cleaning, built column by column.
+    """
+    names = list(df.columns)
+    columns = [_json_safe_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+class FrameRecords(Sequence):
+    """
+    Read-only list-of-dicts view over a DataFrame.
+
+    Slicing returns another lazy view; records are only materialized by
+    :meth:`to_records` (or iteration), one slice at a time.
+    """
+
+    def __init__(self, df: pd.DataFrame, rows: range = None):
+        self.df = df
+        self._rows = rows if rows is not None else range(len(df))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            return FrameRecords(self.df, self._rows[key])
+        return frame_to_records(self.df.iloc[[self._rows[key]]])[0]
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.to_records())
+
+    def to_records(self) -> List[dict]:
+        rows = self._rows
+        if len(rows) == 0:
+            return []
+        if rows.step == 1:
+            chunk = self.df.iloc[rows.start:rows.stop]
+        else:
+            chunk = self.df.iloc[list(rows)]
+        return frame_to_records(chunk)
+
+
+class ChainedRecords:
+    """
+    A batch assembled from several segments (lists of dicts and / or
+    FrameRecords views), e.g. when a streamed batch spans two DataFrame
+    chunks. Materialized in one go when sent.
+    """
+
+    def __init__(self, segments: List[Union[List[dict], FrameRecords]]):
+        self.segments = segments
+        self._len = sum(len(segment) for segment in segments)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def to_records(self) -> List[dict]:
+        records: List[dict] = []
+        for segment in self.segments:
+            records.extend(materialize(segment))
+        return records
+
+
+def materialize(rows) -> List[dict]:
+    """List of dicts for a batch: a list, a FrameRecords view or ChainedRecords."""
+    if isinstance(rows, (FrameRecords, ChainedRecords)):
+        return rows.to_records()
+    return rows
@@ -0,0 +1,234 @@
+"""
+Streaming Parquet output for CPID metric snapshots.
+
+Snapshots are appended one study (or one extraction result) at a time as
+Parquet row groups under a fixed Arrow schema, so writing the combined
+analysis file never holds more than one study in memory. Repetitive
+string columns (metric names, sites, sources, ...) are dictionary
+encoded both in Arrow and in the Parquet pages.
+
+With a ``storage.dimensions.DimensionRegistry`` the identifier columns
+(``SNAPSHOT_DIMENSIONS``) are written as their int32 registry IDs
+instead, stable across files and runs; the file's schema metadata names
+those columns, and :func:`read_snapshot_file` decodes them with the
+registry.
+"""
+import json
+import os
+from pathlib import Path
+from typing import List, Optional, Set, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from storage.dimensions import NULL_ID, SNAPSHOT_DIMENSIONS, DimensionRegistry
+
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+CPID_SNAPSHOT_SCHEMA = pa.schema(
+    [
+        ("entity_type", DICTIONARY_STRING),
+        ("entity_id", DICTIONARY_STRING),
+        ("site_id", DICTIONARY_STRING),
+        ("metric_name", DICTIONARY_STRING),
+        ("metric_value", pa.float64()),
+        ("snapshot_time", DICTIONARY_STRING),
+        ("source", DICTIONARY_STRING),
+        ("study_folder", DICTIONARY_STRING),
+    ]
+)
+
+DEFAULT_COMPRESSION = "snappy"
+
+# Schema metadata key listing the columns stored as registry IDs
+DIMENSIONS_METADATA_KEY = b"ctp.dimensions"
+
+
+def encoded_columns(schema: pa.Schema) -> List[str]:
+    """Columns of ``schema`` stored as dimension registry IDs."""
+    raw = (schema.metadata or {}).get(DIMENSIONS_METADATA_KEY)
+    return json.loads(raw) if raw else []
+
+
+def encoded_schema(schema: pa.Schema, columns=SNAPSHOT_DIMENSIONS) -> pa.Schema:
+    """``schema`` with each of ``columns`` (that is present) as int32 registry IDs."""
+    encoded = [c for c in columns if c in schema.names]
+    fields = [pa.field(f.name, pa.int32()) if f.name in encoded else f for f in schema]
+    metadata = {**(schema.metadata or {}), DIMENSIONS_METADATA_KEY: json.dumps(encoded)}
+    return pa.schema(fields, metadata=metadata)
+
+
+def snapshot_table(
+    data: Union[pd.DataFrame, pa.Table],
+    schema: pa.Schema = CPID_SNAPSHOT_SCHEMA,
+    dimensions: Optional[DimensionRegistry] = None,
+) -> pa.Table:
+    """
+    Conform a snapshot frame (or Arrow table) to ``schema``.
+
+    String columns are stringified (ints from Excel become "101", nulls
+    stay null) and dictionary encoded; numeric columns are coerced with
+    NaN for anything unparseable; missing columns are all-null and
+    extra columns are dropped. With ``dimensions`` the
+    ``SNAPSHOT_DIMENSIONS`` columns become their int32 registry IDs
+    (see :func:`encoded_schema`; nulls stay null).
+    """
+    if isinstance(data, pa.Table):
+        data = data.to_pandas()
+
+    if dimensions is not None and not encoded_columns(schema):
+        schema = encoded_schema(schema)
+    encoded = encoded_columns(schema)
+    if encoded and dimensions is None:
+        raise ValueError(f"Columns {encoded} are stored as registry IDs; pass the DimensionRegistry")
+
+    arrays = []
+    for field in schema:
+        if field.name in data.columns:
+            values = data[field.name]
+        else:
+            values = pd.Series(None, index=data.index, dtype=object)
+
+        if field.name in encoded:
+            ids = dimensions.dimension(field.name).encode(values)
+            arrays.append(pa.array(ids, type=field.type, mask=ids == NULL_ID))
+        elif pa.types.is_dictionary(field.type):
+            array = pa.array(values.astype("string"), type=pa.string()).dictionary_encode()
+            arrays.append(array.cast(field.type))
+        else:
+            numeric = pd.to_numeric(values, errors="coerce")
+            arrays.append(pa.array(numeric, type=field.type, from_pandas=True))
+
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class SnapshotParquetWriter:
+    """
+    Append-only Parquet writer with a fixed schema and on-the-fly
+    metric registry.
+
+    The file is written to ``<path>.tmp`` and moved into place on
+    :meth:`close`, so readers never see a half-written snapshot; an
+    exception inside the ``with`` block discards it.
+
+    Parameters
+    ----------
+    path : path
+        Output Parquet file.
+    schema : pa.Schema
+        Every appended frame is conformed to this schema.
+    compression : str
+        Parquet codec.
+    dimensions : DimensionRegistry, optional
+        Write identifiers as this registry's int32 IDs; open it with
+        ``DimensionRegistry.transaction()`` around the writer so the new
+        IDs are saved once the run succeeds.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        schema: pa.Schema = CPID_SNAPSHOT_SCHEMA,
+        compression: str = DEFAULT_COMPRESSION,
+        dimensions: Optional[DimensionRegistry] = None,
+    ):
+        self.path = Path(path)
+        self.schema = encoded_schema(schema) if dimensions is not None else schema
+        self.dimensions = dimensions
+        self._tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        self._writer: Optional[pq.ParquetWriter] = pq.ParquetWriter(
+            self._tmp_path,
+            self.schema,
+            compression=compression,
+            use_dictionary=True,
+        )
+
+        self.rows_written = 0
+        self.row_groups = 0
+        self.metric_names: Set[str] = set()
+
+    def write(self, data: Union[pd.DataFrame, pa.Table]) -> int:
+        """Append one row group; returns the rows written."""
+        if self._writer is None:
+            raise RuntimeError(f"{self.path} is already closed")
+
+        table = snapshot_table(data, self.schema, self.dimensions)
+        if table.num_rows == 0:
+            return 0
+
+        self._writer.write_table(table)
+        self.rows_written += table.num_rows
+        self.row_groups += 1
+
+        if "metric_name" in encoded_columns(self.schema):
+            ids = pc.unique(table.column("metric_name")).drop_null().to_numpy()
+            values = self.dimensions.dimension("metric_name").values
+            self.metric_names.update(values[id_] for id_ in ids)
+        elif "metric_name" in self.schema.names:
+            # Only the dictionary of this batch, not the full column
+            metric_names = table.column("metric_name").unify_dictionaries()
+            for chunk in metric_names.chunks:
+                self.metric_names.update(n for n in chunk.dictionary.to_pylist() if n is not None)
+
+        return table.num_rows
+
+    def metric_registry(self) -> pd.DataFrame:
+        """Sorted unique metric names seen so far (the registry CSV)."""
+        return pd.DataFrame({"metric_name": sorted(self.metric_names)})
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "SnapshotParquetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def read_snapshot_file(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    *,
+    dimensions: Optional[DimensionRegistry] = None,
+    decode: bool = True,
+) -> pd.DataFrame:
+    """
+    Read a snapshot file back with plain ``string`` columns.
+
+    Columns written as registry IDs are decoded with ``dimensions`` (the
+    registry they were written with); ``decode=False`` keeps them as
+    int32 IDs.
+    """
+    df = pq.read_table(path, columns=columns).to_pandas()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("string")
+
+    encoded = [c for c in encoded_columns(pq.read_schema(path)) if c in df.columns]
+    # Null IDs come back as NaN (float); restore NULL_ID
+    for column in encoded:
+        df[column] = df[column].fillna(NULL_ID).astype(np.int32)
+    if not encoded or not decode:
+        return df
+    if dimensions is None:
+        raise ValueError(f"{path} stores {encoded} as registry IDs; pass the DimensionRegistry to decode them")
+    return dimensions.decode_frame(df, encoded)
@@ -0,0 +1,276 @@
+"""
+Metric snapshot history as a base plus per-run deltas.
+
+A CPID run re-emits every metric with a fresh ``snapshot_time`` even
+though most values are unchanged. :meth:`SnapshotHistory.record`
+compares a run against the current state of its study and writes only
+what changed (new/changed values as ``set``, vanished metrics as
+``delete``), so history grows with change volume rather than run count.
+
+Layout under ``root``::
+
+    study=<study>/base-<time>.parquet    full state at <time> (checkpoint)
+    study=<study>/delta-<time>.parquet   changes recorded at <time>
+
+:meth:`SnapshotHistory.as_of` rebuilds the state at any time T from the
+newest checkpoint at or before T plus the deltas after it; checkpoints
+are written every ``checkpoint_every`` deltas so that replay stays
+short.
+"""
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.constants import SNAPSHOT_HISTORY_DIR
+
+
+# A metric's identity across runs
+KEY_COLUMNS = ["entity_type", "entity_id", "site_id", "metric_name", "source"]
+
+OP_SET = "set"
+OP_DELETE = "delete"
+
+HISTORY_SCHEMA = pa.schema(
+    [
+        *[(column, pa.string()) for column in KEY_COLUMNS],
+        ("metric_value", pa.float64()),
+        # When the value took effect (the run that set / deleted it)
+        ("snapshot_time", pa.timestamp("us", tz="UTC")),
+        ("op", pa.string()),
+    ]
+)
+
+DEFAULT_CHECKPOINT_EVERY = 20
+
+_TIME_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+@dataclass
+class RecordStats:
+    rows: int = 0
+    added: int = 0
+    changed: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    delta_path: Optional[Path] = None
+    checkpoint_path: Optional[Path] = None
+
+
+def _utc(value: Union[str, datetime, pd.Timestamp]) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _file_time(path: Path) -> pd.Timestamp:
+    # base-20260101T080000000000Z-<id>.parquet
+    stamp = path.stem.split("-")[1]
+    return pd.Timestamp(datetime.strptime(stamp, _TIME_FORMAT)).tz_localize("UTC")
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Key columns as ``string`` and values as float, one row per key."""
+    out = pd.DataFrame(
+        {column: df[column].astype("string") if column in df.columns else pd.NA for column in KEY_COLUMNS}
+    )
+    for column in KEY_COLUMNS:
+        out[column] = out[column].astype("string")
+    out["metric_value"] = pd.to_numeric(df["metric_value"], errors="coerce").astype("float64")
+    return out.drop_duplicates(KEY_COLUMNS, keep="last").reset_index(drop=True)
+
+
+class SnapshotHistory:
+    """
+    Per-study base + delta snapshot history.
+
+    Parameters
+    ----------
+    root : path
+        History directory (default ``core.constants.SNAPSHOT_HISTORY_DIR``).
+    checkpoint_every : int
+        Fold the deltas into a new base after this many deltas since the
+        last one (``None`` disables automatic checkpoints).
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path] = SNAPSHOT_HISTORY_DIR,
+        *,
+        checkpoint_every: Optional[int] = DEFAULT_CHECKPOINT_EVERY,
+    ):
+        self.root = Path(root)
+        self.checkpoint_every = checkpoint_every
+
+    # -----------------------------------------------------------------
+    # Files
+    # -----------------------------------------------------------------
+    def study_dir(self, study: str) -> Path:
+        return self.root / f"study={quote(str(study), safe='')}"
+
+    def _files(self, study: str, kind: str) -> List[Tuple[pd.Timestamp, Path]]:
+        directory = self.study_dir(study)
+        if not directory.exists():
+            return []
+        return sorted((_file_time(p), p) for p in directory.glob(f"{kind}-*.parquet"))
+
+    def _write(self, study: str, kind: str, at: pd.Timestamp, frame: pd.DataFrame) -> Path:
+        directory = self.study_dir(study)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        path = directory / f"{kind}-{at.strftime(_TIME_FORMAT)}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp = directory / f".{path.name}.tmp"
+        table = pa.Table.from_pandas(frame[HISTORY_SCHEMA.names], schema=HISTORY_SCHEMA, preserve_index=False)
+        pq.write_table(table, tmp, use_dictionary=True)
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _read(path: Path) -> pd.DataFrame:
+        df = pq.read_table(path, schema=HISTORY_SCHEMA).to_pandas()
+        for column in KEY_COLUMNS + ["op"]:
+            df[column] = df[column].astype("string")
+        return df
+
+    # -----------------------------------------------------------------
+    # Reads
+    # -----------------------------------------------------------------
+    def _state(self, study: str, at: Optional[pd.Timestamp]) -> Tuple[pd.DataFrame, int]:
+        """Live rows at ``at`` (latest if None) and the deltas replayed."""
+        bases = [(t, p) for t, p in self._files(study, "base") if at is None or t <= at]
+        base_time, base_path = bases[-1] if bases else (None, None)
+
+        deltas = [
+            p
+            for t, p in self._files(study, "delta")
+            if (base_time is None or t > base_time) and (at is None or t <= at)
+        ]
+
+        frames = [self._read(base_path)] if base_path is not None else []
+        frames.extend(self._read(p) for p in deltas)
+        if not frames:
+            return HISTORY_SCHEMA.empty_table().to_pandas(), 0
+
+        history = pd.concat(frames, ignore_index=True)
+        # Files are in time order, so the last row per key is its state
+        state = history.drop_duplicates(KEY_COLUMNS, keep="last")
+        state = state[state["op"] == OP_SET].reset_index(drop=True)
+        return state, len(deltas)
+
+    def as_of(self, study: str, at: Optional[Union[str, datetime]] = None) -> pd.DataFrame:
+        """
+        The study's metric snapshot as it stood at time ``at`` (default:
+        now), in the extractor's snapshot columns. ``snapshot_time`` is
+        when each value was last set.
+        """
+        state, _ = self._state(study, None if at is None else _utc(at))
+        return state.drop(columns="op")
+
+    def runs(self, study: str) -> List[pd.Timestamp]:
+        """Times of the recorded deltas (runs that changed something)."""
+        return [t for t, _ in self._files(study, "delta")]
+
+    # -----------------------------------------------------------------
+    # Writes
+    # -----------------------------------------------------------------
+    def record(
+        self,
+        df: pd.DataFrame,
+        *,
+        study: str,
+        snapshot_time: Optional[Union[str, datetime]] = None,
+    ) -> RecordStats:
+        """
+        Record one full run of ``study``'s snapshots as a delta against
+        the current state.
+
+        ``snapshot_time`` defaults to the run's own (first)
+        ``snapshot_time`` value; metrics present before but absent from
+        ``df`` are recorded as deleted.
+        """
+        if snapshot_time is None:
+            snapshot_time = df["snapshot_time"].iloc[0] if len(df) else datetime.now()
+        at = _utc(snapshot_time)
+
+        current, replayed = self._state(study, None)
+        run = _normalize(df)
+        stats = RecordStats(rows=len(run))
+
+        merged = run.merge(
+            current[KEY_COLUMNS + ["metric_value"]],
+            on=KEY_COLUMNS,
+            how="outer",
+            suffixes=("", "_prev"),
+            indicator=True,
+        )
+        new = merged["_merge"] == "left_only"
+        gone = merged["_merge"] == "right_only"
+        both = merged["_merge"] == "both"
+
+        value, prev = merged["metric_value"].to_numpy(), merged["metric_value_prev"].to_numpy()
+        same = (value == prev) | (np.isnan(value) & np.isnan(prev))
+        changed = both.to_numpy() & ~same
+
+        stats.added, stats.deleted = int(new.sum()), int(gone.sum())
+        stats.changed, stats.unchanged = int(changed.sum()), int((both.to_numpy() & same).sum())
+
+        delta = merged.loc[new.to_numpy() | gone.to_numpy() | changed].copy()
+        if delta.empty:
+            return stats
+
+        delta["op"] = np.where(delta["_merge"] == "right_only", OP_DELETE, OP_SET)
+        delta.loc[delta["op"] == OP_DELETE, "metric_value"] = delta["metric_value_prev"]
+        delta["snapshot_time"] = at
+        stats.delta_path = self._write(study, "delta", at, delta)
+
+        if self.checkpoint_every is not None and replayed + 1 >= self.checkpoint_every:
+            stats.checkpoint_path = self.checkpoint(study)
+        return stats
+
+    def checkpoint(self, study: str) -> Optional[Path]:
+        """Fold every delta so far into a new base at the latest delta's time."""
+        deltas = self._files(study, "delta")
+        if not deltas:
+            return None
+
+        bases = self._files(study, "base")
+        if bases and bases[-1][0] >= deltas[-1][0]:
+            return bases[-1][1]
+
+        state, _ = self._state(study, None)
+        return self._write(study, "base", deltas[-1][0], state)
+
+    def compact(self, study: str, *, keep_before: Optional[Union[str, datetime]] = None) -> int:
+        """
+        Checkpoint ``study`` and drop history older than ``keep_before``
+        (default: keep everything). Returns the number of files removed.
+
+        As-of reads stay exact for any time at or after the oldest base
+        that is kept.
+        """
+        self.checkpoint(study)
+        if keep_before is None:
+            return 0
+
+        cutoff = _utc(keep_before)
+        bases = self._files(study, "base")
+        # Newest base at or before the cutoff still answers reads at the cutoff
+        anchors = [t for t, _ in bases if t <= cutoff]
+        if not anchors:
+            return 0
+        anchor = anchors[-1]
+
+        removed = 0
+        for kind in ("base", "delta"):
+            for t, path in self._files(study, kind):
+                if t < anchor or (kind == "delta" and t == anchor):
+                    path.unlink()
+                    removed += 1
+        return removed
@@ -0,0 +1,319 @@
+"""
+Hive-partitioned local columnar store for metric snapshots.
+
+Layout under ``root``::
+
+    study=<study>/snapshot_date=<YYYY-MM-DD>/source_table=<table>/part-*.parquet
+
+Each append writes one new file per partition, sorted by site and
+metric so Parquet row-group statistics are tight. Reads take filters on
+study / snapshot date / source table (resolved against directory names,
+so non-matching partitions are never opened) and on site, metric name
+and snapshot time (pushed down to row-group statistics, so only
+matching row groups are decoded). :meth:`SnapshotStore.compact` merges
+the small files repeated appends leave behind.
+"""
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Union
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from core.constants import SNAPSHOT_STORE_DIR
+
+
+PARTITION_SCHEMA = pa.schema(
+    [
+        ("study", pa.string()),
+        ("snapshot_date", pa.string()),
+        ("source_table", pa.string()),
+    ]
+)
+
+# Row columns (partition columns live in the directory names)
+STORE_SCHEMA = pa.schema(
+    [
+        ("entity_type", pa.string()),
+        ("entity_id", pa.string()),
+        ("site_id", pa.string()),
+        ("metric_name", pa.string()),
+        ("metric_value", pa.float64()),
+        ("snapshot_time", pa.timestamp("us", tz="UTC")),
+        ("source", pa.string()),
+    ]
+)
+
+# Within-file order: site / metric filters prune whole row groups
+SORT_KEYS = [("site_id", "ascending"), ("metric_name", "ascending"), ("entity_id", "ascending")]
+
+DEFAULT_ROW_GROUP_ROWS = 16_384
+# Partitions with two or more files under this size get compacted
+DEFAULT_SMALL_FILE_BYTES = 8 * 1024 * 1024
+
+DEFAULT_SOURCE_TABLE = "cpid_metric_snapshots"
+
+
+@dataclass
+class ScanStats:
+    """What a read touched; partitions/row groups not listed were pruned."""
+    files: int = 0
+    row_groups_total: int = 0
+    row_groups_read: int = 0
+    bytes_read: int = 0
+    rows: int = 0
+
+
+@dataclass
+class CompactionStats:
+    partitions: int = 0
+    files_before: int = 0
+    files_after: int = 0
+
+
+def _to_utc_timestamp(value: Union[str, datetime, pd.Timestamp]) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _partition_values(values: Optional[Union[str, Iterable[str]]]) -> Optional[List[str]]:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return [values]
+    return [str(v) for v in values]
+
+
+def _conform(df: pd.DataFrame) -> pa.Table:
+    arrays = []
+    for field in STORE_SCHEMA:
+        values = df[field.name] if field.name in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if field.name == "snapshot_time":
+            values = pd.to_datetime(values, utc=True, format="ISO8601")
+        elif field.name == "metric_value":
+            values = pd.to_numeric(values, errors="coerce")
+        else:
+            values = values.astype("string")
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=STORE_SCHEMA)
+
+
+class SnapshotStore:
+    """
+    Partitioned Parquet store of snapshot rows.
+
+    Parameters
+    ----------
+    root : path
+        Store directory (default ``core.constants.SNAPSHOT_STORE_DIR``).
+    row_group_rows : int
+        Row-group size; smaller groups prune more finely at some
+        metadata cost.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path] = SNAPSHOT_STORE_DIR,
+        *,
+        row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+    ):
+        self.root = Path(root)
+        self.row_group_rows = row_group_rows
+
+    # -----------------------------------------------------------------
+    # Writes
+    # -----------------------------------------------------------------
+    def partition_dir(self, study: str, snapshot_date: Union[str, date], source_table: str) -> Path:
+        return (
+            self.root
+            / f"study={quote(str(study), safe='')}"
+            / f"snapshot_date={snapshot_date}"
+            / f"source_table={quote(source_table, safe='')}"
+        )
+
+    def _write_file(self, directory: Path, table: pa.Table, prefix: str = "part") -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{prefix}-{uuid.uuid4().hex}.parquet"
+        # Dot prefix: dataset discovery ignores it until the rename
+        tmp = directory / f".{path.name}.tmp"
+        pq.write_table(
+            table.sort_by(SORT_KEYS),
+            tmp,
+            row_group_size=self.row_group_rows,
+            use_dictionary=True,
+            write_statistics=True,
+        )
+        os.replace(tmp, path)
+        return path
+
+    def append(
+        self,
+        df: Union[pd.DataFrame, pa.Table],
+        *,
+        study: str,
+        source_table: str = DEFAULT_SOURCE_TABLE,
+    ) -> List[Path]:
+        """
+        Add one study's snapshot rows; returns the files written (one
+        per snapshot date present in ``df``).
+        """
+        if isinstance(df, pa.Table):
+            df = df.to_pandas()
+        if df.empty:
+            return []
+
+        table = _conform(df)
+        dates = pc.strftime(table.column("snapshot_time"), format="%Y-%m-%d")
+
+        written = []
+        for snapshot_date in pc.unique(dates).to_pylist():
+            part = table.filter(pc.equal(dates, snapshot_date))
+            written.append(self._write_file(self.partition_dir(study, snapshot_date, source_table), part))
+        return written
+
+    def compact(self, *, small_file_bytes: int = DEFAULT_SMALL_FILE_BYTES) -> CompactionStats:
+        """
+        Merge each partition's small files into one sorted file.
+
+        The merged file is in place before the originals are deleted,
+        so a crash mid-compaction leaves duplicates, never gaps; readers
+        running concurrently may briefly see both.
+        """
+        stats = CompactionStats()
+        if not self.root.exists():
+            return stats
+
+        for directory in sorted({p.parent for p in self.root.glob("*/*/*/*.parquet")}):
+            small = sorted(p for p in directory.glob("*.parquet") if p.stat().st_size < small_file_bytes)
+            if len(small) < 2:
+                continue
+
+            merged = pa.concat_tables(pq.read_table(p, schema=STORE_SCHEMA) for p in small)
+            self._write_file(directory, merged, prefix="compacted")
+            for path in small:
+                path.unlink()
+
+            stats.partitions += 1
+            stats.files_before += len(small)
+            stats.files_after += 1
+
+        return stats
+
+    # -----------------------------------------------------------------
+    # Reads
+    # -----------------------------------------------------------------
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(
+            self.root,
+            format="parquet",
+            schema=pa.unify_schemas([STORE_SCHEMA, PARTITION_SCHEMA]),
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+            exclude_invalid_files=False,
+        )
+
+    @staticmethod
+    def build_filter(
+        *,
+        studies: Optional[Union[str, Iterable[str]]] = None,
+        sites: Optional[Union[str, Iterable[str]]] = None,
+        metrics: Optional[Union[str, Iterable[str]]] = None,
+        source_tables: Optional[Union[str, Iterable[str]]] = None,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+    ) -> Optional[ds.Expression]:
+        """
+        Filter expression for :meth:`read`; ``start`` is inclusive and
+        ``end`` exclusive, both also bound ``snapshot_date`` so whole
+        date partitions are skipped.
+        """
+        terms = []
+        for column, values in (
+            ("study", studies),
+            ("site_id", sites),
+            ("metric_name", metrics),
+            ("source_table", source_tables),
+        ):
+            values = _partition_values(values)
+            if values is not None:
+                terms.append(ds.field(column).isin(values))
+
+        if start is not None:
+            start = _to_utc_timestamp(start)
+            terms.append(ds.field("snapshot_date") >= start.strftime("%Y-%m-%d"))
+            terms.append(ds.field("snapshot_time") >= pa.scalar(start, type=STORE_SCHEMA.field("snapshot_time").type))
+        if end is not None:
+            end = _to_utc_timestamp(end)
+            terms.append(ds.field("snapshot_date") <= end.strftime("%Y-%m-%d"))
+            terms.append(ds.field("snapshot_time") < pa.scalar(end, type=STORE_SCHEMA.field("snapshot_time").type))
+
+        expression = None
+        for term in terms:
+            expression = term if expression is None else expression & term
+        return expression
+
+    def scan(
+        self,
+        *,
+        columns: Optional[Sequence[str]] = None,
+        stats: Optional[ScanStats] = None,
+        **filters,
+    ) -> Iterator[pa.Table]:
+        """
+        Yield one Arrow table per surviving row group.
+
+        ``filters`` are the :meth:`build_filter` keywords; ``stats`` (if
+        given) is filled in with what was actually read.
+        """
+        if not self.root.exists():
+            return
+
+        expression = self.build_filter(**filters)
+        dataset = self.dataset()
+        columns = list(columns) if columns is not None else None
+
+        for fragment in dataset.get_fragments(filter=expression):
+            row_groups = fragment.split_by_row_group(expression, schema=dataset.schema)
+            if stats is not None:
+                stats.files += 1
+                stats.row_groups_total += fragment.metadata.num_row_groups
+
+            for row_group in row_groups:
+                table = row_group.to_table(schema=dataset.schema, columns=columns, filter=expression)
+                if stats is not None:
+                    stats.row_groups_read += 1
+                    stats.bytes_read += sum(
+                        fragment.metadata.row_group(info.id).total_byte_size for info in row_group.row_groups
+                    )
+                    stats.rows += table.num_rows
+                if table.num_rows:
+                    yield table
+
+    def read(
+        self,
+        *,
+        columns: Optional[Sequence[str]] = None,
+        stats: Optional[ScanStats] = None,
+        **filters,
+    ) -> pd.DataFrame:
+        """
+        Matching snapshot rows as a DataFrame (see :meth:`build_filter`
+        for the filter keywords).
+
+        Examples
+        --------
+        >>> store.read(studies="Study 1", metrics=["cpmd__missing_visits"],
+        ...            start="2026-01-01", columns=["entity_id", "metric_value"])
+        """
+        tables = list(self.scan(columns=columns, stats=stats, **filters))
+        if not tables:
+            schema = pa.unify_schemas([STORE_SCHEMA, PARTITION_SCHEMA])
+            names = list(columns) if columns is not None else schema.names
+            return pa.schema([schema.field(n) for n in names]).empty_table().to_pandas()
+        return pa.concat_tables(tables).to_pandas()
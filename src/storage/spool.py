@@ -0,0 +1,489 @@
+"""
+Durable on-disk write spool with a background drainer.
+
+Extraction appends batches to the spool and moves on; a drainer thread
+replays them to the configured backend with retry / backoff behind a
+circuit breaker. A slow or unavailable backend then delays writes
+instead of aborting the run, and nothing already parsed is lost.
+
+Layout (``SPOOL_DIR``)::
+
+    00000001.seg    append-only segments, one JSON batch per line
+    00000002.seg
+    ack.json        position just past the last acknowledged batch
+
+Appends are fsync'd in groups (every ``fsync_batches`` batches or
+``fsync_interval_s`` seconds); the drainer only ever sends batches that
+are already durable. After a crash the spool resumes from ``ack.json``.
+Delivery is at-least-once (a batch sent but not yet acknowledged is
+sent again), so pair the spool with a keyed ``write_mode`` (see
+``storage.row_keys``) to keep replays duplicate-free.
+"""
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from core.constants import SPOOL_DIR
+from storage.serialization import FrameRecords, materialize
+
+
+SEGMENT_SUFFIX = ".seg"
+ACK_FILE = "ack.json"
+
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_FSYNC_BATCHES = 32
+DEFAULT_FSYNC_INTERVAL_S = 1.0
+# How long spooled_writes waits on exit for the backend to catch up; the
+# rest is replayed by the next run (retries never give up on their own)
+DEFAULT_DRAIN_TIMEOUT_S = 60.0
+# After the drain timeout: grace for a send in progress to return before
+# the (daemon) drainer is left behind with its batch still spooled
+ABANDON_JOIN_TIMEOUT_S = 1.0
+
+
+@dataclass(frozen=True, order=True)
+class SpoolPosition:
+    """Byte offset within a segment (just past a batch line)."""
+    segment: int
+    offset: int
+
+
+@dataclass
+class SpoolBatch:
+    table_name: str
+    rows: List[dict]
+    write_mode: str = "insert"
+
+
+# ---------------------------------------------------------------------
+# Spool (segments + acknowledgements)
+# ---------------------------------------------------------------------
+class WriteSpool:
+    """
+    Segmented append-only batch log.
+
+    Appends are serialized under a lock, so any number of threads may
+    append while one drainer reads.
+    """
+
+    def __init__(
+        self,
+        spool_dir: Path = SPOOL_DIR,
+        *,
+        segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+        fsync_batches: int = DEFAULT_FSYNC_BATCHES,
+        fsync_interval_s: float = DEFAULT_FSYNC_INTERVAL_S,
+    ):
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_batches = fsync_batches
+        self.fsync_interval_s = fsync_interval_s
+
+        self._lock = threading.Lock()
+        # Signalled whenever more batches become durable
+        self.durable_advanced = threading.Condition(self._lock)
+
+        self._acked = self._load_ack()
+        existing = self._segments()
+
+        # Never append after a possibly torn tail: always start a new segment
+        self._segment = max(existing + [self._acked.segment]) + 1
+        self._file = open(self._segment_path(self._segment), "ab")
+        self._offset = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._durable = SpoolPosition(self._segment, 0)
+
+    # -------------------------------------------------------------
+    # Paths / state
+    # -------------------------------------------------------------
+    def _segment_path(self, segment: int) -> Path:
+        return self.spool_dir / f"{segment:08d}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> List[int]:
+        return sorted(
+            int(path.stem)
+            for path in self.spool_dir.glob(f"*{SEGMENT_SUFFIX}")
+            if path.stem.isdigit()
+        )
+
+    def _load_ack(self) -> SpoolPosition:
+        path = self.spool_dir / ACK_FILE
+        if not path.exists():
+            return SpoolPosition(0, 0)
+        raw = json.loads(path.read_text())
+        return SpoolPosition(raw["segment"], raw["offset"])
+
+    @property
+    def acknowledged(self) -> SpoolPosition:
+        return self._acked
+
+    # -------------------------------------------------------------
+    # Appending
+    # -------------------------------------------------------------
+    def append(self, table_name: str, rows: List[dict], *, write_mode: str = "insert") -> None:
+        """Append one batch. Durable after the next group fsync."""
+        line = json.dumps(
+            {"table": table_name, "write_mode": write_mode, "rows": rows},
+            default=str,
+            separators=(",", ":"),
+        ).encode("utf-8") + b"\n"
+
+        with self._lock:
+            if self._offset and self._offset + len(line) > self.segment_max_bytes:
+                self._rotate()
+
+            self._file.write(line)
+            self._offset += len(line)
+            self._unsynced += 1
+
+            if (
+                self._unsynced >= self.fsync_batches
+                or time.monotonic() - self._last_sync >= self.fsync_interval_s
+            ):
+                self._sync()
+
+    def append_dataframe(
+        self,
+        table_name: str,
+        df: pd.DataFrame,
+        *,
+        batch_size: int = 1000,
+        write_mode: str = "insert",
+    ) -> int:
+        """Append ``df`` as ``batch_size`` batches. Returns the batch count."""
+        records = FrameRecords(df)
+        batches = 0
+        for start in range(0, len(records), batch_size):
+            self.append(table_name, materialize(records[start:start + batch_size]), write_mode=write_mode)
+            batches += 1
+        return batches
+
+    def _sync(self) -> None:
+        # Caller holds the lock
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._durable = SpoolPosition(self._segment, self._offset)
+        self.durable_advanced.notify_all()
+
+    def _rotate(self) -> None:
+        self._sync()
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), "ab")
+        self._offset = 0
+        self._durable = SpoolPosition(self._segment, 0)
+
+    def flush(self) -> None:
+        """Make every appended batch durable now."""
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+
+    def flush_if_due(self) -> None:
+        with self._lock:
+            if self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval_s:
+                self._sync()
+
+    # -------------------------------------------------------------
+    # Reading / acknowledging
+    # -------------------------------------------------------------
+    def read_next(self, after: SpoolPosition) -> Optional[Tuple[SpoolPosition, SpoolBatch]]:
+        """
+        The first durable batch after ``after``, with the position just
+        past it, or None when there is nothing durable left to read. A
+        torn (incomplete) last line of a segment is skipped.
+        """
+        segment, offset = after.segment, after.offset
+
+        while True:
+            durable = self._durable
+
+            if segment > durable.segment:
+                return None
+
+            path = self._segment_path(segment)
+            line = b""
+            if path.exists():
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    line = f.readline()
+
+            complete = line.endswith(b"\n")
+            if segment == durable.segment and offset + len(line) > durable.offset:
+                complete = False
+
+            if complete:
+                end = SpoolPosition(segment, offset + len(line))
+                try:
+                    raw = json.loads(line)
+                except ValueError:
+                    segment, offset = end.segment, end.offset
+                    continue
+                return end, SpoolBatch(raw["table"], raw["rows"], raw.get("write_mode", "insert"))
+
+            if segment == durable.segment:
+                return None
+
+            # End of a sealed segment: continue with the next one
+            later = [s for s in self._segments() if s > segment]
+            segment, offset = (later[0] if later else durable.segment), 0
+
+    def acknowledge(self, position: SpoolPosition) -> None:
+        """Record every batch up to ``position`` as delivered."""
+        tmp = self.spool_dir / f"{ACK_FILE}.tmp"
+        tmp.write_text(json.dumps({"segment": position.segment, "offset": position.offset}))
+        os.replace(tmp, self.spool_dir / ACK_FILE)
+        self._acked = position
+
+        # Older segments are sealed and fully delivered
+        for segment in self._segments():
+            if segment >= position.segment:
+                break
+            self._segment_path(segment).unlink(missing_ok=True)
+
+    def pending(self) -> int:
+        """Number of durable batches not yet acknowledged."""
+        count = 0
+        position = self._acked
+        while (item := self.read_next(position)) is not None:
+            position = item[0]
+            count += 1
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+            self._file.close()
+
+
+# ---------------------------------------------------------------------
+# Retry / circuit breaker
+# ---------------------------------------------------------------------
+@dataclass(frozen=True)
+class RetryPolicy:
+    # None = retry until the drainer is stopped (the batch stays spooled)
+    max_attempts: Optional[int] = None
+    base_delay_s: float = 0.5
+    max_delay_s: float = 30.0
+    jitter: float = 0.2
+
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff with ±jitter for the ``attempt``-th retry (1-based)."""
+        delay = min(self.max_delay_s, self.base_delay_s * (2 ** (attempt - 1)))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class CircuitBreaker:
+    """
+    Closed → open after ``failure_threshold`` consecutive failures; open
+    rejects calls for ``reset_timeout_s``, then lets a single probe
+    through (half-open). The probe's outcome closes or re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout_s - self._clock())
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                self.trips += 1
+            self._opened_at = self._clock()
+
+
+# ---------------------------------------------------------------------
+# Drainer
+# ---------------------------------------------------------------------
+SendFn = Callable[[str, List[dict], str], None]
+
+
+def _backend_send(table_name: str, rows: List[dict], write_mode: str) -> None:
+    from storage.writer import insert_stream
+
+    insert_stream(table_name, rows, write_mode=write_mode)
+
+
+@dataclass
+class DrainStats:
+    batches_sent: int = 0
+    rows_sent: int = 0
+    retries: int = 0
+    last_error: Optional[BaseException] = field(default=None, repr=False)
+
+
+class SpoolDrainer(threading.Thread):
+    """
+    Background thread replaying spooled batches in order through
+    ``send(table_name, rows, write_mode)`` (the configured backend by
+    default), acknowledging each one after it is written.
+    """
+
+    def __init__(
+        self,
+        spool: WriteSpool,
+        send: SendFn = _backend_send,
+        *,
+        retry: RetryPolicy = RetryPolicy(),
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        super().__init__(name="spool-drainer", daemon=True)
+        self.spool = spool
+        self.send = send
+        self.retry = retry
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = DrainStats()
+        self._position = spool.acknowledged
+        self._stop_requested = threading.Event()
+        self._abandon = threading.Event()
+        self.failed = threading.Event()
+
+    def run(self) -> None:
+        while not self._abandon.is_set():
+            item = self.spool.read_next(self._position)
+
+            if item is None:
+                if self._stop_requested.is_set():
+                    # Everything appended before stop() is durable by now
+                    if self.spool.read_next(self._position) is None:
+                        return
+                    continue
+                with self.spool.durable_advanced:
+                    self.spool.durable_advanced.wait(timeout=self.spool.fsync_interval_s)
+                self.spool.flush_if_due()
+                continue
+
+            position, batch = item
+            # A send that returns after stop() gave up stays unacknowledged
+            # (replayed next run): the spool may already be closed
+            if not self._deliver(batch) or self._abandon.is_set():
+                return
+            self.spool.acknowledge(position)
+            self._position = position
+
+    def _deliver(self, batch: SpoolBatch) -> bool:
+        attempt = 0
+        while not self._abandon.is_set():
+            if not self.breaker.allow():
+                self._abandon.wait(self.breaker.retry_after())
+                continue
+            try:
+                self.send(batch.table_name, batch.rows, batch.write_mode)
+            except Exception as e:
+                self.breaker.record_failure()
+                self.stats.last_error = e
+                attempt += 1
+                if self.retry.max_attempts is not None and attempt >= self.retry.max_attempts:
+                    self.failed.set()
+                    return False
+                self.stats.retries += 1
+                self._abandon.wait(self.retry.delay(attempt))
+                continue
+
+            self.breaker.record_success()
+            self.stats.batches_sent += 1
+            self.stats.rows_sent += len(batch.rows)
+            return True
+        return False
+
+    def stop(self, *, drain: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        Stop the drainer. With ``drain=True`` wait (up to ``timeout``) for
+        every appended batch to be delivered first; whatever is left stays
+        spooled for the next run. Returns True when nothing is pending.
+
+        Never blocks much past ``timeout``: a send hung in the backend is
+        given ``ABANDON_JOIN_TIMEOUT_S`` to return, then the daemon thread
+        is left behind and False is returned.
+        """
+        self.spool.flush()
+        self._stop_requested.set()
+        if not drain:
+            self._abandon.set()
+        with self.spool.durable_advanced:
+            self.spool.durable_advanced.notify_all()
+
+        self.join(timeout)
+        if self.is_alive():
+            self._abandon.set()
+            self.join(ABANDON_JOIN_TIMEOUT_S)
+            if self.is_alive():
+                return False
+        return self.spool.read_next(self._position) is None
+
+
+@contextmanager
+def spooled_writes(
+    spool_dir: Path = SPOOL_DIR,
+    *,
+    send: SendFn = _backend_send,
+    drain_timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT_S,
+    retry: RetryPolicy = RetryPolicy(),
+    breaker: Optional[CircuitBreaker] = None,
+    **spool_options,
+) -> Iterator[WriteSpool]:
+    """
+    Open the spool with a running drainer; on exit wait up to
+    ``drain_timeout`` seconds (``None``: until delivered, which never
+    happens while the backend is down) for it to empty. Undelivered
+    batches stay on disk and are replayed first by the next
+    ``spooled_writes``.
+    """
+    spool = WriteSpool(spool_dir, **spool_options)
+    drainer = SpoolDrainer(spool, send, retry=retry, breaker=breaker)
+    drainer.start()
+
+    try:
+        yield spool
+    finally:
+        drained = drainer.stop(drain=True, timeout=drain_timeout)
+        spool.close()
+
+        if not drained:
+            print(
+                f"⚠️ {spool.pending()} spooled batches not written yet "
+                f"({drainer.stats.last_error!r}); they are replayed on the next run"
+            )
@@ -1,18 +1,68 @@
+import asyncio
 import math
+import queue
+import threading
+import time
 import pandas as pd
-from typing import Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from typing import (
+    AsyncIterable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from supabase import Client
+from storage.batch_sizer import AdaptiveBatchSizer, BatchSizingConfig, is_overload_error
+from storage.row_keys import ROW_KEY_COLUMN, with_row_keys
+from storage.serialization import ChainedRecords, FrameRecords, materialize
 from storage.supabase_client import get_supabase_client
 
 
 DEFAULT_BATCH_SIZE = 1000
+# Batches sent concurrently; 1 keeps the original strictly sequential behaviour
+DEFAULT_MAX_IN_FLIGHT = 1
+
+# How rows are written (see storage.row_keys):
+#   insert        – plain INSERT, the original behaviour (re-runs append duplicates)
+#   upsert        – keyed on row_key; rows already present are overwritten
+#   skip_existing – keyed on row_key; rows already present are left as they
+#                   are (ON CONFLICT DO NOTHING on the server, no extra reads)
+WRITE_MODES = ("insert", "upsert", "skip_existing")
+DEFAULT_WRITE_MODE = "insert"
 
 
 class SupabaseInsertError(RuntimeError):
-    pass
+    def __init__(self, message: str, *, failed_batches: Sequence[int] = ()):
+        super().__init__(message)
+        # 1-based indices of every batch that failed, in batch order
+        self.failed_batches = list(failed_batches)
+
+
+
+# PostgreSQL undefined_column
+_UNDEFINED_COLUMN = "42703"
 
 
+def has_column(table_name: str, column: str, *, client: Optional[Client] = None) -> bool:
+    """Whether ``table_name`` has ``column`` (a zero-row select of it)."""
+    client = client or get_supabase_client()
+    try:
+        client.table(table_name).select(column).limit(0).execute()
+    except Exception as e:
+        if getattr(e, "code", None) == _UNDEFINED_COLUMN:
+            return False
+        raise
+    return True
+
 def clean_nan_values(records: list[dict]) -> list[dict]:
     """Replace NaN values with None for JSON serialization."""
     cleaned = []
@@ -30,52 +80,286 @@ def clean_nan_values(records: list[dict]) -> list[dict]:
     return cleaned
 
 
+def _run_batches(
+    send: Callable[[list], None],
+    batches: Iterable[Tuple[int, list]],
+    *,
+    max_in_flight: int,
+) -> List[Tuple[int, BaseException]]:
+    """
+    Send ``(index, batch)`` pairs with at most ``max_in_flight`` requests
+    outstanding. Stops submitting after the first failure, waits for the
+    batches already in flight, and returns all failures ordered by index.
+    """
+    failures: List[Tuple[int, BaseException]] = []
+    in_flight: Dict[Future, int] = {}
+
+    def collect(done) -> None:
+        for future in done:
+            index = in_flight.pop(future)
+            exc = future.exception()
+            if exc is not None:
+                failures.append((index, exc))
+
+    with ThreadPoolExecutor(
+        max_workers=max_in_flight,
+        thread_name_prefix="supabase-writer",
+    ) as pool:
+        for index, batch in batches:
+            collect([future for future in in_flight if future.done()])
+
+            if len(in_flight) >= max_in_flight and not failures:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            if failures:
+                break
+
+            in_flight[pool.submit(send, batch)] = index
+
+        collect(wait(in_flight).done)
+
+    return sorted(failures, key=lambda failure: failure[0])
+
+
+def _unique_by_row_key(records: List[dict]) -> List[dict]:
+    # One statement may not touch the same conflict key twice
+    seen = set()
+    unique = []
+    for record in records:
+        if record[ROW_KEY_COLUMN] not in seen:
+            seen.add(record[ROW_KEY_COLUMN])
+            unique.append(record)
+    return unique
+
+
+def _make_sender(
+    client: Client,
+    table_name: str,
+    sizer: Optional[AdaptiveBatchSizer],
+    on_sent: Optional[Callable[[int, int], None]] = None,
+    write_mode: str = DEFAULT_WRITE_MODE,
+) -> Callable[[Sequence], None]:
+    """
+    Build the per-batch send function. Batches are materialized to
+    records here, inside the writer thread. With a sizer, latency is
+    reported back and 413 / timeout batches are split and retried.
+
+    ``on_sent(written, skipped)`` is called once per batch, with the rows
+    written and the rows left out because their row_key already existed
+    (or repeated within the batch). For ``skip_existing`` the server
+    drops existing keys itself and reports how many rows it inserted
+    (``Prefer: count=exact``); nothing is looked up beforehand.
+    """
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"write_mode must be one of {WRITE_MODES}, got {write_mode!r}")
+
+    def execute(records: List[dict]) -> int:
+        query = client.table(table_name)
+        if write_mode == "insert":
+            query.insert(records).execute()
+            return len(records)
+        if write_mode == "upsert":
+            query.upsert(records, on_conflict=ROW_KEY_COLUMN).execute()
+            return len(records)
+
+        response = query.upsert(
+            records,
+            on_conflict=ROW_KEY_COLUMN,
+            ignore_duplicates=True,
+            count="exact",
+            returning="minimal",
+        ).execute()
+        # Rows actually inserted; without a count, assume all of them
+        return len(records) if response.count is None else response.count
+
+    def send_adaptive(records: List[dict]) -> int:
+        started = time.monotonic()
+        try:
+            written = execute(records)
+        except Exception as e:
+            if not (is_overload_error(e) and len(records) > 1):
+                raise
+            sizer.on_overload(len(records))
+            mid = len(records) // 2
+            return send_adaptive(records[:mid]) + send_adaptive(records[mid:])
+        sizer.on_success(len(records), time.monotonic() - started)
+        return written
+
+    def send(batch: Sequence) -> None:
+        records = materialize(batch)
+        total = len(records)
+
+        if write_mode != "insert":
+            records = _unique_by_row_key(with_row_keys(records, table_name))
+
+        written = 0
+        if records:
+            if sizer:
+                # Feeds the byte cap for streamed batches (rows not known upfront)
+                sizer.observe_row_bytes(records)
+            written = (send_adaptive if sizer else execute)(records)
+        if on_sent is not None:
+            on_sent(written, total - written)
+
+    return send
+
+
+def _fixed_batches(rows: Sequence, batch_size: int) -> Iterator[Tuple[int, Sequence]]:
+    for i in range(math.ceil(len(rows) / batch_size)):
+        yield i, rows[i * batch_size:(i + 1) * batch_size]
+
+
+def _adaptive_batches(
+    rows: Sequence,
+    sizer: AdaptiveBatchSizer,
+    spans: Dict[int, Tuple[int, int]],
+) -> Iterator[Tuple[int, Sequence]]:
+    # Sized lazily so each batch sees the latest latency / error feedback
+    start = 0
+    index = 0
+
+    while start < len(rows):
+        size = sizer.next_batch_size(rows, start)
+        spans[index] = (start, min(start + size, len(rows)))
+        yield index, rows[start:start + size]
+        start += size
+        index += 1
+
+
 def insert_rows(
     table_name: str,
     rows: Iterable[dict],
     *,
     batch_size: int = DEFAULT_BATCH_SIZE,
     dry_run: bool = False,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    adaptive: bool = False,
+    sizing: Optional[BatchSizingConfig] = None,
+    client: Optional[Client] = None,
+    write_mode: str = DEFAULT_WRITE_MODE,
 ) -> None:
-    rows = list(rows)
+    """
+    Insert ``rows`` in ``batch_size`` batches, up to ``max_in_flight``
+    batches concurrently.
+
+    With ``adaptive=True``, ``batch_size`` is only the starting point:
+    batches are capped by estimated serialized bytes and resized from
+    request latency, and a batch rejected as too large / timed out is
+    split in half and retried (see ``storage.batch_sizer``).
+
+    With ``write_mode="upsert"`` / ``"skip_existing"`` every row gets a
+    content-hash ``row_key`` (see ``storage.row_keys``) and rows already
+    in the table are overwritten / not sent, so re-running an ingest
+    adds no duplicates.
+
+    Raises
+    ------
+    SupabaseInsertError
+        For the first failing batch (lowest batch number), whatever
+        order the concurrent requests completed in.
+    """
+    _insert_sequence(
+        table_name,
+        list(rows),
+        batch_size=batch_size,
+        dry_run=dry_run,
+        max_in_flight=max_in_flight,
+        adaptive=adaptive,
+        sizing=sizing,
+        client=client,
+        write_mode=write_mode,
+    )
+
+
+def _insert_sequence(
+    table_name: str,
+    rows: Sequence,
+    *,
+    batch_size: int,
+    dry_run: bool,
+    max_in_flight: int,
+    adaptive: bool,
+    sizing: Optional[BatchSizingConfig],
+    client: Optional[Client],
+    write_mode: str,
+) -> None:
+    # ``rows`` is a list of dicts or a lazy FrameRecords view; batches are
+    # materialized only when sent.
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be >= 1")
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"write_mode must be one of {WRITE_MODES}, got {write_mode!r}")
+
     total = len(rows)
 
     if total == 0:
         return
 
+    sizer = AdaptiveBatchSizer(batch_size, sizing or BatchSizingConfig()) if adaptive else None
+
+    # Row span of every adaptive batch, for error reporting
+    spans: Dict[int, Tuple[int, int]] = {}
+
     if dry_run:
+        planned = (
+            sum(1 for _ in _adaptive_batches(rows, sizer, spans))
+            if sizer
+            else math.ceil(total / batch_size)
+        )
         print(
             f"[DRY RUN] Would insert {total} rows into '{table_name}' "
-            f"({math.ceil(total / batch_size)} batches)"
+            f"({planned} batches)"
         )
         return
 
-    client: Client = get_supabase_client()
-    batches = math.ceil(total / batch_size)
+    written = skipped = 0
+    lock = threading.Lock()
 
-    for i in range(batches):
-        start = i * batch_size
-        end = start + batch_size
-        batch = rows[start:end]
+    def on_sent(batch_written: int, batch_skipped: int) -> None:
+        nonlocal written, skipped
+        with lock:
+            written += batch_written
+            skipped += batch_skipped
 
-        try:
-            (
-                client
-                .table(table_name)
-                .insert(batch)
-                .execute()
-            )
-        except Exception as e:
-            raise SupabaseInsertError(
-                f"Insert failed for table '{table_name}' "
-                f"(batch {i + 1}/{batches})"
-            ) from e
-
-    print(
-        f"✅ Inserted {total} rows into '{table_name}' "
-        f"({batches} batches)"
+    send = _make_sender(
+        client or get_supabase_client(), table_name, sizer, on_sent, write_mode
     )
 
+    if sizer:
+        failures = _run_batches(
+            send,
+            _adaptive_batches(rows, sizer, spans),
+            max_in_flight=max_in_flight,
+        )
+        batches = len(spans)
+    else:
+        failures = _run_batches(send, _fixed_batches(rows, batch_size), max_in_flight=max_in_flight)
+        batches = math.ceil(total / batch_size)
+
+    if failures:
+        first_index, first_exc = failures[0]
+        if sizer:
+            first_row, end_row = spans[first_index]
+            where = f"batch {first_index + 1}, rows {first_row}-{end_row - 1}"
+        else:
+            where = f"batch {first_index + 1}/{batches}"
+        raise SupabaseInsertError(
+            f"Insert failed for table '{table_name}' ({where})",
+            failed_batches=[index + 1 for index, _ in failures],
+        ) from first_exc
+
+    if write_mode == "insert":
+        print(
+            f"✅ Inserted {total} rows into '{table_name}' "
+            f"({batches} batches)"
+        )
+    else:
+        print(
+            f"✅ Wrote {written} rows into '{table_name}' "
+            f"({batches} batches, {skipped} already present)"
+        )
+
 
 def insert_dataframe(
     df: pd.DataFrame,
@@ -83,13 +367,251 @@ def insert_dataframe(
     *,
     batch_size: int = DEFAULT_BATCH_SIZE,
     dry_run: bool = False,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    adaptive: bool = False,
+    sizing: Optional[BatchSizingConfig] = None,
+    client: Optional[Client] = None,
+    write_mode: str = DEFAULT_WRITE_MODE,
 ) -> None:
-    records = df.to_dict(orient="records")
-    records = clean_nan_values(records)  # ✅ Clean NaN values
-    
-    insert_rows(
-        table_name=table_name,
-        rows=records,
+    """
+    Insert a DataFrame without building a list of dicts for the whole
+    frame: each batch is serialized column-wise (NaN / NaT / NA → None)
+    from its own slice when it is sent.
+    """
+    _insert_sequence(
+        table_name,
+        FrameRecords(df),
         batch_size=batch_size,
         dry_run=dry_run,
-    )
\ No newline at end of file
+        max_in_flight=max_in_flight,
+        adaptive=adaptive,
+        sizing=sizing,
+        client=client,
+        write_mode=write_mode,
+    )
+
+
+# ---------------------------------------------------------------------
+# Streaming inserts
+# ---------------------------------------------------------------------
+
+StreamItem = Union[Mapping, pd.DataFrame]
+
+
+@dataclass
+class StreamInsertStats:
+    rows_read: int = 0
+    rows_written: int = 0
+    # Rows not sent because their row_key already existed (keyed write modes)
+    rows_skipped: int = 0
+    batches_written: int = 0
+
+
+def _stream_batches(
+    source: Iterable[StreamItem],
+    batch_target: Callable[[], int],
+    spans: Dict[int, Tuple[int, int]],
+    stats: StreamInsertStats,
+) -> Iterator[Tuple[int, Sequence]]:
+    """
+    Re-chunk a stream of dict rows and / or DataFrame chunks into batches
+    of ``batch_target()`` rows. DataFrame chunks are kept as lazy
+    FrameRecords slices; a batch spanning several chunks is a
+    ChainedRecords. Only the batch being filled is held here.
+    """
+    segments: List[Sequence] = []
+    rows: Optional[List[Mapping]] = None
+    pending = 0
+    start = 0
+    index = 0
+    target = batch_target()
+
+    def emit() -> Tuple[int, Sequence]:
+        nonlocal segments, rows, pending, start, index, target
+        batch = segments[0] if len(segments) == 1 else ChainedRecords(segments)
+        spans[index] = (start, start + pending)
+        emitted = (index, batch)
+        start += pending
+        index += 1
+        segments, rows, pending = [], None, 0
+        target = batch_target()
+        return emitted
+
+    for item in source:
+        if isinstance(item, pd.DataFrame):
+            view = FrameRecords(item)
+            stats.rows_read += len(view)
+            offset = 0
+            while offset < len(view):
+                take = min(target - pending, len(view) - offset)
+                segments.append(view[offset:offset + take])
+                rows = None
+                pending += take
+                offset += take
+                if pending >= target:
+                    yield emit()
+        elif isinstance(item, Mapping):
+            stats.rows_read += 1
+            if rows is None:
+                rows = []
+                segments.append(rows)
+            rows.append(item)
+            pending += 1
+            if pending >= target:
+                yield emit()
+        else:
+            raise TypeError(
+                f"insert_stream expects dict rows or DataFrame chunks, got {type(item).__name__}"
+            )
+
+    if pending:
+        yield emit()
+
+
+def insert_stream(
+    table_name: str,
+    source: Iterable[StreamItem],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dry_run: bool = False,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    adaptive: bool = False,
+    sizing: Optional[BatchSizingConfig] = None,
+    client: Optional[Client] = None,
+    write_mode: str = DEFAULT_WRITE_MODE,
+    on_progress: Optional[Callable[[StreamInsertStats], None]] = None,
+) -> StreamInsertStats:
+    """
+    Insert rows from an iterator / generator of dict rows and / or
+    DataFrame chunks without ever holding the whole input.
+
+    The source is pulled only as fast as batches are sent, so memory
+    stays around ``max_in_flight + 1`` batches whatever the stream
+    length. ``on_progress`` is called with a snapshot of the running
+    totals after every batch that is written.
+
+    Parameters
+    ----------
+    table_name : str
+        Target table.
+    source : iterable of dict or pd.DataFrame
+        Rows to insert; DataFrame chunks are serialized per batch as in
+        :func:`insert_dataframe`. Use :func:`insert_stream_async` for
+        async iterables.
+    batch_size, dry_run, max_in_flight, adaptive, sizing, client, write_mode
+        As for :func:`insert_rows`. A dry run consumes the whole stream.
+    on_progress : callable, optional
+        Progress callback.
+
+    Returns
+    -------
+    StreamInsertStats
+        Rows read from the source, rows written and batches written.
+
+    Raises
+    ------
+    SupabaseInsertError
+        For the first failing batch, with its row span in the stream.
+        Nothing further is pulled from the source after a failure.
+    """
+    if hasattr(source, "__aiter__"):
+        raise TypeError("insert_stream got an async iterable; use insert_stream_async")
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be >= 1")
+    if write_mode not in WRITE_MODES:
+        raise ValueError(f"write_mode must be one of {WRITE_MODES}, got {write_mode!r}")
+
+    sizer = AdaptiveBatchSizer(batch_size, sizing or BatchSizingConfig()) if adaptive else None
+    batch_target = sizer.stream_batch_size if sizer else (lambda: batch_size)
+
+    stats = StreamInsertStats()
+    spans: Dict[int, Tuple[int, int]] = {}
+    batches = _stream_batches(source, batch_target, spans, stats)
+
+    if dry_run:
+        planned = sum(1 for _ in batches)
+        print(
+            f"[DRY RUN] Would insert {stats.rows_read} rows into '{table_name}' "
+            f"({planned} batches)"
+        )
+        return stats
+
+    lock = threading.Lock()
+
+    def on_sent(written: int, skipped: int) -> None:
+        with lock:
+            stats.rows_written += written
+            stats.rows_skipped += skipped
+            stats.batches_written += 1
+            snapshot = replace(stats)
+        if on_progress is not None:
+            on_progress(snapshot)
+
+    send = _make_sender(
+        client or get_supabase_client(), table_name, sizer, on_sent, write_mode
+    )
+    failures = _run_batches(send, batches, max_in_flight=max_in_flight)
+
+    if failures:
+        first_index, first_exc = failures[0]
+        first_row, end_row = spans[first_index]
+        raise SupabaseInsertError(
+            f"Insert failed for table '{table_name}' "
+            f"(batch {first_index + 1}, rows {first_row}-{end_row - 1})",
+            failed_batches=[index + 1 for index, _ in failures],
+        ) from first_exc
+
+    if stats.rows_read:
+        print(
+            f"✅ Wrote {stats.rows_written} rows into '{table_name}' "
+            f"({stats.batches_written} batches, {stats.rows_skipped} already present)"
+        )
+    return stats
+
+
+_END_OF_STREAM = object()
+
+
+async def insert_stream_async(
+    table_name: str,
+    source: AsyncIterable[StreamItem],
+    *,
+    queue_size: int = 4,
+    **options,
+) -> StreamInsertStats:
+    """
+    :func:`insert_stream` for an async iterable. The writer runs in the
+    default executor and is fed through a ``queue_size`` bounded queue,
+    so a fast producer waits for the writer instead of buffering.
+    ``options`` are passed through to :func:`insert_stream`.
+    """
+    loop = asyncio.get_running_loop()
+    handoff: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+    def drain() -> Iterator[StreamItem]:
+        while True:
+            item = handoff.get()
+            if item is _END_OF_STREAM:
+                return
+            yield item
+
+    writer = loop.run_in_executor(None, lambda: insert_stream(table_name, drain(), **options))
+
+    async def put(item) -> bool:
+        # Poll rather than block: the writer may stop consuming on failure
+        while not writer.done():
+            try:
+                handoff.put_nowait(item)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.005)
+        return False
+
+    try:
+        async for item in source:
+            if not await put(item):
+                break
+    finally:
+        await put(_END_OF_STREAM)
+
+    return await writer
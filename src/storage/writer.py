@@ -0,0 +1,87 @@
+"""
+Write path selected by config (``storage.backend``):
+
+- ``supabase`` – REST inserts (``storage.supabase_writer``), the default
+- ``postgres`` – ``COPY FROM STDIN`` bulk loads (``storage.postgres_writer``)
+
+Runners call these instead of a backend module directly. Options that
+only apply to REST batching (batch size, concurrency, adaptive sizing,
+client) are ignored by the COPY backend.
+"""
+import sys
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from core.config import get_settings
+from storage import supabase_writer
+from storage.row_keys import ROW_KEY_COLUMN
+
+
+WRITER_BACKENDS = ("supabase", "postgres")
+
+_REST_ONLY_OPTIONS = ("batch_size", "max_in_flight", "adaptive", "sizing", "client")
+
+
+def get_writer_backend() -> str:
+    backend = get_settings().storage.backend
+    if backend not in WRITER_BACKENDS:
+        raise ValueError(f"storage.backend must be one of {WRITER_BACKENDS}, got {backend!r}")
+    return backend
+
+
+def _copy_options(options: dict) -> dict:
+    return {key: value for key, value in options.items() if key not in _REST_ONLY_OPTIONS}
+
+
+def insert_dataframe(
+    df: pd.DataFrame,
+    table_name: str,
+    *,
+    backend: Optional[str] = None,
+    **options,
+) -> None:
+    """Write a DataFrame through the configured (or given) backend."""
+    if (backend or get_writer_backend()) == "postgres":
+        from storage.postgres_writer import copy_dataframe
+
+        copy_dataframe(df, table_name, **_copy_options(options))
+    else:
+        supabase_writer.insert_dataframe(df, table_name, **options)
+
+
+def insert_stream(
+    table_name: str,
+    source: Iterable,
+    *,
+    backend: Optional[str] = None,
+    **options,
+) -> supabase_writer.StreamInsertStats:
+    """Write a stream of dict rows / DataFrame chunks through the configured backend."""
+    if (backend or get_writer_backend()) == "postgres":
+        from storage.postgres_writer import copy_stream
+
+        return copy_stream(table_name, source, **_copy_options(options))
+    return supabase_writer.insert_stream(table_name, source, **options)
+
+
+
+def tables_missing_row_key(tables: Iterable[str], *, backend: Optional[str] = None) -> List[str]:
+    """
+    Those of ``tables`` without a ``row_key`` column, which keyed write
+    modes (upsert / skip_existing) need (``scripts/dev/migrate_row_keys.py``
+    adds it).
+    """
+    if (backend or get_writer_backend()) == "postgres":
+        from storage.postgres_writer import table_columns
+
+        return [table for table in tables if ROW_KEY_COLUMN not in table_columns(table)]
+    return [table for table in tables if not supabase_writer.has_column(table, ROW_KEY_COLUMN)]
+
+def close_connections() -> None:
+    """Close the connections a backend keeps open between writes (call once the writers are done)."""
+    # Never imported means no COPY connection was opened
+    if "storage.postgres_writer" in sys.modules:
+        from storage.postgres_writer import close_postgres_connections
+
+        close_postgres_connections()
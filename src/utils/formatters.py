@@ -0,0 +1,12 @@
+"""Human-readable formatting helpers."""
+
+
+def format_bytes(num_bytes: float) -> str:
+    """
+    1536 -> '1.5 KiB'
+    """
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(num_bytes) < 1024 or unit == "GiB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GiB"
@@ -0,0 +1,20 @@
+"""Content hashing helpers."""
+import hashlib
+from pathlib import Path
+from typing import Union
+
+
+HASH_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+def file_sha256(path: Union[str, Path], *, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    SHA-256 hex digest of a file's bytes, read in fixed-size chunks.
+    """
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
@@ -0,0 +1,219 @@
+import os
+import random
+import tempfile
+
+import pytest
+from openpyxl import Workbook
+
+# Keep local caches (header plans, sheet cache, ...) out of the repo tree
+os.environ.setdefault("CTP_CACHE_DIR", tempfile.mkdtemp(prefix="ctp-cache-"))
+
+
+# ---------------------------------------------------------------------
+# Synthetic CPID_EDC_Metrics workbook (two-row header)
+# ---------------------------------------------------------------------
+CPID_IDENTITY_HEADERS = [
+    "Project Name",
+    "Region",
+    "Country",
+    "Site ID",
+    "Subject ID",
+    "Latest Visit (SV) (Source: Rave EDC: BO4)",
+    "Subject Status (Source: PRIMARY Form)",
+]
+
+CPID_METRIC_HEADERS = [
+    ("CPMD", "Page status"),
+    (None, "Page status"),
+    (None, "Page status"),
+    (None, "# Missing Visits"),
+    (None, "Comment"),
+    ("SSM", "Open Queries"),
+    (None, "Overdue (days)"),
+    ("Input files", "Missing Pages"),
+]
+
+
+def write_cpid_workbook(
+    path, n_subjects: int = 25, seed: int = 7, subject_prefix: str = "Subject"
+) -> None:
+    rng = random.Random(seed)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Subject Level Metrics"
+
+    ws.append(CPID_IDENTITY_HEADERS + [g for g, _ in CPID_METRIC_HEADERS])
+    ws.append([None] * len(CPID_IDENTITY_HEADERS) + [l for _, l in CPID_METRIC_HEADERS])
+
+    for i in range(n_subjects):
+        site = f"Site {i % 4 + 1}"
+        metrics = [
+            rng.choice([0, 1, 2, None]),
+            rng.choice([0, 3, None]),
+            rng.choice([1.5, None, "n/a"]),
+            rng.choice([0, 1, " 4 ", None]),
+            rng.choice(["ok", "check", None]),
+            rng.randint(0, 9),
+            rng.choice([None, 12.25, True]),
+            rng.choice([0, 2]),
+        ]
+        ws.append(
+            ["Study 1", "EU", "DEU", site, f"{subject_prefix} {i:04d}", "Screening", "Active"]
+            + metrics
+        )
+
+    # Aggregate / footer row without a subject id
+    ws.append(["Total", None, None, None, None, None, None] + [99] * len(CPID_METRIC_HEADERS))
+
+    wb.save(path)
+
+
+@pytest.fixture
+def make_cpid_workbook():
+    """``write_cpid_workbook`` for tests that need several workbooks."""
+    return write_cpid_workbook
+
+
+@pytest.fixture
+def cpid_workbook(tmp_path):
+    path = tmp_path / "Study 1_CPID_EDC_Metrics.xlsx"
+    write_cpid_workbook(path)
+    return path
+
+
+@pytest.fixture
+def study_tree(tmp_path):
+    """Study root with two CPID studies of different sizes and an empty study."""
+    root = tmp_path / "studies"
+    for seed, (study, n_subjects) in enumerate((("Study 1", 20), ("Study 2", 35))):
+        folder = root / study
+        folder.mkdir(parents=True)
+        write_cpid_workbook(
+            folder / f"{study}_CPID_EDC_Metrics.xlsx",
+            n_subjects=n_subjects,
+            seed=seed,
+            subject_prefix=f"{study} Subject",
+        )
+        (folder / "notes.txt").write_text("not a dataset")
+    (root / "Study 3").mkdir()
+    return root
+
+
+# ---------------------------------------------------------------------
+# Fake Supabase client (PostgREST-style builder, no network)
+# ---------------------------------------------------------------------
+class FakeSupabaseClient:
+    """
+    Records every executed request; ``fail_on(entity_id)`` makes any
+    request carrying a row with that ``entity_id`` raise.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        import threading
+
+        self.latency = latency
+        # Requests with more rows than this fail with HTTP 413
+        self.max_request_rows = None
+        self.requests = []  # (table, op, rows)
+        self.tables = {}
+        # Table → columns it lacks (selecting one fails as PostgREST does)
+        self.missing_columns = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def fail_on(self, entity_id: str, exc: Exception = None) -> None:
+        self._failures[entity_id] = exc or RuntimeError(f"row {entity_id} rejected")
+
+    def table(self, name: str) -> "_FakeQuery":
+        return _FakeQuery(self, name)
+
+    def _execute(self, table: str, op: str, rows: list, options: dict):
+        import time
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if op == "select":
+            from postgrest.exceptions import APIError
+
+            for column in options["columns"]:
+                if column in self.missing_columns.get(table, ()):
+                    raise APIError({"code": "42703", "message": f"column {table}.{column} does not exist"})
+            return _FakeResponse(self.tables.get(table, [])[: options.get("limit")])
+
+        if self.max_request_rows is not None and len(rows) > self.max_request_rows:
+            from postgrest.exceptions import APIError
+
+            raise APIError({"code": "413", "message": "Payload Too Large"})
+
+        for row in rows:
+            if row.get("entity_id") in self._failures:
+                raise self._failures[row["entity_id"]]
+
+        with self._lock:
+            self.requests.append((table, op, list(rows)))
+            stored = self.tables.setdefault(table, [])
+
+            affected = []
+            if op == "upsert":
+                key = options["on_conflict"]
+                positions = {row.get(key): i for i, row in enumerate(stored)}
+                for row in rows:
+                    if row[key] not in positions:
+                        positions[row[key]] = len(stored)
+                        stored.append(row)
+                        affected.append(row)
+                    elif not options.get("ignore_duplicates"):
+                        stored[positions[row[key]]] = row
+                        affected.append(row)
+            else:
+                stored.extend(rows)
+                affected = rows
+
+        # PostgREST: Prefer return=minimal / count=exact
+        data = [] if options.get("returning") == "minimal" else affected
+        return _FakeResponse(data, len(affected) if options.get("count") else None)
+
+
+class _FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _FakeQuery:
+    def __init__(self, client: FakeSupabaseClient, table: str):
+        self._client = client
+        self._table = table
+        self._op = None
+        self._rows = []
+        self._options = {}
+
+    def insert(self, rows, **options):
+        self._op, self._rows, self._options = "insert", rows, options
+        return self
+
+    def upsert(self, rows, **options):
+        self._op, self._rows, self._options = "upsert", rows, options
+        return self
+
+    def select(self, *columns):
+        self._op, self._options = "select", {"columns": columns}
+        return self
+
+    def limit(self, count):
+        self._options["limit"] = count
+        return self
+
+    def execute(self):
+        return self._client._execute(self._table, self._op, self._rows, self._options)
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    from storage import supabase_writer
+
+    client = FakeSupabaseClient()
+    monkeypatch.setattr(supabase_writer, "get_supabase_client", lambda: client)
+    return client
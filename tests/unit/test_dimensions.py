@@ -0,0 +1,83 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from ingestion.cpid_extractor import extract_cpid_metrics
+from storage.dimensions import NULL_ID, DimensionRegistry
+
+
+def test_ids_are_stable_across_runs_and_round_trip(cpid_workbook, tmp_path):
+    path = tmp_path / "dimensions.json"
+    snapshots = extract_cpid_metrics(str(cpid_workbook))
+    snapshots.loc[0, "site_id"] = None
+
+    with DimensionRegistry.transaction(path) as registry:
+        encoded = registry.encode_frame(snapshots)
+
+    assert encoded["metric_name"].dtype == np.int32
+    assert encoded.loc[0, "site_id"] == NULL_ID
+    assert len(registry.dimension("metric_name")) == snapshots["metric_name"].nunique()
+
+    # A later run (new process, new values) keeps every existing ID
+    later = snapshots.assign(entity_id="Late " + snapshots["entity_id"].astype(str))
+    with DimensionRegistry.transaction(path) as registry:
+        reencoded = registry.encode_frame(pd.concat([snapshots, later], ignore_index=True))
+
+    pd.testing.assert_series_equal(reencoded["metric_name"].iloc[: len(snapshots)], encoded["metric_name"])
+    assert (reencoded["entity_id"].iloc[: len(snapshots)] == encoded["entity_id"]).all()
+
+    decoded = DimensionRegistry.load(path).decode_frame(encoded)
+    assert decoded["metric_name"].tolist() == snapshots["metric_name"].tolist()
+    assert pd.isna(decoded.loc[0, "site_id"])
+
+
+def test_snapshot_time_is_not_interned(tmp_path):
+    registry = DimensionRegistry(tmp_path / "dimensions.json")
+    snapshots = pd.DataFrame(
+        {"entity_id": ["a", "b"], "snapshot_time": pd.to_datetime(["2026-01-01", "2026-01-02"], utc=True)}
+    )
+
+    decoded = registry.decode_frame(registry.encode_frame(snapshots))
+
+    assert "snapshot_time" not in registry.dimensions
+    pd.testing.assert_series_equal(decoded["snapshot_time"], snapshots["snapshot_time"])
+
+
+def test_arrow_tables_share_the_registry_dictionary(cpid_workbook, tmp_path):
+    registry = DimensionRegistry(tmp_path / "dimensions.json")
+    snapshots = extract_cpid_metrics(str(cpid_workbook))
+
+    first = registry.to_arrow(snapshots.iloc[:10])
+    second = registry.to_arrow(snapshots.iloc[10:])
+
+    assert first.schema.names == list(snapshots.columns)
+    assert pa.types.is_dictionary(first.schema.field("entity_id").type)
+    combined = pa.concat_tables([first, second]).to_pandas()
+    assert combined["metric_name"].astype(str).tolist() == snapshots["metric_name"].tolist()
+
+
+def _intern(path, values, results):
+    with DimensionRegistry.transaction(path) as registry:
+        results.put(dict(zip(values, registry.dimension("site_id").encode(values).tolist())))
+
+
+def test_concurrent_transactions_never_share_ids(tmp_path):
+    path = tmp_path / "dimensions.json"
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_intern, args=(path, [f"S{w}-{i}" for i in range(20)], results))
+        for w in range(4)
+    ]
+    for process in processes:
+        process.start()
+    assigned = {}
+    for _ in processes:
+        assigned.update(results.get(timeout=30))
+    for process in processes:
+        process.join()
+
+    assert sorted(assigned.values()) == list(range(80))
+    assert DimensionRegistry.load(path).dimension("site_id").values == sorted(assigned, key=assigned.get)
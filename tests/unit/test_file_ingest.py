@@ -0,0 +1,135 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from ingestion import file_ingest
+
+
+@pytest.fixture
+def wide_workbook(tmp_path):
+    path = tmp_path / "Study 1_eSAE Dashboard.xlsx"
+    df = pd.DataFrame(
+        [
+            ["S1", "E1", "P1", "x", "S1b", 1.5],
+            ["S2", "E2", None, "y", None, 2.5],
+        ],
+        columns=["Site", "Discrepancy ID", "Patient ID", "Unused", "Site", "Noise"],
+    )
+    df.to_excel(path, index=False)
+    return path
+
+
+def test_sniffed_projection_matches_full_read(wide_workbook, tmp_path):
+    file_ingest.configure_sheet_cache(cache_dir=tmp_path / "sheets")
+    cache = file_ingest.get_sheet_cache()
+
+    with file_ingest.open_workbook(wide_workbook) as book:
+        assert book.header(0) == ["Site", "Discrepancy ID", "Patient ID", "Unused", "Site.1", "Noise"]
+
+    full = pd.read_excel(wide_workbook)
+    # "Site.1" is a mangled duplicate; the contract never names it
+    wanted = ["Site", "Patient ID", "Site number", "site_id"]
+    projected = file_ingest.read_sheet(wide_workbook, columns=wanted)
+    pd.testing.assert_frame_equal(projected, full[["Site", "Patient ID"]])
+
+    # Cache entries are keyed by the requested headers and the engine
+    file_ingest.read_sheet(wide_workbook, columns=reversed(wanted))
+    file_ingest.read_sheet(wide_workbook)
+    file_ingest.read_sheet(wide_workbook, reader="default")
+    assert (cache.stats.hits, cache.stats.misses) == (1, 3)
+
+    # No overlap with the contract: the whole sheet, as before
+    pd.testing.assert_frame_equal(
+        file_ingest.read_sheet(wide_workbook, columns=["Nope"], use_cache=False), full
+    )
+    with pytest.raises(ValueError):
+        file_ingest.read_sheet(wide_workbook, columns=["Site"], usecols=[0])
+
+
+def test_source_extract_reads_only_contract_columns(wide_workbook, monkeypatch):
+    from ingestion.sources import get_source
+
+    monkeypatch.setattr(file_ingest, "_sheet_cache_enabled", False)
+    converted = []
+    convert_cell = file_ingest._convert_cell
+    monkeypatch.setattr(
+        file_ingest, "_convert_cell", lambda cell: converted.append(cell) or convert_cell(cell)
+    )
+
+    file_ingest.configure_reader_engine("openpyxl_stream")
+    try:
+        out = get_source("sae").extract(str(wide_workbook), "Study 1")
+    finally:
+        file_ingest.configure_reader_engine()
+
+    assert out[["site_id", "subject_id", "event_id"]].values.tolist() == [["S1", "P1", "E1"]]
+    # Header row in full, then only the Site / Discrepancy ID / Patient ID cells
+    data_cells = {cell.coordinate for cell in converted if cell.value is not None and cell.row > 1}
+    assert data_cells == {"A2", "A3", "B2", "B3", "C2"}
+
+
+@pytest.fixture
+def mixed_workbook(tmp_path):
+    from openpyxl import Workbook
+    from openpyxl.cell.rich_text import CellRichText, TextBlock
+    from openpyxl.cell.text import InlineFont
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Site", "Subject", "When", "Flag", "Err", "Rich", "Dur", "Note"])
+    ws.append(["S1", "P1", dt.datetime(2024, 1, 2, 3, 4, 5), True, "#N/A",
+               CellRichText("a", TextBlock(InlineFont(b=True), "b")), dt.timedelta(hours=5), None])
+    ws.append([101, 1.0, dt.date(2024, 3, 4), False, None, "  spaced  ", None, ""])
+    ws.append([None] * 8)
+    ws.append([2.5, "x", "2024-01-01", 0, 1, 2, 3, None])
+    ws["E2"].data_type = "e"
+    # Trailing row with a value only outside most projections
+    ws.cell(row=8, column=8, value="late")
+    path = tmp_path / "mixed.xlsx"
+    wb.save(path)
+    return path
+
+
+@pytest.mark.parametrize("engine", file_ingest.available_reader_engines())
+@pytest.mark.parametrize("columns", [None, ["Site", "When"], ["Rich", "Dur", "Missing"]])
+def test_reader_engines_return_read_excel_frame(mixed_workbook, engine, columns):
+    expected = pd.read_excel(mixed_workbook)
+    if columns is not None:
+        expected = expected[[c for c in expected.columns if c in columns]]
+
+    out = file_ingest.read_sheet(mixed_workbook, columns=columns, reader=engine, use_cache=False)
+
+    pd.testing.assert_frame_equal(out, expected)
+
+
+@pytest.mark.parametrize("engine", file_ingest.available_reader_engines())
+def test_projected_read_honours_nrows(mixed_workbook, engine):
+    expected = pd.read_excel(mixed_workbook, nrows=3)[["Site", "When"]]
+
+    out = file_ingest.read_sheet(mixed_workbook, columns=["Site", "When"], nrows=3, reader=engine, use_cache=False)
+
+    pd.testing.assert_frame_equal(out, expected)
+
+
+def test_reader_engine_selection(tmp_path, monkeypatch):
+    xlsx = tmp_path / "a.xlsx"
+    expected = "calamine" if "calamine" in file_ingest.available_reader_engines() else "openpyxl_stream"
+    assert file_ingest.resolve_reader_engine(xlsx).name == expected
+    assert file_ingest.resolve_reader_engine(tmp_path / "a.xls").name in ("calamine", "default")
+
+    monkeypatch.setattr(file_ingest, "_reader_engine", "default")
+    assert file_ingest.resolve_reader_engine(xlsx).name == "default"
+    assert file_ingest.resolve_reader_engine(xlsx, "openpyxl_stream").name == "openpyxl_stream"
+
+    with pytest.raises(ValueError, match="Unknown reader engine"):
+        file_ingest.configure_reader_engine("turbo")
+
+    monkeypatch.setattr(file_ingest, "READER_ENGINES", dict(file_ingest.READER_ENGINES))
+    monkeypatch.setattr(file_ingest, "AUTO_ENGINE_ORDER", list(file_ingest.AUTO_ENGINE_ORDER))
+    monkeypatch.setattr(file_ingest, "_reader_engine", "auto")
+    file_ingest.register_reader_engine(
+        file_ingest.ReaderEngine("fast", lambda *a: None, (".xlsx",)), prefer=True
+    )
+    assert file_ingest.resolve_reader_engine(xlsx).name == "fast"
+
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from ingestion.manifest import IngestionManifest
+
+
+def test_unchanged_files_are_skipped_until_modified(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    study_file = tmp_path / "Study 1_SAE Dashboard.xlsx"
+    study_file.write_bytes(b"v1")
+
+    manifest = IngestionManifest.load(manifest_path)
+    fp = manifest.fingerprint(study_file)
+    assert not manifest.should_skip(fp, "sae_events")
+
+    with manifest.track(fp, "sae_events") as outcome:
+        outcome.rows = 3
+
+    # New process: unchanged file is skipped for that table only
+    rerun = IngestionManifest.load(manifest_path)
+    fp = rerun.fingerprint(study_file)
+    assert rerun.should_skip(fp, "sae_events")
+    assert not rerun.should_skip(fp, "missing_pages_events")
+    assert not rerun.should_skip(fp, "sae_events", force=True)
+    assert (rerun.stats.skipped_files, rerun.stats.skipped_bytes) == (1, 2)
+
+    # Same size, new content and mtime → re-hashed and re-processed
+    study_file.write_bytes(b"v2")
+    st = study_file.stat()
+    os.utime(study_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert not rerun.should_skip(rerun.fingerprint(study_file), "sae_events")
+
+
+def test_failed_ingest_is_retried(tmp_path):
+    manifest = IngestionManifest.load(tmp_path / "manifest.json")
+    study_file = tmp_path / "Study 1_CPID_EDC_Metrics.xlsx"
+    study_file.write_bytes(b"data")
+    fp = manifest.fingerprint(study_file)
+
+    with pytest.raises(RuntimeError):
+        with manifest.track(fp, "cpid_metric_snapshots"):
+            raise RuntimeError("Supabase down")
+
+    rerun = IngestionManifest.load(tmp_path / "manifest.json")
+    entry = rerun.files[fp.path]["tables"]["cpid_metric_snapshots"]
+    assert entry["status"] == "failed"
+    assert not rerun.should_skip(rerun.fingerprint(study_file), "cpid_metric_snapshots")
+
+
+def test_records_are_written_in_one_save(tmp_path, monkeypatch):
+    manifest = IngestionManifest.load(tmp_path / "manifest.json")
+    saves = []
+    save = manifest.save
+    monkeypatch.setattr(manifest, "save", lambda: saves.append(1) or save())
+
+    for i in range(50):
+        study_file = tmp_path / f"Study {i}_SAE Dashboard.xlsx"
+        study_file.write_bytes(b"x")
+        manifest.record(manifest.fingerprint(study_file), "sae_events", status="success", rows=i)
+
+    assert not saves and not manifest.path.exists()
+    manifest.flush()
+    manifest.flush()
+    assert len(saves) == 1
+    assert len(IngestionManifest.load(manifest.path).files) == 50
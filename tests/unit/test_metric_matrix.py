@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from ingestion.cpid_extractor import extract_cpid_metrics
+from storage.cache.metric_matrix import MetricMatrix, MetricMatrixCache
+
+
+def test_matrix_queries_match_long_format(cpid_workbook, tmp_path):
+    snapshots = extract_cpid_metrics(str(cpid_workbook))
+    prefix = "cpmd__page_status__bucket_"
+
+    matrix = MetricMatrixCache(tmp_path).get("Study 1", snapshots, fingerprint="snapshot-1")
+    assert isinstance(matrix.values, np.memmap)
+    assert matrix.shape == (snapshots["entity_id"].nunique(), snapshots["metric_name"].nunique())
+
+    buckets = snapshots[snapshots["metric_name"].str.startswith(prefix)]
+    expected_sums = buckets.groupby("entity_id")["metric_value"].sum()
+    threshold = expected_sums.median()
+
+    hits = matrix.subjects_where(prefix=prefix, above=threshold)
+    assert sorted(hits["entity_id"]) == sorted(expected_sums[expected_sums > threshold].index)
+
+    per_site = matrix.site_reduce(prefix=prefix, how="sum")
+    expected_site = buckets.pivot_table(
+        index="site_id", columns="metric_name", values="metric_value", aggfunc="sum"
+    )
+    pd.testing.assert_frame_equal(
+        per_site.loc[expected_site.index, expected_site.columns],
+        expected_site,
+        check_names=False,
+        check_dtype=False,
+        rtol=1e-5,
+    )
+
+    counts = matrix.site_reduce(prefix=prefix, how="count")
+    assert counts.to_numpy().sum() == len(buckets)
+
+
+def test_matrix_is_built_once_per_snapshot_file(cpid_workbook, tmp_path, monkeypatch):
+    import os
+
+    import pytest
+
+    from storage import snapshot_files
+
+    snapshots = extract_cpid_metrics(str(cpid_workbook))
+    path = tmp_path / "snapshots.parquet"
+    snapshots.to_parquet(path, index=False)
+    cache = MetricMatrixCache(tmp_path / "matrices")
+
+    reads = []
+    read_snapshot_file = snapshot_files.read_snapshot_file
+    monkeypatch.setattr(
+        snapshot_files, "read_snapshot_file", lambda *a, **kw: reads.append(a) or read_snapshot_file(*a, **kw)
+    )
+
+    first = cache.get("Study 1", path)
+    built = sorted(tmp_path.rglob("values.npy"))
+    again = cache.get("Study 1", path)
+    # A hit neither re-reads the snapshot nor rewrites the matrix
+    assert len(reads) == 1
+    assert sorted(tmp_path.rglob("values.npy")) == built
+    assert [p.stat().st_mtime_ns for p in built] == [p.stat().st_mtime_ns for p in sorted(tmp_path.rglob("values.npy"))]
+    np.testing.assert_array_equal(np.asarray(first.values), np.asarray(again.values))
+
+    # A rewritten snapshot file replaces the study's previous matrix
+    changed = snapshots.assign(metric_value=snapshots["metric_value"] + 1)
+    changed.to_parquet(path, index=False)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    updated = cache.get("Study 1", path)
+    assert len(list(tmp_path.rglob("values.npy"))) == 1
+    assert np.nanmax(updated.values) == np.nanmax(first.values) + 1
+    assert cache.studies() == ["Study 1"]
+
+    rebuilt = MetricMatrix.build(changed)
+    np.testing.assert_array_equal(rebuilt.values, np.asarray(updated.values))
+
+    with pytest.raises(ValueError, match="fingerprint"):
+        cache.get("Study 1", changed)
+
+
+def test_rows_without_keys_are_left_out():
+    snapshots = pd.DataFrame(
+        {
+            "entity_id": ["P1", "P1", None, "P2"],
+            "site_id": ["S1", "S1", "S1", "S2"],
+            "metric_name": ["a", None, "b", "b"],
+            "metric_value": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+    matrix = MetricMatrix.build(snapshots)
+
+    assert matrix.subjects.tolist() == ["P1", "P2"]
+    assert matrix.metric_names.tolist() == ["a", "b"]
+    np.testing.assert_array_equal(matrix.values, [[1.0, np.nan], [np.nan, 4.0]])
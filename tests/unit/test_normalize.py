@@ -0,0 +1,152 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from ingestion.normalize import (
+    DATE_DAY,
+    DATE_ISO,
+    DATE_UTC_TIMESTAMP,
+    NormalizationSpec,
+    compile_spec,
+    normalize_frame,
+)
+from storage.serialization import frame_to_records
+
+
+SPEC = NormalizationSpec(
+    columns=("study_id", "site_id", "subject_id", "visit_date", "seen_at", "logline", "days", "source"),
+    source="Test_Report",
+    column_map={"Site": "site_id", "Site number": "site_id", "Subject": "subject_id", "Visit date": "visit_date"},
+    int_columns=("logline",),
+    float_columns=("days",),
+    date_columns={"visit_date": DATE_ISO, "seen_at": DATE_UTC_TIMESTAMP},
+    require=("subject_id",),
+    require_any=(("visit_date", "days"),),
+)
+
+
+def test_kernel_types_formats_and_guardrails():
+    raw = pd.DataFrame(
+        {
+            "Site": [101, None, "S3", 7.0, 9],
+            "Site number": [None, "S2", None, None, None],
+            "Subject": ["P1", "P2", None, "P4", "P5"],
+            "Visit date": [dt.datetime(2024, 1, 31), "2024-02-01 10:30:00.5", dt.datetime(2024, 3, 1), "junk", None],
+            "seen_at": ["2024-01-31T12:00:00+02:00", None, None, None, None],
+            "logline": [3.9, "4", None, "x", 1],
+            "days": [None, 2, 3, "1.5", None],
+        }
+    )
+
+    out = normalize_frame(raw, SPEC, study_id_override="Study 1")
+
+    assert list(out.columns) == list(SPEC.columns)
+    assert out.dtypes.astype(str).to_dict() == SPEC.dtypes()
+    # P3 has no subject; P5 has neither a visit date nor days
+    assert out["subject_id"].tolist() == ["P1", "P2", "P4"]
+
+    records = frame_to_records(out)
+    assert records[0] == {
+        "study_id": "Study 1",
+        "site_id": "101",
+        "subject_id": "P1",
+        "visit_date": "2024-01-31T00:00:00",
+        "seen_at": "2024-01-31T10:00:00.000000Z",
+        "logline": 3,
+        "days": None,
+        "source": "Test_Report",
+    }
+    # Duplicate headers coalesce; microseconds appear only when non-zero
+    assert records[1]["site_id"] == "S2"
+    assert records[1]["visit_date"] == "2024-02-01T10:30:00.500000"
+    assert (records[2]["site_id"], records[2]["visit_date"], records[2]["logline"], records[2]["days"]) == (
+        "7.0", None, None, 1.5,
+    )
+
+
+def test_missing_columns_and_empty_frames():
+    spec = NormalizationSpec(
+        columns=("subject_id", "projected_date", "n", "source"),
+        source="X",
+        int_columns=("n",),
+        date_columns={"projected_date": DATE_DAY},
+    )
+    raw = pd.DataFrame({"subject_id": ["a"], "projected_date": [pd.Timestamp("2024-05-06 13:00")]})
+
+    out = normalize_frame(raw, spec)
+    assert frame_to_records(out) == [{"subject_id": "a", "projected_date": "2024-05-06", "n": None, "source": "X"}]
+
+    empty = normalize_frame(raw.iloc[:0], spec)
+    assert empty.empty and list(empty.columns) == list(spec.columns)
+    assert empty["n"].dtype == pd.Int64Dtype()
+
+
+def test_extractor_delegates_to_kernel(tmp_path):
+    from ingestion.visit_projection_extractor import extract_visit_projection_events
+
+    path = tmp_path / "Visit Projection Tracker.xlsx"
+    pd.DataFrame(
+        {
+            "Site": ["Site 1", "Site 2", None],
+            "Subject": ["P1", None, "P3"],
+            "Visit": ["Week 2", "Week 4", "Week 8"],
+            "Projected Date": [dt.datetime(2024, 1, 5), dt.datetime(2024, 2, 5), np.nan],
+            "# Days Outstanding": [12, 3, np.nan],
+        }
+    ).to_excel(path, index=False)
+
+    out = extract_visit_projection_events(str(path), study_id_override="Study 9")
+
+    assert frame_to_records(out) == [
+        {
+            "study_id": "Study 9",
+            "site_id": "Site 1",
+            "subject_id": "P1",
+            "visit_name": "Week 2",
+            "projected_date": "2024-01-05",
+            "days_outstanding": 12,
+            "source": "Visit_Projection",
+        },
+        {
+            "study_id": "Study 9",
+            "site_id": None,
+            "subject_id": "P3",
+            "visit_name": "Week 8",
+            "projected_date": None,
+            "days_outstanding": None,
+            "source": "Visit_Projection",
+        },
+    ]
+
+
+
+def test_compiled_pipeline_filters_before_converting():
+    spec = NormalizationSpec(
+        columns=("subject_id", "visit_date", "logline", "source"),
+        source="X",
+        column_map={"Subject": "subject_id", "Visit date": "visit_date"},
+        int_columns=("logline",),
+        date_columns={"visit_date": DATE_ISO},
+        require=("subject_id",),
+    )
+    unfiltered = NormalizationSpec(**{**spec.__dict__, "require": ()})
+    pipeline = compile_spec(spec)
+    assert pipeline.filter_columns == ("subject_id",)
+    assert "Visit date" in pipeline.source_headers and "Ignored" not in pipeline.source_headers
+
+    # Row 0 is dropped before the date parse, yet its string still fixes
+    # the inferred format (day first) for the survivors
+    raw = pd.DataFrame(
+        {
+            "Subject": [None, "P2", None, "P4"],
+            "Visit date": ["13/01/2024", "02/03/2024", "01/15/2024", "junk"],
+            "logline": ["1", 2.5, None, "x"],
+            "Ignored": ["a", "b", "c", "d"],
+        }
+    )
+
+    full = compile_spec(unfiltered)(raw)
+    expected = full[full["subject_id"].notna()]
+    pd.testing.assert_frame_equal(pipeline(raw), expected)
+    assert pipeline(raw)["visit_date"].tolist()[0] == "2024-03-02T00:00:00"
@@ -0,0 +1,205 @@
+from ingestion.cpid_extractor import extract_cpid_metrics
+from ingestion.discovery import classify_file, discover_study_files
+from ingestion.manifest import IngestionManifest
+from ingestion.orchestrator import SpilledFrames, _extract_stream_task, run_ingestion
+from ingestion.parallel import iter_spill_frames
+
+
+def test_classification_matches_legacy_runner_patterns():
+    assert [s.name for s in classify_file("Study 1_CPID_EDC_Metrics.xlsx")] == ["cpid"]
+    assert [s.name for s in classify_file("Study 4_Missing LNR.xlsx")] == ["missing_lab_ranges"]
+    assert [s.name for s in classify_file("Study 2_eSAE Dashboard.xls")] == ["sae"]
+    # .xls is only picked up for the datasets whose runners scanned it
+    assert classify_file("Study 2_Inactivated pages.xls") == []
+
+
+def test_orchestrator_ingests_tree_once_and_skips_on_rerun(tmp_path, study_tree, fake_supabase):
+    root = study_tree
+    study_ids, files = discover_study_files(root)
+    assert study_ids == ["Study 1", "Study 2", "Study 3"]
+    expected = sum(len(extract_cpid_metrics(str(f.path))) for f in files)
+
+    manifest_path = tmp_path / "manifest.json"
+    report = run_ingestion(
+        root,
+        extract_workers=2,
+        backend="supabase",
+        manifest=IngestionManifest.load(manifest_path),
+    )
+
+    assert not report.failed
+    assert len(fake_supabase.tables["cpid_metric_snapshots"]) == expected
+    per_study = report.totals_by("study_id")
+    assert per_study["Study 2"]["rows"] > per_study["Study 1"]["rows"] > 0
+    assert report.totals_by("table")["cpid_metric_snapshots"]["files"] == 2
+
+    rerun = run_ingestion(
+        root,
+        extract_workers=2,
+        backend="supabase",
+        manifest=IngestionManifest.load(manifest_path),
+    )
+    assert rerun.manifest_stats.skipped_files == 2
+    assert len(fake_supabase.tables["cpid_metric_snapshots"]) == expected
+
+
+def test_multi_sheet_report_workbook_feeds_every_table(tmp_path, study_tree, fake_supabase):
+    import pandas as pd
+
+    path = study_tree / "Study 1" / "Study 1_Missing Pages.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(
+            {"SubjectName": ["P1", "P2", None], "FormName": ["AE", "VS", "CM"], "No. #Days Page Missing": [3, 5, 8]}
+        ).to_excel(writer, sheet_name="Missing Pages", index=False)
+        pd.DataFrame(
+            {"Site": ["S1"], "Subject": ["P1"], "Visit": ["Week 2"], "Projected Date": ["2024-01-05"]}
+        ).to_excel(writer, sheet_name="Projection", index=False)
+
+    manifest_path = tmp_path / "manifest.json"
+    report = run_ingestion(
+        study_tree,
+        datasets=["missing_pages", "visit_projection"],
+        extract_workers=1,
+        backend="supabase",
+        manifest=IngestionManifest.load(manifest_path),
+    )
+
+    assert not report.failed
+    assert sorted((r.dataset, r.rows) for r in report.results) == [("missing_pages", 2), ("visit_projection", 1)]
+    assert len(fake_supabase.tables["missing_pages_events"]) == 2
+    assert fake_supabase.tables["visit_projection_events"][0]["subject_id"] == "P1"
+
+    rerun = run_ingestion(
+        study_tree,
+        datasets=["missing_pages", "visit_projection"],
+        extract_workers=1,
+        backend="supabase",
+        manifest=IngestionManifest.load(manifest_path),
+    )
+    assert rerun.manifest_stats.skipped_files == 1
+    assert len(fake_supabase.tables["visit_projection_events"]) == 1
+
+
+def test_dry_run_leaves_manifest_untouched(tmp_path, study_tree, fake_supabase):
+    manifest_path = tmp_path / "manifest.json"
+
+    dry = run_ingestion(
+        study_tree,
+        extract_workers=1,
+        backend="supabase",
+        dry_run=True,
+        spool=True,
+        manifest=IngestionManifest.load(manifest_path),
+    )
+    assert not dry.failed and dry.totals_by("table")["cpid_metric_snapshots"]["files"] == 2
+    assert not fake_supabase.tables.get("cpid_metric_snapshots")
+
+    real = run_ingestion(
+        study_tree,
+        extract_workers=1,
+        backend="supabase",
+        manifest=IngestionManifest.load(manifest_path),
+    )
+    assert real.manifest_stats.skipped_files == 0
+    assert real.totals_by("table")["cpid_metric_snapshots"]["files"] == 2
+
+
+def test_cpid_jobs_return_spilled_batches_not_frames(tmp_path, make_cpid_workbook):
+    path = tmp_path / "Study 1_CPID_EDC_Metrics.xlsx"
+    make_cpid_workbook(path, n_subjects=300)
+    expected = extract_cpid_metrics(str(path))
+
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+
+    frames, _ = _extract_stream_task("cpid", str(path), "Study 1", str(spill_dir))
+
+    spilled = frames["cpid"]
+    assert isinstance(spilled, SpilledFrames)
+    assert spilled.rows == len(expected)
+    assert len(spilled.paths) == -(-len(expected) // 1000)
+    batches = list(iter_spill_frames(spilled.paths))
+    assert max(len(batch) for batch in batches) == 1000
+    assert sum(batch["metric_value"].sum() for batch in batches) == expected["metric_value"].sum()
+
+
+def test_changes_only_writes_the_delta_since_the_last_snapshot(tmp_path, study_tree, fake_supabase):
+    from openpyxl import load_workbook
+
+    def run():
+        return run_ingestion(
+            study_tree,
+            datasets=["cpid"],
+            force=True,
+            extract_workers=1,
+            backend="supabase",
+            manifest=IngestionManifest.load(tmp_path / "manifest.json"),
+            changes_only=True,
+            snapshot_dir=tmp_path / "last",
+        )
+
+    first = run()
+    written = len(fake_supabase.tables["cpid_metric_snapshots"])
+    assert written == sum(r.rows for r in first.results) == sum(
+        len(extract_cpid_metrics(str(path))) for path in study_tree.glob("*/*.xlsx")
+    )
+
+    # Nothing changed: nothing is sent
+    assert sum(r.rows for r in run().results) == 0
+    assert len(fake_supabase.tables["cpid_metric_snapshots"]) == written
+
+    path = study_tree / "Study 1" / "Study 1_CPID_EDC_Metrics.xlsx"
+    wb = load_workbook(path)
+    wb.worksheets[0]["H3"] = 999
+    wb.save(path)
+
+    third = run()
+    assert sum(r.rows for r in third.results) == 1
+    assert fake_supabase.tables["cpid_metric_snapshots"][-1]["metric_value"] == 999
+
+
+def test_keyed_writes_need_the_row_key_migration(tmp_path, study_tree, fake_supabase):
+    import pytest
+
+    fake_supabase.missing_columns["cpid_metric_snapshots"] = {"row_key"}
+
+    with pytest.raises(RuntimeError, match="migrate_row_keys.py"):
+        run_ingestion(
+            study_tree,
+            extract_workers=1,
+            backend="supabase",
+            manifest=IngestionManifest.load(tmp_path / "manifest.json"),
+        )
+    assert not fake_supabase.requests
+
+    report = run_ingestion(
+        study_tree,
+        extract_workers=1,
+        backend="supabase",
+        write_mode="insert",
+        manifest=IngestionManifest.load(tmp_path / "manifest.json"),
+    )
+    assert not report.failed
+
+
+def test_expected_dataset_without_a_frame_is_recorded_as_failed(tmp_path, study_tree, fake_supabase, monkeypatch):
+    import pandas as pd
+
+    from ingestion import orchestrator
+
+    path = study_tree / "Study 1" / "Study 1_Missing Pages.xlsx"
+    pd.DataFrame({"SubjectName": ["P1"], "FormName": ["AE"]}).to_excel(path, index=False)
+
+    # Runs in the parent: the job's extraction returns nothing for its dataset
+    monkeypatch.setattr(
+        orchestrator, "ProcessPoolExecutor", lambda max_workers, mp_context: orchestrator.ThreadPoolExecutor(max_workers)
+    )
+    monkeypatch.setattr(orchestrator, "_extract_workbook_task", lambda *args: ({}, 0.0))
+    manifest = IngestionManifest.load(tmp_path / "manifest.json")
+
+    report = run_ingestion(
+        study_tree, datasets=["missing_pages"], extract_workers=1, backend="supabase", manifest=manifest
+    )
+
+    assert [(r.dataset, r.status) for r in report.results] == [("missing_pages", "failed")]
+    assert "no rows" in report.failed[0].error
@@ -0,0 +1,65 @@
+import pytest
+
+from ingestion.cpid_extractor import extract_cpid_metrics
+from ingestion.discovery import discover_study_files
+from ingestion.parallel import ExtractionPool, ExtractionTask, read_spill
+
+
+@pytest.mark.parametrize("spill_format", ["ipc", "parquet"])
+def test_pool_spills_results_and_recycles_workers_over_rss_cap(tmp_path, study_tree, spill_format):
+    _, files = discover_study_files(study_tree, ["cpid"])
+    tasks = [
+        ExtractionTask(i, "cpid", str(f.path), f.study_id, {"study_folder": f.study_id})
+        for i, f in enumerate(files)
+    ]
+    tasks.append(ExtractionTask(len(tasks), "cpid", str(tmp_path / "missing.xlsx"), "Study 9"))
+
+    # A 1-byte ceiling recycles the worker after every task
+    pool = ExtractionPool(tmp_path / "spill", workers=2, max_worker_rss_bytes=1, spill_format=spill_format)
+    results = sorted(pool.run(tasks), key=lambda r: r.task.task_id)
+
+    assert [r.error is None for r in results] == [True, True, False]
+    assert pool.recycled == 3
+
+    for task, result in zip(tasks, results[:2]):
+        spilled = read_spill(result.spill_path).to_pandas()
+        expected = extract_cpid_metrics(task.filepath)
+        assert result.rows == len(expected) == len(spilled)
+        assert (spilled["study_folder"] == task.study_id).all()
+        assert spilled["metric_value"].sum() == pytest.approx(expected["metric_value"].sum())
+
+
+def test_pool_returns_with_more_files_than_workers_and_mixed_type_columns(
+    tmp_path, make_cpid_workbook, monkeypatch
+):
+    from openpyxl import load_workbook
+
+    from ingestion import parallel
+
+    # Uneven files: one worker takes its sentinel and exits while the
+    # other is still busy, and the parent polls in between (a clean exit
+    # used to be "replaced" by a worker that never got a sentinel)
+    monkeypatch.setattr(parallel, "_POLL_INTERVAL_S", 0.01)
+    paths = []
+    for i, n_subjects in enumerate((300, 5, 20)):
+        path = tmp_path / f"Study {i}_CPID_EDC_Metrics.xlsx"
+        make_cpid_workbook(path, n_subjects=n_subjects, seed=i)
+        paths.append(path)
+
+    # An Excel int next to "Site N" strings in one object column
+    wb = load_workbook(paths[1])
+    wb.active["D3"] = 101
+    wb.save(paths[1])
+
+    tasks = [ExtractionTask(i, "cpid", str(path), f"Study {i}") for i, path in enumerate(paths)]
+    pool = ExtractionPool(tmp_path / "spill", workers=2)
+    results = sorted(pool.run(tasks), key=lambda r: r.task.task_id)
+
+    assert [r.error for r in results] == [None, None, None]
+    assert (pool.recycled, pool.crashed) == (0, 0)
+
+    spilled = read_spill(results[1].spill_path).to_pandas()
+    expected = extract_cpid_metrics(str(paths[1]))
+    assert len(spilled) == len(expected)
+    assert "101" in set(spilled["site_id"]) and "Site 2" in set(spilled["site_id"])
+    assert spilled["site_id"].isna().sum() == expected["site_id"].isna().sum()
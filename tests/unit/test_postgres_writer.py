@@ -0,0 +1,204 @@
+import struct
+import threading
+
+import pandas as pd
+
+from storage import postgres_writer
+from storage.postgres_writer import (
+    PGCOPY_HEADER,
+    PGCOPY_TRAILER,
+    copy_dataframe,
+    copy_stream,
+    encode_copy_chunks,
+)
+
+
+class FakeCursor:
+    """Captures executed SQL and drains COPY payloads in small reads."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        self.conn.params.append(params)
+        if sql.startswith("SELECT attname"):
+            self._result = list(self.conn.column_types.items())
+        elif sql.startswith("INSERT INTO"):
+            self.rowcount = self.conn.merge_rowcount
+
+    def fetchall(self):
+        return self._result
+
+    def copy_expert(self, sql, stream):
+        self.conn.statements.append(sql)
+        payload = b""
+        while chunk := stream.read(64):
+            payload += chunk
+        self.conn.payloads.append(payload)
+        self.rowcount = self.conn.copy_rowcount
+
+
+class FakeConnection:
+    def __init__(self, column_types=None):
+        self.column_types = column_types or {}
+        self.statements = []
+        self.params = []
+        self.payloads = []
+        self.copy_rowcount = 0
+        self.merge_rowcount = 0
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+FRAME = pd.DataFrame(
+    {
+        "entity_id": ["S1", "S2", None],
+        "metric_value": [1.5, None, 3.0],
+        "snapshot_time": pd.to_datetime(["2026-01-01", "2026-01-02", None], utc=True),
+    }
+)
+
+
+def test_csv_copy_streams_all_chunks_in_one_statement():
+    conn = FakeConnection()
+    conn.copy_rowcount = 3
+
+    written = copy_dataframe(FRAME, "cpid_metric_snapshots", copy_format="csv", chunk_rows=2, conn=conn)
+
+    assert written == 3
+    assert conn.statements == [
+        'COPY "cpid_metric_snapshots" ("entity_id", "metric_value", "snapshot_time") '
+        "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    ]
+    lines = conn.payloads[0].decode().splitlines()
+    assert lines[0] == "S1,1.5,2026-01-01T00:00:00.000000+0000"
+    assert lines[2] == "\\N,3.0,\\N"
+
+
+def test_binary_encoding_matches_pgcopy_layout():
+    frame = pd.DataFrame({"entity_id": ["S1", None], "metric_value": [2.0, None]})
+    types = {"entity_id": "text", "metric_value": "double precision"}
+
+    payload = b"".join(encode_copy_chunks([frame], "binary", pg_types=types))
+
+    assert payload.startswith(PGCOPY_HEADER) and payload.endswith(PGCOPY_TRAILER)
+    rows = payload[len(PGCOPY_HEADER):-len(PGCOPY_TRAILER)]
+    assert rows == (
+        struct.pack(">h", 2) + struct.pack(">i", 2) + b"S1" + struct.pack(">id", 8, 2.0)
+        + struct.pack(">h", 2) + struct.pack(">i", -1) + struct.pack(">i", -1)
+    )
+
+
+
+def test_binary_encoding_of_variable_width_and_null_fields():
+    frame = pd.DataFrame({"payload": ['{"a": 1}', None, ""], "flag": [True, None, False]})
+    types = {"payload": "jsonb", "flag": "boolean"}
+
+    payload = b"".join(encode_copy_chunks([frame], "binary", pg_types=types))
+
+    count = struct.pack(">h", 2)
+    assert payload[len(PGCOPY_HEADER):-len(PGCOPY_TRAILER)] == (
+        count + struct.pack(">i", 9) + b'\x01{"a": 1}' + struct.pack(">i?", 1, True)
+        + count + struct.pack(">i", -1) + struct.pack(">i", -1)
+        + count + struct.pack(">i", 1) + b"\x01" + struct.pack(">i?", 1, False)
+    )
+
+def test_keyed_stream_copies_into_staging_and_merges():
+    conn = FakeConnection()
+    conn.copy_rowcount, conn.merge_rowcount = 4, 1
+
+    def source():
+        yield FRAME
+        yield {"entity_id": "S4", "metric_value": 4.0, "snapshot_time": None}
+
+    stats = copy_stream(
+        "cpid_metric_snapshots", source(), copy_format="csv", write_mode="skip_existing", conn=conn
+    )
+
+    assert (stats.rows_read, stats.rows_written, stats.rows_skipped) == (4, 1, 3)
+    staging = conn.statements[0].split()[3]
+    assert staging.startswith("_ctp_copy_stage_")
+    assert conn.statements[1].startswith(f"COPY {staging} (")
+    assert f"FROM {staging} " in conn.statements[2]
+    assert conn.statements[2].endswith('ON CONFLICT ("row_key") DO NOTHING')
+    assert len(conn.payloads[0].decode().splitlines()) == 4
+
+
+def test_concurrent_writers_use_their_own_connection_and_staging_table(monkeypatch):
+    opened = []
+
+    def connect():
+        conn = FakeConnection({"entity_id": "text", "metric_value": "double precision", "row_key": "text"})
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(postgres_writer, "_connect", connect)
+    monkeypatch.setattr(postgres_writer, "_local", threading.local())
+    monkeypatch.setattr(postgres_writer, "_connections", [])
+    barrier = threading.Barrier(4)
+    frame = FRAME[["entity_id", "metric_value"]]
+    errors = []
+
+    def write():
+        barrier.wait()
+        try:
+            for _ in range(2):
+                copy_dataframe(frame, "public.cpid_metric_snapshots", copy_format="binary", write_mode="upsert")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    # One connection (session / transaction) per thread, reused across calls
+    assert len(opened) == 4
+    stagings = [conn.statements[i].split()[3] for conn in opened for i in (0, 4)]
+    assert len(set(stagings)) == 8
+    # The regclass lookup gets the identifier quoted as COPY quotes it
+    assert opened[0].params[1] == ('"public"."cpid_metric_snapshots"',)
+
+
+def test_connections_opened_by_any_thread_are_closed(monkeypatch):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(postgres_writer, "_connect", connect)
+    monkeypatch.setattr(postgres_writer, "_local", threading.local())
+    monkeypatch.setattr(postgres_writer, "_connections", [])
+
+    threads = [threading.Thread(target=postgres_writer.get_postgres_connection) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert postgres_writer.close_postgres_connections() == 3
+    assert all(conn.closed for conn in opened)
+    assert postgres_writer.close_postgres_connections() == 0
@@ -0,0 +1,64 @@
+import datetime as dt
+import os
+import time
+
+import pandas as pd
+
+from ingestion import file_ingest
+from storage.cache.sheet_cache import SheetCache
+
+
+def test_cached_read_matches_excel_parse(cpid_workbook, tmp_path):
+    file_ingest.configure_sheet_cache(cache_dir=tmp_path / "sheets")
+    cache = file_ingest.get_sheet_cache()
+
+    expected = pd.read_excel(cpid_workbook, header=[0, 1])
+
+    first = file_ingest.read_sheet(cpid_workbook, header=[0, 1])
+    second = file_ingest.read_sheet(cpid_workbook, header=[0, 1])
+
+    assert (cache.stats.misses, cache.stats.hits, cache.stats.writes) == (1, 1, 1)
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(second, expected)
+
+    # Different read arguments never share an entry
+    file_ingest.read_sheet(cpid_workbook)
+    assert cache.stats.misses == 2
+
+
+def test_mixed_object_columns_round_trip(tmp_path):
+    cache = SheetCache(tmp_path)
+    df = pd.DataFrame(
+        {
+            "Site": ["Site 1", 1002, None, 3.5, True],
+            "When": [dt.datetime(2025, 1, 2, 3, 4), "unknown", dt.time(1, 2), dt.date(2025, 1, 1), None],
+            "Count": [1, 2, 3, 4, 5],
+        }
+    )
+
+    assert cache.put("k", df)
+    restored = cache.get("k")
+
+    pd.testing.assert_frame_equal(restored, df.where(df.notna(), float("nan")))
+    assert [type(v) for v in restored["Site"]][:2] == [str, int]
+
+
+def test_eviction_by_age_and_size(tmp_path):
+    df = pd.DataFrame({"a": range(1000)})
+
+    cache = SheetCache(tmp_path, max_age_days=1)
+    cache.put("old", df)
+    stale = time.time() - 2 * 86400
+    os.utime(tmp_path / "old.parquet", (stale, stale))
+    cache.put("new", df)
+
+    assert not (tmp_path / "old.parquet").exists()
+    assert cache.get("new") is not None
+
+    entry_size = (tmp_path / "new.parquet").stat().st_size
+    small = SheetCache(tmp_path, max_bytes=entry_size)
+    small.put("newer", df)
+
+    assert small.stats.evictions == 1
+    assert small.get("new") is None
+    assert small.get("newer") is not None
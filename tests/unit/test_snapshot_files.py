@@ -0,0 +1,80 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from ingestion.cpid_extractor import extract_cpid_metrics
+from storage.dimensions import NULL_ID, SNAPSHOT_DIMENSIONS, DimensionRegistry
+from storage.snapshot_files import CPID_SNAPSHOT_SCHEMA, SnapshotParquetWriter, read_snapshot_file
+
+
+def test_streams_one_row_group_per_study_with_registry(study_tree, tmp_path):
+    frames = []
+    for workbook in sorted(study_tree.glob("*/*.xlsx")):
+        df = extract_cpid_metrics(str(workbook))
+        df["study_folder"] = workbook.parent.name
+        frames.append(df)
+
+    path = tmp_path / "snapshots.parquet"
+    with SnapshotParquetWriter(path) as writer:
+        for df in frames:
+            writer.write(df)
+
+    metadata = pq.ParquetFile(path).metadata
+    assert metadata.num_row_groups == 2
+    assert pq.read_schema(path).field("metric_name").type == CPID_SNAPSHOT_SCHEMA.field("metric_name").type
+
+    expected = pd.concat(frames, ignore_index=True)
+    result = read_snapshot_file(path)
+    assert len(result) == writer.rows_written == len(expected)
+    assert result["metric_value"].tolist() == expected["metric_value"].tolist()
+    assert result["entity_id"].tolist() == expected["entity_id"].astype(str).tolist()
+
+    assert writer.metric_registry()["metric_name"].tolist() == sorted(expected["metric_name"].unique())
+
+
+def test_writer_stores_registry_ids_and_reader_decodes_them(study_tree, tmp_path):
+    dimensions_path = tmp_path / "dimensions.json"
+    frames = [extract_cpid_metrics(str(workbook)) for workbook in sorted(study_tree.glob("*/*.xlsx"))]
+    frames[0].loc[0, "site_id"] = None
+
+    path = tmp_path / "snapshots.parquet"
+    with DimensionRegistry.transaction(dimensions_path) as dimensions:
+        with SnapshotParquetWriter(path, dimensions=dimensions) as writer:
+            for df in frames:
+                writer.write(df)
+
+    schema = pq.read_schema(path)
+    for column in SNAPSHOT_DIMENSIONS:
+        assert schema.field(column).type == pa.int32()
+    assert pa.types.is_dictionary(schema.field("snapshot_time").type)
+
+    # The IDs in the file are the persisted registry's
+    registry = DimensionRegistry.load(dimensions_path)
+    expected = pd.concat(frames, ignore_index=True)
+    ids = read_snapshot_file(path, decode=False)
+    assert ids["metric_name"].tolist() == registry.dimension("metric_name").encode(expected["metric_name"]).tolist()
+    assert ids.loc[0, "site_id"] == NULL_ID
+
+    result = read_snapshot_file(path, dimensions=registry)
+    assert result["entity_id"].tolist() == expected["entity_id"].astype(str).tolist()
+    assert result["metric_name"].tolist() == expected["metric_name"].tolist()
+    assert pd.isna(result.loc[0, "site_id"])
+    assert result["snapshot_time"].tolist() == expected["snapshot_time"].astype(str).tolist()
+    assert writer.metric_registry()["metric_name"].tolist() == sorted(expected["metric_name"].unique())
+
+    with pytest.raises(ValueError, match="registry IDs"):
+        read_snapshot_file(path)
+
+
+def test_failed_run_leaves_no_partial_file(tmp_path):
+    path = tmp_path / "snapshots.parquet"
+    df = pd.DataFrame({"entity_id": [101, None], "metric_name": ["a", "b"], "metric_value": ["1", "x"]})
+
+    with pytest.raises(RuntimeError):
+        with SnapshotParquetWriter(path) as writer:
+            writer.write(df)
+            raise RuntimeError("extraction failed")
+
+    assert not path.exists()
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from storage.snapshot_history import SnapshotHistory
+
+
+def _run(values: dict, snapshot_time: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {
+                "entity_type": "subject",
+                "entity_id": entity_id,
+                "site_id": "S01",
+                "metric_name": "cpmd__missing_visits",
+                "metric_value": value,
+                "snapshot_time": snapshot_time,
+                "source": "CPID_EDC_Metrics",
+            }
+            for entity_id, value in values.items()
+        ]
+    )
+
+
+def _values(df: pd.DataFrame) -> dict:
+    return dict(zip(df["entity_id"], df["metric_value"]))
+
+
+def test_deltas_store_only_changes_and_rebuild_any_run(tmp_path):
+    history = SnapshotHistory(tmp_path, checkpoint_every=None)
+    runs = [
+        ({f"P{i:03d}": float(i) for i in range(100)}, "2026-01-01T00:00:00Z"),
+        ({**{f"P{i:03d}": float(i) for i in range(100)}, "P005": 50.0}, "2026-01-02T00:00:00Z"),
+        ({f"P{i:03d}": float(i) for i in range(1, 101)}, "2026-01-03T00:00:00Z"),
+        ({f"P{i:03d}": float(i) for i in range(1, 101)}, "2026-01-04T00:00:00Z"),
+    ]
+
+    stats = [history.record(_run(values, at), study="Study 1") for values, at in runs]
+
+    assert (stats[0].added, stats[0].changed, stats[0].deleted) == (100, 0, 0)
+    assert (stats[1].added, stats[1].changed, stats[1].unchanged) == (0, 1, 99)
+    # P005 reverts, P000 disappears, P100 appears
+    assert (stats[2].added, stats[2].changed, stats[2].deleted) == (1, 1, 1)
+    # Identical run writes nothing
+    assert stats[3].delta_path is None and len(history.runs("Study 1")) == 3
+
+    for values, at in runs:
+        assert _values(history.as_of("Study 1", at)) == values
+    assert history.as_of("Study 1", "2025-12-31").empty
+    assert _values(history.as_of("Study 1", "2026-01-02T12:00:00Z"))["P005"] == 50.0
+
+
+def test_checkpoints_and_compaction_preserve_as_of_reads(tmp_path):
+    history = SnapshotHistory(tmp_path, checkpoint_every=3)
+    expected = {}
+    for day in range(1, 8):
+        values = {f"P{i}": float(i * day if i == day else i) for i in range(10)}
+        at = f"2026-01-0{day}T00:00:00Z"
+        history.record(_run(values, at), study="Study 1")
+        expected[at] = values
+
+    study_dir = history.study_dir("Study 1")
+    assert len(list(study_dir.glob("base-*.parquet"))) >= 2
+
+    removed = history.compact("Study 1", keep_before="2026-01-05T00:00:00Z")
+    assert removed > 0
+
+    for at, values in expected.items():
+        if at >= "2026-01-05":
+            assert _values(history.as_of("Study 1", at)) == values
+    assert _values(history.as_of("Study 1")) == expected["2026-01-07T00:00:00Z"]
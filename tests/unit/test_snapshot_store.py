@@ -0,0 +1,65 @@
+import pandas as pd
+
+from storage.snapshot_store import ScanStats, SnapshotStore
+
+
+def _snapshots(study: str, snapshot_time: str, sites=("S01", "S02", "S03"), metrics=("m_a", "m_b")) -> pd.DataFrame:
+    rows = [
+        {
+            "entity_type": "subject",
+            "entity_id": f"{study}-{site}-{i}",
+            "site_id": site,
+            "metric_name": metric,
+            "metric_value": float(i),
+            "snapshot_time": snapshot_time,
+            "source": "CPID_EDC_Metrics",
+        }
+        for site in sites
+        for metric in metrics
+        for i in range(50)
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_filters_prune_partitions_and_row_groups(tmp_path):
+    store = SnapshotStore(tmp_path, row_group_rows=50)
+    for study in ["Study 1", "Study 2"]:
+        for day in ["2026-01-01T08:00:00+00:00", "2026-01-02T08:00:00+00:00"]:
+            store.append(_snapshots(study, day), study=study)
+
+    assert (tmp_path / "study=Study%201" / "snapshot_date=2026-01-02").is_dir()
+    assert len(store.read()) == 2 * 2 * 300
+
+    stats = ScanStats()
+    df = store.read(
+        studies="Study 1",
+        sites=["S02"],
+        metrics="m_b",
+        start="2026-01-02",
+        stats=stats,
+    )
+
+    assert len(df) == 50
+    assert set(df["study"]) == {"Study 1"} and set(df["site_id"]) == {"S02"}
+    assert (df["snapshot_time"] >= pd.Timestamp("2026-01-02", tz="UTC")).all()
+    # One partition file opened, and only the one matching row group decoded
+    assert stats.files == 1
+    assert stats.row_groups_total == 6 and stats.row_groups_read == 1
+
+
+def test_compaction_merges_small_files_without_changing_results(tmp_path):
+    store = SnapshotStore(tmp_path)
+    for run in range(3):
+        store.append(_snapshots("Study 1", f"2026-01-01T0{run}:00:00Z"), study="Study 1")
+
+    before = store.read().sort_values(["snapshot_time", "entity_id", "metric_name"], ignore_index=True)
+
+    stats = store.compact()
+    assert (stats.partitions, stats.files_before, stats.files_after) == (1, 3, 1)
+    assert len(list(tmp_path.rglob("*.parquet"))) == 1
+
+    after = store.read().sort_values(["snapshot_time", "entity_id", "metric_name"], ignore_index=True)
+    pd.testing.assert_frame_equal(before, after)
+
+    window = store.read(start="2026-01-01T01:00:00Z", end="2026-01-01T02:00:00Z", columns=["metric_value"])
+    assert list(window.columns) == ["metric_value"] and len(window) == 300
@@ -0,0 +1,170 @@
+import textwrap
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import file_ingest
+from ingestion.discovery import DATASETS, classify_file
+from ingestion.sources import (
+    classify_sheet,
+    extract_workbook,
+    get_source,
+    get_sources,
+    load_source_specs,
+    source_from_dict,
+)
+from storage.serialization import frame_to_records
+
+
+def test_checked_in_sources_register_as_datasets():
+    sources = get_sources()
+    assert set(sources) == set(DATASETS) - {"cpid"}
+    assert DATASETS["missing_pages"].write_options == {"adaptive": True}
+    assert [s.name for s in classify_file("Study 3_Missing_Lab_Name_and_Missing_Ranges.xlsx")] == [
+        "missing_lab_ranges"
+    ]
+    assert [s.name for s in classify_file("Study 5_WHODD Coding Report.xlsx")] == ["coding_whodrug"]
+    assert classify_file("Study 5_WHODD Coding Report.xls") == []
+
+
+def test_new_report_type_needs_only_yaml(tmp_path):
+    (tmp_path / "query_aging.yaml").write_text(
+        textwrap.dedent(
+            """
+            name: query_aging
+            label: Query Aging
+            table: query_aging_events
+            source: Query_Aging
+            match:
+              regex: 'query[_\\s]*aging'
+            suffixes: [.xlsx]
+            columns:
+              study_id: text
+              subject_id: text
+              opened: date:day
+              age_days: int
+              source: text
+            column_map:
+              Subject: subject_id
+              Subject Name: subject_id
+              Opened On: opened
+              Age: age_days
+            require: [subject_id]
+            """
+        )
+    )
+    source = load_source_specs(tmp_path)["query_aging"]
+    assert source.matches("Study 7_Query Aging.xlsx")
+
+    path = tmp_path / "Study 7_Query_Aging.xlsx"
+    pd.DataFrame(
+        {
+            "Subject Name": [None, "P2", None],
+            "Subject": ["P1", None, None],
+            "Opened On": ["2024-01-05", "2024-02-06", "2024-03-07"],
+            "Age": [3.5, np.nan, 9],
+            "Unused": [1, 2, 3],
+        }
+    ).to_excel(path, index=False)
+
+    assert frame_to_records(source.extract(str(path), "Study 7")) == [
+        {"study_id": "Study 7", "subject_id": "P1", "opened": "2024-01-05", "age_days": 3, "source": "Query_Aging"},
+        {"study_id": "Study 7", "subject_id": "P2", "opened": "2024-02-06", "age_days": None, "source": "Query_Aging"},
+    ]
+
+
+def test_invalid_specs_are_rejected():
+    base = {"name": "x", "table": "x_events", "source": "X", "match": {"keywords": ["x"]}}
+    with pytest.raises(ValueError, match="unknown type"):
+        source_from_dict({**base, "columns": {"a": "decimal"}})
+    with pytest.raises(ValueError, match="not output columns"):
+        source_from_dict({**base, "columns": {"a": "text"}, "require": ["b"]})
+    with pytest.raises(ValueError, match="missing keys"):
+        source_from_dict({"name": "x"})
+
+
+def test_multi_sheet_workbook_is_opened_once_and_dispatched(tmp_path, monkeypatch):
+    path = tmp_path / "Study 8_Missing Pages.xlsx"
+    coding = pd.DataFrame(
+        {
+            "Study": ["Study 8"] * 3,
+            "Subject": ["P1", None, "P3"],
+            "Dictionary": ["X", "X", "X"],
+            "Dictionary Version number": ["26.0"] * 3,
+            "Form OID": ["AE", "CM", "AE"],
+            "Logline": [1, 2, 3],
+            "Field OID": ["AETERM"] * 3,
+            "Coding Status": ["Coded", "Coded", "Not coded"],
+            "Require Coding": ["Yes"] * 3,
+        }
+    )
+    sheets = {
+        "Notes": pd.DataFrame({"Comment": ["exported 2024-05-01"]}),
+        "MedDRA": coding.assign(Dictionary="MedDRA"),
+        "Report": pd.DataFrame(
+            {
+                "SiteNumber": [1, 2],
+                "SubjectName": ["P1", "P2"],
+                "FolderName": ["Week 2", "Week 4"],
+                "Visit date": ["2024-01-05", "2024-02-06"],
+                "FormName": ["AE", "VS"],
+                "No. #Days Page Missing": [3, 12.5],
+                "Unused": ["a", "b"],
+            }
+        ),
+        "WHODD": coding.assign(Dictionary="WHODrug"),
+    }
+    with pd.ExcelWriter(path) as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+
+    # MedDRA and WHODrug share a contract: the sheet name breaks the tie
+    header = list(coding.columns)
+    assert classify_sheet(header, names=("MedDRA", path.name)).name == "coding_meddra"
+    assert classify_sheet(header, names=("WHODD",)).name == "coding_whodrug"
+    assert classify_sheet(header, names=("Sheet1",)) is None
+    assert classify_sheet(["Comment"]) is None
+
+    opened = []
+    engine = file_ingest.READER_ENGINES["openpyxl_stream"]
+    counting = file_ingest.ReaderEngine("counting", lambda p: opened.append(p) or engine.open(p), (".xlsx",))
+    monkeypatch.setitem(file_ingest.READER_ENGINES, "counting", counting)
+    monkeypatch.setattr(file_ingest, "_reader_engine", "counting")
+    monkeypatch.setattr(file_ingest, "_sheet_cache_enabled", False)
+
+    frames = extract_workbook(path, "Study 8", expected=["missing_pages"])
+
+    assert len(opened) == 1
+    assert list(frames) == ["missing_pages", "coding_meddra", "coding_whodrug"]
+    for name, sheet in (("missing_pages", "Report"), ("coding_meddra", "MedDRA"), ("coding_whodrug", "WHODD")):
+        expected = get_source(name).normalize(pd.read_excel(path, sheet_name=sheet), "Study 8")
+        pd.testing.assert_frame_equal(frames[name], expected)
+    assert frames["coding_whodrug"]["dictionary"].tolist() == ["WHODrug", "WHODrug"]
+
+    # A file-name match no sheet fits still reads the first sheet, as
+    # SourceSpec.extract does
+    assert extract_workbook(path, "Study 8", sources=["sae"], expected=["sae"])["sae"].empty
+
+
+def test_weak_header_match_never_feeds_an_undeclared_table(tmp_path):
+    # Site / Subject / Visit alone reach visit projection's classification
+    # threshold, but the file name declares a Missing LNR report
+    path = tmp_path / "Study9_Missing_LNR.xlsx"
+    pd.DataFrame(
+        {"Site number": ["S1", "S2"], "Subject": ["P1", "P2"], "Visit": ["W2", "W4"], "Test Name": ["ALT", "AST"]}
+    ).to_excel(path, index=False)
+
+    header = ["Site number", "Subject", "Visit", "Test Name"]
+    assert classify_sheet(header).name == "visit_projection"
+
+    frames = extract_workbook(path, "Study 9", expected=["missing_lab_ranges"])
+    assert list(frames) == ["missing_lab_ranges"]
+    assert frames["missing_lab_ranges"]["test_name"].tolist() == ["ALT", "AST"]
+
+    # Nor does a second sheet with the same weak match
+    with pd.ExcelWriter(path, mode="a") as writer:
+        pd.DataFrame({"Site": ["S1"], "Subject": ["P1"], "Visit": ["W2"]}).to_excel(
+            writer, sheet_name="Visits", index=False
+        )
+    assert list(extract_workbook(path, "Study 9", expected=["missing_lab_ranges"])) == ["missing_lab_ranges"]
@@ -0,0 +1,113 @@
+import threading
+
+from storage.spool import (
+    CircuitBreaker,
+    RetryPolicy,
+    SpoolDrainer,
+    WriteSpool,
+    spooled_writes,
+)
+
+
+def _rows(batch: int) -> list:
+    return [{"entity_id": f"S{batch:02d}-{i}", "metric_value": float(i)} for i in range(3)]
+
+
+def test_drainer_retries_through_outage_and_delivers_in_order(tmp_path):
+    delivered = []
+    calls = {"n": 0}
+    lock = threading.Lock()
+
+    def flaky_send(table_name, rows, write_mode):
+        with lock:
+            calls["n"] += 1
+            if calls["n"] in (2, 3, 4):
+                raise ConnectionError("backend down")
+            delivered.append(rows[0]["entity_id"])
+
+    retry = RetryPolicy(base_delay_s=0.001, jitter=0)
+    with spooled_writes(
+        tmp_path, send=flaky_send, retry=retry, fsync_batches=2, segment_max_bytes=400
+    ) as spool:
+        for batch in range(10):
+            spool.append("cpid_metric_snapshots", _rows(batch), write_mode="skip_existing")
+
+    assert delivered == [f"S{batch:02d}-0" for batch in range(10)]
+    assert WriteSpool(tmp_path).pending() == 0
+    # Rotated segments are removed once acknowledged
+    assert len(list(tmp_path.glob("*.seg"))) <= 2
+
+
+def test_restart_resumes_after_last_acknowledged_batch(tmp_path):
+    spool = WriteSpool(tmp_path)
+    for batch in range(5):
+        spool.append("sae_events", _rows(batch))
+    spool.flush()
+
+    position = spool.acknowledged
+    for _ in range(2):
+        position, _ = spool.read_next(position)
+        spool.acknowledge(position)
+    spool.close()
+
+    # Simulate a crash mid-append: torn line at the end of the segment
+    segment = sorted(tmp_path.glob("*.seg"))[-1]
+    with open(segment, "ab") as f:
+        f.write(b'{"table":"sae_events","rows":[{"entity')
+
+    replayed = []
+    drainer = SpoolDrainer(WriteSpool(tmp_path), lambda t, rows, m: replayed.append(rows[0]["entity_id"]))
+    drainer.start()
+    assert drainer.stop(drain=True, timeout=5)
+
+    assert replayed == ["S02-0", "S03-0", "S04-0"]
+
+
+def test_circuit_breaker_opens_then_probes():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=10, clock=lambda: now[0])
+
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.state == "half_open"
+    breaker.record_failure()  # failed probe re-opens immediately
+    assert breaker.state == "open" and breaker.retry_after() == 10
+
+    now[0] = 20.0
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.trips == 1
+
+
+def test_exit_during_outage_returns_and_keeps_batches(tmp_path):
+    def down(table_name, rows, write_mode):
+        raise ConnectionError("backend down")
+
+    # Retries never give up on their own; only the drain timeout ends the wait
+    retry = RetryPolicy(base_delay_s=0.001, jitter=0)
+    with spooled_writes(tmp_path, send=down, retry=retry, drain_timeout=0.2) as spool:
+        for batch in range(3):
+            spool.append("sae_events", _rows(batch))
+
+    assert WriteSpool(tmp_path).pending() == 3
+
+
+def test_exit_with_a_hung_send_does_not_block(tmp_path, monkeypatch):
+    from storage import spool as spool_module
+
+    monkeypatch.setattr(spool_module, "ABANDON_JOIN_TIMEOUT_S", 0.1)
+    release = threading.Event()
+
+    def hung(table_name, rows, write_mode):
+        release.wait(30)
+
+    try:
+        with spooled_writes(tmp_path, send=hung, drain_timeout=0.2) as spool:
+            spool.append("sae_events", _rows(0))
+    finally:
+        release.set()
+
+    assert WriteSpool(tmp_path).pending() == 1
@@ -0,0 +1,215 @@
+import pytest
+
+from storage.supabase_writer import SupabaseInsertError, insert_rows, insert_stream
+
+
+ROWS = [{"entity_id": f"S{i:03d}", "metric_value": float(i)} for i in range(95)]
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 4])
+def test_batches_are_all_written(fake_supabase, max_in_flight):
+    insert_rows("cpid_metric_snapshots", ROWS, batch_size=10, max_in_flight=max_in_flight)
+
+    assert len(fake_supabase.requests) == 10
+    written = fake_supabase.tables["cpid_metric_snapshots"]
+    assert sorted(r["entity_id"] for r in written) == [r["entity_id"] for r in ROWS]
+
+
+def test_sequential_mode_stops_at_first_failing_batch(fake_supabase):
+    fake_supabase.fail_on("S025")
+
+    with pytest.raises(SupabaseInsertError, match=r"batch 3/10"):
+        insert_rows("cpid_metric_snapshots", ROWS, batch_size=10)
+
+    assert len(fake_supabase.requests) == 2
+
+
+def test_concurrent_mode_reports_lowest_failing_batch(fake_supabase):
+    fake_supabase.latency = 0.01
+    fake_supabase.fail_on("S015")
+    fake_supabase.fail_on("S025")
+
+    with pytest.raises(SupabaseInsertError, match=r"batch 2/10") as excinfo:
+        insert_rows("cpid_metric_snapshots", ROWS, batch_size=10, max_in_flight=4)
+
+    assert excinfo.value.failed_batches[:2] == [2, 3]
+    assert isinstance(excinfo.value.__cause__, RuntimeError)
+
+
+def test_adaptive_batches_respect_payload_byte_cap(fake_supabase):
+    from storage.batch_sizer import BatchSizingConfig
+
+    wide = [{"entity_id": f"S{i:03d}", "form_name": "x" * 500} for i in range(200)]
+    sizing = BatchSizingConfig(min_batch_size=1, max_batch_bytes=10_000)
+
+    insert_rows("missing_pages_events", wide, batch_size=1000, adaptive=True, sizing=sizing)
+
+    sizes = [len(rows) for _, _, rows in fake_supabase.requests]
+    assert sum(sizes) == 200
+    assert max(sizes) <= 19  # ~530 bytes/row → 18 rows per 10 kB
+
+
+def test_adaptive_mode_splits_and_shrinks_on_413(fake_supabase):
+    from storage.batch_sizer import BatchSizingConfig
+
+    fake_supabase.max_request_rows = 30
+    sizing = BatchSizingConfig(min_batch_size=5, max_batch_size=200)
+
+    insert_rows("cpid_metric_snapshots", ROWS, batch_size=100, adaptive=True, sizing=sizing)
+
+    written = fake_supabase.tables["cpid_metric_snapshots"]
+    assert sorted(r["entity_id"] for r in written) == [r["entity_id"] for r in ROWS]
+    assert all(len(rows) <= 30 for _, _, rows in fake_supabase.requests)
+
+
+def test_sizer_grows_on_fast_success_and_backs_off_when_slow():
+    from storage.batch_sizer import AdaptiveBatchSizer, BatchSizingConfig
+
+    sizer = AdaptiveBatchSizer(100, BatchSizingConfig(target_latency_s=1.0, max_batch_size=1000))
+
+    sizer.on_success(100, latency_s=0.2)
+    assert sizer.current_size == 150
+
+    sizer.on_success(150, latency_s=3.0)
+    assert sizer.current_size == 50
+
+    sizer.on_overload(50)
+    assert sizer.current_size == 50  # clamped at min_batch_size
+
+
+def test_columnar_serialization_matches_to_dict_cleaning(fake_supabase):
+    import numpy as np
+    import pandas as pd
+
+    from storage.serialization import FrameRecords, frame_to_records
+    from storage.supabase_writer import clean_nan_values, insert_dataframe
+
+    df = pd.DataFrame(
+        {
+            "study_id": ["Study 1", None, "Study 3", np.nan],
+            "days_missing": [1.5, np.nan, 3.0, 4.0],
+            "logline": pd.array([1, None, 3, 4], dtype="Int64"),
+            "visit_date": pd.to_datetime(["2025-01-01", None, "2025-01-03", "2025-01-04"]),
+            "flag": [True, False, True, False],
+        }
+    )
+
+    expected = clean_nan_values(df.to_dict(orient="records"))
+
+    assert frame_to_records(df) == expected
+    assert FrameRecords(df)[1:3].to_records() == expected[1:3]
+    assert FrameRecords(df)[::2].to_records() == expected[::2]
+    assert type(frame_to_records(df)[0]["days_missing"]) is float
+
+    insert_dataframe(df, "missing_pages_events", batch_size=3)
+    assert fake_supabase.tables["missing_pages_events"] == expected
+
+
+def test_stream_rechunks_rows_and_frame_chunks(fake_supabase):
+    import pandas as pd
+
+    from storage.supabase_writer import insert_stream
+
+    def source():
+        yield from ROWS[:7]
+        yield pd.DataFrame(ROWS[7:60])
+        yield from ROWS[60:65]
+        yield pd.DataFrame(ROWS[65:])
+
+    progress = []
+    stats = insert_stream(
+        "cpid_metric_snapshots",
+        source(),
+        batch_size=10,
+        max_in_flight=3,
+        on_progress=progress.append,
+    )
+
+    assert (stats.rows_read, stats.rows_written, stats.batches_written) == (95, 95, 10)
+    assert [len(rows) for _, _, rows in fake_supabase.requests].count(10) == 9
+    assert sorted(r["entity_id"] for r in fake_supabase.tables["cpid_metric_snapshots"]) == [
+        r["entity_id"] for r in ROWS
+    ]
+    assert sorted(p.rows_written for p in progress)[-1] == 95
+
+
+def test_stream_stops_pulling_after_failure(fake_supabase):
+    from storage.supabase_writer import insert_stream
+
+    fake_supabase.fail_on("S025")
+    pulled = []
+
+    def source():
+        for row in ROWS:
+            pulled.append(row)
+            yield row
+
+    with pytest.raises(SupabaseInsertError, match=r"batch 3, rows 20-29"):
+        insert_stream("cpid_metric_snapshots", source(), batch_size=10)
+
+    # One batch of read-ahead at most, never the rest of the stream
+    assert len(pulled) <= 40
+
+
+def test_stream_dry_run_and_async_source(fake_supabase, capsys):
+    import asyncio
+
+    from storage.supabase_writer import insert_stream, insert_stream_async
+
+    stats = insert_stream("cpid_metric_snapshots", iter(ROWS), batch_size=10, dry_run=True)
+    assert stats.rows_read == 95
+    assert "Would insert 95 rows" in capsys.readouterr().out
+    assert fake_supabase.requests == []
+
+    async def source():
+        for row in ROWS:
+            yield row
+
+    stats = asyncio.run(
+        insert_stream_async("cpid_metric_snapshots", source(), batch_size=10, queue_size=2)
+    )
+    assert stats.rows_written == 95
+    assert len(fake_supabase.tables["cpid_metric_snapshots"]) == 95
+
+
+@pytest.mark.parametrize("write_mode", ["upsert", "skip_existing"])
+def test_keyed_rerun_leaves_no_duplicates(fake_supabase, write_mode):
+    import pandas as pd
+
+    run_1 = pd.DataFrame(ROWS).assign(snapshot_time="2026-01-01T00:00:00+00:00")
+    run_2 = run_1.assign(snapshot_time="2026-02-01T00:00:00+00:00")
+    run_2.loc[3, "metric_value"] = -1.0
+
+    for run in (run_1, run_2):
+        stats = insert_stream(
+            "cpid_metric_snapshots", [run], batch_size=10, write_mode=write_mode
+        )
+
+    written = fake_supabase.tables["cpid_metric_snapshots"]
+    assert len({row["row_key"] for row in written}) == len(written) == 96
+    if write_mode == "skip_existing":
+        # The server skips existing keys and counts what it inserted:
+        # only the changed row is new, and nothing is read beforehand
+        assert (stats.rows_written, stats.rows_skipped) == (1, 94)
+        assert {op for _, op, _ in fake_supabase.requests} == {"upsert"}
+        assert len(fake_supabase.requests) == 2 * 10
+
+
+def test_row_keys_ignore_column_order_and_neighbouring_rows():
+    from storage.row_keys import with_row_keys
+
+    batch = [{"entity_id": "S1", "metric_value": 1}, {"entity_id": "S2", "metric_value": None}]
+    alone = [{"metric_value": 1, "entity_id": "S1"}]
+
+    keys = [row["row_key"] for row in with_row_keys(batch, "sae_events")]
+    assert keys[0] == with_row_keys(alone, "sae_events")[0]["row_key"]
+    assert keys[0] != keys[1] and len(keys[0]) == 32
+
+
+def test_row_key_migration_is_idempotent_ddl():
+    from storage.row_keys import row_key_migration_sql
+
+    assert row_key_migration_sql("public.sae_events") == [
+        'ALTER TABLE "public"."sae_events" ADD COLUMN IF NOT EXISTS "row_key" text;',
+        'CREATE UNIQUE INDEX IF NOT EXISTS "sae_events_row_key_idx" ON "public"."sae_events" ("row_key");',
+    ]